@@ -5,7 +5,9 @@ Connection api keys are specified in environment variables defined in:
 constants.py
 """
 
+import asyncio
 import concurrent.futures
+import datetime
 import itertools
 import json
 import logging
@@ -13,13 +15,19 @@ import os
 import pprint
 import time
 import urllib.parse
-from ast import literal_eval
 
+import aiohttp
 import ckanapi
+import ijson
 import requests
 
 import bcdc2bcdc.CacheFiles as CacheFiles
 import bcdc2bcdc.constants as constants
+import bcdc2bcdc.FetchCheckpoint as FetchCheckpoint
+import bcdc2bcdc.HTTPClients as HTTPClients
+import bcdc2bcdc.Retry as Retry
+import bcdc2bcdc.Throttle as Throttle
+import bcdc2bcdc.SnapshotStore as SnapshotStore
 
 # pylint: disable=logging-format-interpolation
 
@@ -28,6 +36,52 @@ LOGGER = logging.getLogger(__name__)
 # TODO: remove the requirement of the ckanapi module.  Doesn't always calculate
 #       the correct url.  Just use requests, gives more control anyway
 
+# results of the package_list paging probe, ckan url: bool, see
+# CKANWrapper.isJsonBodyPagingSupported
+JSON_BODY_PAGING_SUPPORT = {}
+
+# metadata_modified formats, package_show returns microseconds, solr
+# (package_search with fl) returns up to 3 digits and a trailing Z
+TIMESTAMP_FORMATS = ["%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"]
+
+
+def parseTimeStamp(timeStamp):
+    """parses a metadata_modified timestamp as returned by either package_show,
+    example: 2020-05-01T18:20:11.123456, or by package_search when the fields
+    are selected with fl, example: 2020-05-01T18:20:11.123Z.  Solr only keeps
+    milliseconds, so the timestamp is truncated to milliseconds.
+
+    :param timeStamp: the timestamp to parse
+    :type timeStamp: str
+    :return: the timestamp, or None if it could not be parsed
+    :rtype: datetime.datetime
+    """
+    retVal = None
+    if isinstance(timeStamp, str):
+        timeStamp = timeStamp.strip()
+        if timeStamp.endswith("Z"):
+            timeStamp = timeStamp[:-1]
+        for timeStampFormat in TIMESTAMP_FORMATS:
+            try:
+                retVal = datetime.datetime.strptime(timeStamp, timeStampFormat)
+                break
+            except ValueError:
+                pass
+    if retVal is not None:
+        retVal = retVal.replace(microsecond=retVal.microsecond // 1000 * 1000)
+    return retVal
+
+
+def isSameTimeStamp(timeStamp1, timeStamp2):
+    """
+    :return: True if the two metadata_modified timestamps are the same time,
+        to the millisecond, see parseTimeStamp().  Timestamps that can't be
+        parsed are never the same
+    :rtype: bool
+    """
+    parsed1 = parseTimeStamp(timeStamp1)
+    return parsed1 is not None and parsed1 == parseTimeStamp(timeStamp2)
+
 
 class CKANParams:
     def __init__(self):
@@ -76,8 +130,12 @@ class CKANWrapper:
             )
             raise ValueError(msg)
 
-        self.remoteapi = ckanapi.RemoteCKAN(url, apikey=apiKey)
-        self.requestSession = requests.Session()
+        # sessions come from the process wide registry, one pool per host.
+        # They are shared so the api key is sent as a per request header.
+        self.requestSession = HTTPClients.getSession(url)
+        self.remoteapi = ckanapi.RemoteCKAN(
+            url, apikey=apiKey, session=self.requestSession
+        )
 
         self.CKANHeader = {"X-CKAN-API-KEY": apiKey}
         self.CKANUrl = url
@@ -86,9 +144,9 @@ class CKANWrapper:
 
         # most of the requests use the ckanapi.RemoteCKAN howe ver there are
         # some requests that require features of requests module.  For this
-        # reason a session object is created here to help with those requests.
-        self.rsession = requests.Session()
-        self.rsession.headers.update(self.CKANHeader)
+        # reason a session object is made available here to help with those
+        # requests.
+        self.rsession = self.requestSession
 
         if self.CKANUrl[len(self.CKANUrl) - 1] != "/":
             self.CKANUrl = self.CKANUrl + "/"
@@ -96,55 +154,70 @@ class CKANWrapper:
         # debug helper
         self.pp = pprint.PrettyPrinter(indent=4)
 
-        self.apiRequestMaxRetries = 4
-        self.requestTimeout = 120
+        self.requestTimeout = constants.getRequestTimeout()
+        # max number of package_list pages requested in parallel
+        self.listingMaxWorkers = 4
 
-    def __packageListPaging(self):
+    def __getPackageListPage(self, offset=0, pageSize=500):
         """
-        package_list call to prod doesn't properly page.  This is a requests
-        based replacement to the same end point.
-
-
+        package_list call to prod doesn't properly page when the paging
+        parameters are sent in the json body.  This is a requests based
+        replacement that sends the paging parameters as query parameters.
+
+        :param offset: the position of the first package name in the page
+        :type offset: int
+        :param pageSize: the number of package names to request
+        :type pageSize: int
+        :return: a page of package names
+        :rtype: list of str
         """
         packageListEndPoint = self.__getUrl("package_list")
+        params = {"limit": pageSize, "offset": offset}
+        LOGGER.debug(f"params: {params}")
+        return self.__getResult(packageListEndPoint, params)
 
-        packageList = []
-        params = {"limit": 500, "offset": 0}
-        packageListCnt = 0
-        while True:
-            LOGGER.debug("offset: %s", params["offset"])
-            packageListPage = self.__getWithRetries(packageListEndPoint, params)
-            packageListCnt = packageListCnt + len(packageListPage)
-            LOGGER.debug(f"package cnt: {packageListCnt} {len(packageListPage)}")
-            packageList.extend(packageListPage)
-            if len(packageListPage) < params["limit"]:
-                LOGGER.debug("end of pages, breaking out")
-                break
-            params["offset"] = params["limit"] + params["offset"]
-        return packageList
+    def isJsonBodyPagingSupported(self):
+        """CKAN that is currently running in prod ignores paging parameters
+        that are sent in the json body, and returns the same page again and
+        again.  Probes the instance by requesting the first two single element
+        pages, if they are the same the paging parameters are ignored.
+
+        The result is cached per ckan instance so the probe is only made once.
 
-    def __getWithRetries(self, endpoint, payload, retries=0):
-        waitTime = 3
+        :return: indicates if package_list paging params can be sent in the
+            json body.
+        :rtype: bool
+        """
+        if self.CKANUrl not in JSON_BODY_PAGING_SUPPORT:
+            firstPage = self.getSinglePagePackageNames(offset=0, pageSize=1)
+            secondPage = self.getSinglePagePackageNames(offset=1, pageSize=1)
+            isSupported = not (firstPage and firstPage == secondPage)
+            LOGGER.info(f"json body paging supported: {isSupported}")
+            JSON_BODY_PAGING_SUPPORT[self.CKANUrl] = isSupported
+        return JSON_BODY_PAGING_SUPPORT[self.CKANUrl]
+
+    def __getResult(self, endpoint, payload):
+        """makes a get request and returns the result property of the response.
+        Failed requests are retried by the session, see Retry.
+
+        :param endpoint: the url to call
+        :type endpoint: str
+        :param payload: query parameters to send with the request
+        :type payload: dict
+        :raises CKANPackagesGetError: when the request does not succeed
+        :return: the result property of the response
+        """
         LOGGER.debug(f"end point: {endpoint}")
         resp = self.requestSession.get(
             endpoint, headers=self.CKANHeader, params=payload
         )
         LOGGER.debug(f"status_code: {resp.status_code}")
         if resp.status_code != 200:
-            LOGGER.warning(
-                f"package_get received non 200 status code: {resp.status_code}"
+            msg = (
+                f"unable to retrieve data from {endpoint}, getting status "
+                f"code: {resp.status_code}.  Unable to complete request"
             )
-            if retries < self.apiRequestMaxRetries:
-                retries += 1
-                time.sleep(waitTime)
-                resp = self.__getWithRetries(endpoint, payload, retries)
-            else:
-                msg = (
-                    f"made {retries} attempts to retrieve package data, "
-                    f"getting status code: {resp.status_code}.  Unable to "
-                    "complete request"
-                )
-                raise CKANPackagesGetError(msg)
+            raise CKANPackagesGetError(msg)
         respJson = resp.json()
         retVal = respJson['result']
         return retVal
@@ -205,55 +278,53 @@ class CKANWrapper:
         ckanUrl = f"{ckanUrl}{ckanApiDir}{ckanMethodName}"
         return ckanUrl
 
+    def getPackageCount(self):
+        """
+        :return: the number of packages reported by package_search
+        :rtype: int
+        """
+        packageSearchEndPoint = self.__getUrl("package_search")
+        data = self.__getResult(packageSearchEndPoint, {"rows": 0})
+        return data["count"]
+
     def getPackageNames(self):
-        """Gets a list of package names from the API works through
-        multiple 500 element pages until the call returns empty
-        list
+        """Gets a list of package names from the API.  The number of pages is
+        calculated from the package count and the pages are requested in
+        parallel.  The package count comes from package_search, so if the last
+        page is full pages continue to be requested until a partial page is
+        returned.
 
         :return: a list of package names
         :rtype: list
         """
-        packageList = []
         elemCnt = 500
-        pageCnt = 0
         LOGGER.info("Getting package names:")
+        if self.isJsonBodyPagingSupported():
+            getPage = self.getSinglePagePackageNames
+        else:
+            getPage = self.__getPackageListPage
 
-        # CKAN that is currently running in prod will not return a blank
-        # list when a page beyond the data is requested, instead it will
-        # return the previously page again and again.
-        #
-        # caching the last page in this directory to detect this condition.
-        prevPage = None
-        success = True
-        while True:
-
-            offset = pageCnt * elemCnt
-            LOGGER.info(f"    - page: {pageCnt} {offset} {elemCnt}")
-            pageData = self.getSinglePagePackageNames(offset=offset, pageSize=elemCnt)
-
-            if not isinstance(pageData, list):
-                LOGGER.debug(f"page data is: {pageData}")
-            if packageList:
-                LOGGER.debug(f"last element: {packageList[len(packageList) - 1]}")
-            if pageData:
-                LOGGER.debug(f"first add element: {pageData[0]}")
-            LOGGER.debug(f"pageData len: {len(pageData)}")
-
-            # newer ckan will return a blank page when beyond the dataframe
-            # older ckan returns the same page again and again.
-            if (prevPage) and prevPage == pageData:
-                success = False
-                break
-            if not pageData:
-                break
-
-            packageList.extend(pageData)
-            pageCnt += 1
-            prevPage = pageData
+        pkgCount = self.getPackageCount()
+        numPages = max(1, -(-pkgCount // elemCnt))
+        LOGGER.debug(f"package count: {pkgCount}, pages: {numPages}")
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.listingMaxWorkers, numPages)
+        ) as executor:
+            pages = list(
+                executor.map(
+                    lambda pageCnt: getPage(offset=pageCnt * elemCnt, pageSize=elemCnt),
+                    range(numPages),
+                )
+            )
 
-        if not success:
-            packageList = self.__packageListPaging()
+        while len(pages[-1]) == elemCnt:
+            offset = len(pages) * elemCnt
+            LOGGER.info(f"    - page: {len(pages)} {offset} {elemCnt}")
+            pages.append(getPage(offset=offset, pageSize=elemCnt))
 
+        # names can shift between pages if packages are added while paging
+        packageList = list(dict.fromkeys(itertools.chain.from_iterable(pages)))
+        LOGGER.debug(f"got {len(packageList)} package names")
         return packageList
 
     def getPackagesAndDataCached(self, cacheFileName):
@@ -269,11 +340,18 @@ class CKANWrapper:
                 pkgs = json.load(fh)
         return pkgs
 
-    def getPackagesAndData(self, cacheFileName=None):
+    def getPackagesAndData(self, cacheFileName=None, snapshotStore=None, onPackage=None):
         """ Makes a bunch of different calls.  Initially calls package_list and
         then iterates through each object package name retrieving the data for
         it using package_show api calls.
 
+        :param snapshotStore: if supplied the packages are written to the store
+            as they are received, defaults to None
+        :type snapshotStore: SnapshotStore.SnapshotStore, optional
+        :param onPackage: callable that is called with each package as it is
+            received, not called for packages read from the cache file,
+            defaults to None
+        :type onPackage: callable, optional
         :return: a list of pkgs where each pkg is a python struct describing a
             dataset in ckan.
         :rtype: list of pkgs
@@ -286,10 +364,60 @@ class CKANWrapper:
             LOGGER.debug(f"got {len(pkgList)} pkg names")
             LOGGER.debug(f"first few:  {pkgList[0:3]}")
 
-            asyncWrapper = CKANAsyncWrapper(self.CKANUrl, header=self.CKANHeader)
-            pkgs = asyncWrapper.getPackages(pkgList)
+            if constants.isConditionalFetch():
+                if snapshotStore is None:
+                    snapshotStore = SnapshotStore.SnapshotStore(
+                        SnapshotStore.getInstanceId(self.CKANUrl),
+                        constants.TRANSFORM_TYPE_PACKAGES,
+                    )
+                conditionalFetcher = ConditionalPackageFetcher(
+                    self, snapshotStore, onPackage=onPackage
+                )
+                pkgs = conditionalFetcher.getPackages(pkgList)
+            else:
+                if snapshotStore is not None:
+                    onPackage = combineCallbacks(snapshotStore.putRecord, onPackage)
+                asyncWrapper = self.getPackageFetcher(onPackage=onPackage)
+                pkgs = asyncWrapper.getPackages(pkgList)
+                if snapshotStore is not None:
+                    snapshotStore.save()
         return pkgs
 
+    def getPackageFetcher(self, onPackage=None):
+        """Creates the object that is used to retrieve the package data for
+        a list of package names.  The engine that is used is defined by the
+        env var CKAN_FETCH_ENGINE, see constants.FETCH_ENGINES.  All engines
+        implement the method getPackages(packageNameList)
+
+        When CKAN_FETCH_CHECKPOINT is enabled the fetcher writes a checkpoint
+        as packages are received, and resumes from it if the previous fetch
+        did not complete, see FetchCheckpoint.
+
+        :param onPackage: callable that is called with each package as it is
+            received, defaults to None
+        :type onPackage: callable, optional
+        :return: a package fetcher for this ckan instance
+        :rtype: CKANAsyncWrapper or CKANAsyncIOWrapper
+        """
+        fetchEngine = constants.getFetchEngine()
+        LOGGER.debug(f"package fetch engine: {fetchEngine}")
+        checkpoint = None
+        if constants.isFetchCheckpoint():
+            checkpoint = FetchCheckpoint.FetchCheckpoint(
+                SnapshotStore.getInstanceId(self.CKANUrl)
+            )
+        if fetchEngine == constants.FETCH_ENGINES.ASYNCIO:
+            fetcher = CKANAsyncIOWrapper(
+                self.CKANUrl, header=self.CKANHeader, onPackage=onPackage,
+                checkpoint=checkpoint
+            )
+        else:
+            fetcher = CKANAsyncWrapper(
+                self.CKANUrl, header=self.CKANHeader, onPackage=onPackage,
+                checkpoint=checkpoint
+            )
+        return fetcher
+
     def getPackagesAndDataSolr(self):
         """Collects a complete list of packages from ckan.  Uses package_search
         end point.  package_search hits cached state of CKAN managed by SOLR
@@ -299,42 +427,142 @@ class CKANWrapper:
         method that retrieves the data through individual package_show calls.
         Takes a longer period of time though.
 
-        :return: [description]
-        :rtype: [type]
+        :return: list of packages
+        :rtype: list of dict
+        """
+        packageList = list(self.iterPackagesSolr())
+        LOGGER.debug(f"number of packages retrieved: {len(packageList)}")
+        return packageList
+
+    def iterPackagesSolr(self):
+        """Same as getPackagesAndDataSolr() except the packages are decoded from
+        the response as it is received, and yielded one at a time.  Only one
+        package is held in memory at a time.
+
+        :yield: a package
+        :rtype: dict
         """
         LOGGER.debug(f"url: {self.CKANUrl}")
-        packageList = []
         elemCnt = 500
-
         pageCnt = 0
         LOGGER.info("Getting packages with data:")
 
         packageSearchEndPoint = self.__getUrl("package_search")
         LOGGER.debug(f"package_list_call: {packageSearchEndPoint}")
 
-        packageList = []
-
         while True:
-
             offset = pageCnt * elemCnt
             LOGGER.info(f"    - page: {pageCnt} {offset} {elemCnt}")
-
             params = {"rows": elemCnt, "start": offset}
-            resp = self.__getWithRetries(packageSearchEndPoint, params)
-            data = resp.json()
-            # also avail is resp['success']
-            # LOGGER.debug(f"resp: {data['result']}")
-            LOGGER.debug(f"data type: {type(data)}, {len(data['result'])}")
-            packageList.extend(data["result"]["results"])
-            LOGGER.debug(f"number of packages retrieved: {len(packageList)}")
-
-            if len(data["result"]["results"]) < params["rows"]:
+            pageLength = 0
+            for pkg in self.__streamResults(
+                packageSearchEndPoint, params, "result.results.item"
+            ):
+                pageLength += 1
+                yield pkg
+            if pageLength < elemCnt:
                 LOGGER.debug("end of pages, breaking out")
                 break
-
             pageCnt += 1
 
-        return packageList
+    def __streamResults(self, endPoint, params, prefix="result.item"):
+        """Makes a get request and decodes the records from the response body
+        as it arrives instead of loading the whole response.
+
+        :param endPoint: the url to call
+        :type endPoint: str
+        :param params: query parameters to send with the request
+        :type params: dict
+        :param prefix: ijson prefix that identifies the records in the response,
+            defaults to "result.item", ie the elements of the result list
+        :type prefix: str, optional
+        :raises InvalidRequestError: when a non 200 status code is returned
+        :yield: the records in the response
+        :rtype: dict
+        """
+        with self.requestSession.get(
+            endPoint,
+            headers=self.CKANHeader,
+            params=params,
+            stream=True,
+            timeout=self.requestTimeout,
+        ) as resp:
+            LOGGER.debug(f"status_code: {resp.status_code}")
+            if resp.status_code != 200:
+                raise InvalidRequestError(resp)
+            resp.raw.decode_content = True
+            for record in ijson.items(resp.raw, prefix, use_float=True):
+                yield record
+
+    def __packageSearchPages(self, params, pageSize=500):
+        """Pages through the package_search end point, yielding the results
+        from each page.
+
+        :param params: the package_search parameters, rows and start are
+            added by this method
+        :type params: dict
+        :param pageSize: the number of results to request per page
+        :type pageSize: int
+        :yield: the results from a single page of the search
+        :rtype: list of dict
+        """
+        packageSearchEndPoint = self.__getUrl("package_search")
+        params = dict(params, rows=pageSize, start=0)
+        while True:
+            data = self.__getResult(packageSearchEndPoint, params)
+            yield data["results"]
+            if len(data["results"]) < pageSize:
+                break
+            params["start"] += pageSize
+
+    def getPackageNamesModifiedSince(self, modifiedSince):
+        """Uses the package_search end point to identify the packages that have
+        been modified since the supplied timestamp.  The range is inclusive and
+        is truncated to the second, so packages modified on the boundary will
+        be returned again.
+
+        :param modifiedSince: a ckan metadata_modified timestamp, example:
+            2020-05-01T18:20:11.123456
+        :type modifiedSince: str
+        :return: list of the names of the packages modified since the timestamp
+        :rtype: list of str
+        """
+        solrTimeStamp = f"{modifiedSince[:19]}Z"
+        params = {
+            "fq": f"metadata_modified:[{solrTimeStamp} TO *]",
+            "fl": "name",
+            "include_private": True,
+            "sort": "metadata_modified asc",
+        }
+        LOGGER.info(f"Getting packages modified since: {solrTimeStamp}")
+        packageNames = []
+        for page in self.__packageSearchPages(params):
+            packageNames.extend([pkg["name"] for pkg in page])
+            LOGGER.debug(f"modified packages found: {len(packageNames)}")
+        return packageNames
+
+    def getPackageModifiedListing(self):
+        """Uses the package_search end point to retrieve the metadata_modified
+        timestamp for every package.  Only the name, id and metadata_modified
+        fields are requested so this is much cheaper than retrieving the
+        packages.
+
+        :return: dictionary with package name as key, and metadata_modified as
+            the value.  The values are in the solr format, see parseTimeStamp()
+        :rtype: dict
+        """
+        params = {
+            "fl": "name,id,metadata_modified",
+            "include_private": True,
+            "sort": "name asc",
+        }
+        LOGGER.info("Getting package modified listing")
+        listing = {}
+        for page in self.__packageSearchPages(params, pageSize=1000):
+            for pkg in page:
+                listing[pkg["name"]] = pkg.get("metadata_modified")
+        LOGGER.debug(f"packages in listing: {len(listing)}")
+        return listing
 
     def getOrganizationNames(self):
         """retrieves a list of the organizations from CKAN and
@@ -396,11 +624,14 @@ class CKANWrapper:
             LOGGER.info(f"retrieved {len(users)} users")
         return users
 
-    def updateUserAPIKey(self, userId, retries=0):
-        """[summary]
+    def updateUserAPIKey(self, userId):
+        """generates a new api key for the user
 
-        :param userId: [description]
-        :type userId: [type]
+        :param userId: the name or id of the user
+        :type userId: str
+        :raises CKANFailedAPIRequest: if the api key could not be generated
+        :return: the user data, including the new api key
+        :rtype: dict
         """
         self.checkUrl()
 
@@ -419,13 +650,8 @@ class CKANWrapper:
             respJson = resp.json()
             retVal = respJson["result"]
         else:
-            LOGGER.warning(f"attempt o update {userId} failed, trying again")
-            retries += 1
-            if retries >= self.apiRequestMaxRetries:
-                msg = f"Unable to reset the api for user: {userId}"
-                raise CKANFailedAPIRequest(msg)
-
-            self.updateUserAPIKey(userId, retries)
+            msg = f"Unable to reset the api for user: {userId}"
+            raise CKANFailedAPIRequest(msg)
         return retVal
 
     def checkUrl(self):
@@ -647,33 +873,34 @@ class CKANWrapper:
         if cacheFileName is not None:
             retVal = self.getGroupsCached(cacheFileName=cacheFileName, includeData=includeData)
         else:
-            groupConfig = {"order_by": "name"}
-            if includeData:
-                groupConfig = {
-                    "order_by": "name",
-                    "all_fields": True,
-                    "include_extras": True,
-                    "include_tags": True,
-                    "include_groups": True,
-                    "include_users": True,
-                }
-            LOGGER.debug(f"groupconfig is {groupConfig}")
-            try:
-                retVal = self.remoteapi.action.group_list(**groupConfig)
-            except ckanapi.errors.CKANAPIError:
-                endPoint = "api/3/action/group_list"
-                apiUrl = f"{self.CKANUrl}{endPoint}"
-                LOGGER.debug(f"url end point: {apiUrl}")
-                resp = self.requestSession.get(
-                    apiUrl, headers=self.CKANHeader, params=groupConfig
-                )
-                if self.__isResponseSuccess(resp):
-                    respJson = resp.json()
-                    retVal = respJson["result"]
-                else:
-                    raise InvalidRequestError(resp)
+            retVal = list(self.iterGroups(includeData=includeData))
         return retVal
 
+    def iterGroups(self, includeData=False):
+        """Retrieves groups from ckan api, decoding them from the response as it
+        arrives and yielding them one at a time.
+
+        :param includeData: if set to True will return all the properties of
+            groups, otherwise will return only the names
+        :type includeData: bool, optional
+        :yield: a group
+        :rtype: dict, or str if includeData is False
+        """
+        groupConfig = {"order_by": "name"}
+        if includeData:
+            groupConfig = {
+                "order_by": "name",
+                "all_fields": True,
+                "include_extras": True,
+                "include_tags": True,
+                "include_groups": True,
+                "include_users": True,
+            }
+        LOGGER.debug(f"groupconfig is {groupConfig}")
+        apiUrl = self.__getUrl("group_list")
+        LOGGER.debug(f"url end point: {apiUrl}")
+        yield from self.__streamResults(apiUrl, groupConfig)
+
     def getGroupsCached(self, cacheFileName, includeData=False):
         if not os.path.exists(cacheFileName):
             groups = self.getGroups(includeData=includeData)
@@ -777,7 +1004,7 @@ class CKANWrapper:
         retValStr = json.dumps(retVal)
         LOGGER.debug(f"Group Updated: {retValStr[0:100]} ...")
 
-    def updatePackage(self, packageData, retry=False):
+    def updatePackage(self, packageData):
         """[summary]
 
         Changed this method to use requests because it was freezing up during
@@ -791,8 +1018,6 @@ class CKANWrapper:
 
         :param packageData: [description]
         :type packageData: [type]
-        :param retry: [description], defaults to False
-        :type retry: bool, optional
         """
         self.checkUrl()
         packageJsonStr = json.dumps(packageData)
@@ -801,74 +1026,44 @@ class CKANWrapper:
         )
 
         packageUpdateCall = self.__getUrl("package_update")
-        try:
-            resp = self.rsession.post(
-                packageUpdateCall,
-                json=packageData,
-                headers=self.CKANHeader,
-                timeout=self.requestTimeout,
-            )
-            LOGGER.info(f"package_update status_code: {resp.status_code}")
-            responseStruct = resp.json()
-            retValStr = json.dumps(responseStruct)
-            LOGGER.debug(f"Package Updated: {retValStr[0:125]} ...")
-
-            if (resp.status_code == 409):
-                # trying to isolate some different validation errors and raise
-                # different error messages associated with each of them
-                if ('message' in responseStruct) and "Only lists of dicts can be placed against subschema ('more_info'" in responseStruct['message']:
-                    raise MoreInfoNeedsDeStringify(retValStr)
-                else:
-                    raise InvalidRequestError(retValStr)
-            elif resp.status_code < 200 or resp.status_code >= 300:
-                raise InvalidRequestError(retValStr)
-        except requests.exceptions.ReadTimeout:
-            if retry:
-                LOGGER.error("have already tried resending this request")
-                raise
+        resp = self.rsession.post(
+            packageUpdateCall,
+            json=packageData,
+            headers=self.CKANHeader,
+            timeout=self.requestTimeout,
+        )
+        LOGGER.info(f"package_update status_code: {resp.status_code}")
+        responseStruct = resp.json()
+        retValStr = json.dumps(responseStruct)
+        LOGGER.debug(f"Package Updated: {retValStr[0:125]} ...")
+
+        if (resp.status_code == 409):
+            # trying to isolate some different validation errors and raise
+            # different error messages associated with each of them
+            if ('message' in responseStruct) and "Only lists of dicts can be placed against subschema ('more_info'" in responseStruct['message']:
+                raise MoreInfoNeedsDeStringify(retValStr)
             else:
-                LOGGER.warning("got a timeout on this request.. trying again!")
-                self.updatePackage(packageData, retry=True)
+                raise InvalidRequestError(retValStr)
+        elif resp.status_code < 200 or resp.status_code >= 300:
+            raise InvalidRequestError(retValStr)
 
-    def getOrganizationPage(self, orgConfig, attempts=0):
+    def getOrganizationPage(self, orgConfig):
         """Gets the organizations from the CKAN API, one page at a time
 
-        :param orgConfig: [description]
-        :type orgConfig: [type]
-        :param attempts: [description], defaults to 0
-        :type attempts: int, optional
-        :raises InvalidRequestError: [description]
-        :return: [description]
-        :rtype: [type]
+        :param orgConfig: the organization_list parameters
+        :type orgConfig: dict
+        :raises InvalidRequestError: when the request does not succeed
+        :return: a page of organizations
+        :rtype: list
         """
-        try:
-            apiUrl = self.__getUrl("organization_list")
-            LOGGER.debug(f"url end point: {apiUrl}")
-            resp = self.rsession.get(apiUrl, headers=self.CKANHeader, params=orgConfig)
-            if self.__isResponseSuccess(resp):
-                respJson = resp.json()
-                retVal = respJson["result"]
-            else:
-                raise InvalidRequestError(resp)
-
-        except ckanapi.errors.CKANAPIError as err:
-            LOGGER.error(err)
-            # catch 504 errors raised by ckanapi, otherwise re-raise
-            if (
-                ((attempts < self.apiRequestMaxRetries) and hasattr(err, "extra_msg"))
-                and len(literal_eval(err.extra_msg)) >= 2
-            ) and literal_eval(err.extra_msg)[1] == 504:
-                attempts += 1
-                LOGGER.warning(
-                    f"organization_list: status: 504, retry {attempts} of {self.apiRequestMaxRetries} "
-                )
-                retVal = self.getOrganizationPage(
-                    orgConfig=orgConfig, attempts=attempts
-                )
-                # if gets here then succeeded, reset attempts
-                attempts = 0
-            else:
-                raise
+        apiUrl = self.__getUrl("organization_list")
+        LOGGER.debug(f"url end point: {apiUrl}")
+        resp = self.rsession.get(apiUrl, headers=self.CKANHeader, params=orgConfig)
+        if self.__isResponseSuccess(resp):
+            respJson = resp.json()
+            retVal = respJson["result"]
+        else:
+            raise InvalidRequestError(resp)
         return retVal
 
     def getOrganizations(self, cacheFileName=None, includeData=False, attempts=0, currentPosition=None):
@@ -916,6 +1111,40 @@ class CKANWrapper:
                 pageCnt += 1
         return organizations
 
+    def iterOrganizations(self, includeData=False):
+        """Same as getOrganizations() except the organizations are decoded from
+        the response as it arrives and yielded one at a time.
+
+        :param includeData: if set to True will return all the properties of
+            the organizations, otherwise will return only the names
+        :type includeData: bool, optional
+        :yield: an organization
+        :rtype: dict, or str if includeData is False
+        """
+        pageSize = 70
+        orgConfig = {"order_by": "name", "limit": pageSize, "offset": 0}
+        if includeData:
+            orgConfig.update(
+                {
+                    "all_fields": True,
+                    "include_extras": True,
+                    "include_tags": True,
+                    "include_groups": True,
+                    "include_users": True,
+                }
+            )
+        apiUrl = self.__getUrl("organization_list")
+        while True:
+            LOGGER.debug(f"OrgConfig is {orgConfig}")
+            pageLength = 0
+            for org in self.__streamResults(apiUrl, orgConfig):
+                pageLength += 1
+                yield org
+            LOGGER.debug(f"records returned: {pageLength}")
+            if pageLength < pageSize:
+                break
+            orgConfig["offset"] += pageSize
+
     def getOrganizationsCached(self, cacheFileName, includeData=False):
         if not os.path.exists(cacheFileName):
             orgs = self.getOrganizations(cacheFileName=None, includeData=includeData)
@@ -978,7 +1207,7 @@ class CKANWrapper:
                 raise InvalidRequestError(resp)
         LOGGER.debug(f"Organization Created: {retVal}")
 
-    def updateOrganization(self, organizationData, retry=None):
+    def updateOrganization(self, organizationData):
         """receives a dictionary that it can use to update the organizations
         data.
 
@@ -989,32 +1218,25 @@ class CKANWrapper:
 
         self.checkUrl()
         LOGGER.debug(f"updating org: {organizationData['name']}")
-        try:
-            apiUrl = self.__getUrl("organization_update")
+        apiUrl = self.__getUrl("organization_update")
 
-            LOGGER.debug(f"url end point: {apiUrl}")
-            resp = self.rsession.post(
-                apiUrl,
-                headers=self.CKANHeader,
-                json=organizationData,
-                timeout=self.requestTimeout,
-            )
-            if self.__isResponseSuccess(resp):
-                respJson = resp.json()
-                retVal = respJson["result"]
-            else:
-                raise InvalidRequestError(resp)
-        except requests.exceptions.ConnectionError:
-            if (retry) and retry > self.apiRequestMaxRetries:
-                raise
-            if retry is None:
-                retry = 1
-            retVal = self.updateOrganization(organizationData, retry)
+        LOGGER.debug(f"url end point: {apiUrl}")
+        resp = self.rsession.post(
+            apiUrl,
+            headers=self.CKANHeader,
+            json=organizationData,
+            timeout=self.requestTimeout,
+        )
+        if self.__isResponseSuccess(resp):
+            respJson = resp.json()
+            retVal = respJson["result"]
+        else:
+            raise InvalidRequestError(resp)
         retValJson = json.dumps(retVal)
         LOGGER.debug(f"Organization Updated: {retValJson[0:100]} ...")
         return retVal
 
-    def addPackage(self, packageData, retries=0):
+    def addPackage(self, packageData):
         self.checkUrl()
         retVal = None
         try:
@@ -1029,7 +1251,6 @@ class CKANWrapper:
         except requests.exceptions.ConnectionError:
             LOGGER.error("Error when adding package...", exc_info=True)
             LOGGER.warning("skipping this package")
-            time.sleep(2)
         return retVal
 
     def deletePackage(self, deletePckg):
@@ -1088,7 +1309,8 @@ class CKANAsyncWrapper:
     https://alexwlchan.net/2019/10/adventures-with-concurrent-futures/
     """
 
-    def __init__(self, baseUrl, apiKey=None, header=None):
+    def __init__(self, baseUrl, apiKey=None, header=None, onPackage=None,
+                 checkpoint=None):
         self.baseUrl = baseUrl.strip()
         if self.baseUrl[-1] == '/':
             self.baseUrl = self.baseUrl[0:-1]
@@ -1101,7 +1323,17 @@ class CKANAsyncWrapper:
         self.packageShowEndPoint = "/api/3/action/package_show?id="
 
         self.packages = []
-
+        # optional callable that gets called with each package as it is
+        # received, used to stream packages to disk
+        self.onPackage = onPackage
+        # the requested, received and failed package names, written to disk
+        # when a checkpoint is supplied
+        self.manifest = checkpoint
+        if self.manifest is None:
+            self.manifest = FetchCheckpoint.FetchManifest()
+
+        # the thread pool size, CKAN_FETCH_CONCURRENCY only applies to the
+        # ASYNCIO engine, see CKANAsyncIOWrapper
         self.TASK_BUNDLE_SIZE = 20
         self.MAX_CONCURRENT_TASKS = 10
 
@@ -1114,32 +1346,31 @@ class CKANAsyncWrapper:
         LOGGER.debug(f"url for async package retrieval: {self.baseUrl}{self.packageShowEndPoint}")
 
 
-    def packageRequestTask(self, url, retries=0):
-        """retrieves the data associated with the url.
+    def packageRequestTask(self, url):
+        """retrieves the data associated with the url.  Failed requests are
+        retried by the session, see Retry.
 
         :param url: url to call using get to get an individual ckan package
         :type url: str
-        :return: the ckan package that was requested
+        :return: the ckan package that was requested, or None if it could not
+            be retrieved.  Missing packages are re-requested by verify()
         :rtype: dict
         """
         # LOGGER.debug(f"url: {url}")
-        maxRetries = 5
         retVal = None
         try:
             resp = self.requestSession.get(url, headers=self.header)
             if resp.status_code != 200:
-                LOGGER.debug(f"status code: {resp.status_code}, {url}")
-            packageData = resp.json()
-            retVal = packageData["result"]
-        except requests.exceptions.ConnectionError:
-            if retries > maxRetries:
-                raise
-            retries += 1
-            LOGGER.warning(
-                f"non 200 status, trying again... retries: {retries} of 5"
-            )
-            time.sleep(5)
-            retVal = self.packageRequestTask(url, retries)
+                LOGGER.warning(f"status code: {resp.status_code}, {url}")
+            else:
+                try:
+                    packageData = resp.json()
+                    retVal = packageData["result"]
+                except (ValueError, KeyError, TypeError) as decodeErr:
+                    # recorded as failed, and re-requested by verify()
+                    LOGGER.warning(f"invalid response: {decodeErr!r}, {url}")
+        except requests.exceptions.RequestException as err:
+            LOGGER.error(f"unable to retrieve the package {url}: {err}")
         return retVal
 
     def getPackages(self, packageNameList):
@@ -1153,10 +1384,29 @@ class CKANAsyncWrapper:
         :rtype: list of packages
         """
         LOGGER.debug(f"package name list length: {len(packageNameList)}")
-        self.requestSession = requests.Session()
-        self.spoolRequests(packageNameList)
+        self.requestSession = HTTPClients.getSession(self.baseUrl)
+        self.spoolRequests(packageNameList, self.resume(packageNameList))
+        self.manifest.complete()
         return self.packages
 
+    def resume(self, packageNameList):
+        """adds any packages that were received by an earlier fetch that did
+        not complete, see FetchCheckpoint
+
+        :param packageNameList: list of packages that need to be retrieved
+        :type packageNameList: list of str
+        :return: the names of the packages that still need to be retrieved,
+            None if they all do
+        :rtype: list of str
+        """
+        missingPackages = None
+        restored = self.manifest.resume(packageNameList)
+        if restored:
+            for packageData in restored:
+                self.addPackage(packageData)
+            missingPackages = self.manifest.getMissing(packageNameList)
+        return missingPackages
+
     def spoolRequests(self, packageList, missingPackages=None):
         """where the async calls are created.  Gets the list of package names
         and spools up a number of requests, monitors the requests, retrieves the
@@ -1178,8 +1428,9 @@ class CKANAsyncWrapper:
         completed = 0
 
         pkgs2Get = packageList
-        if missingPackages:
+        if missingPackages is not None:
             pkgs2Get = missingPackages
+        self.manifest.addRequested(pkgs2Get)
 
         packageIterator = iter(pkgs2Get)
 
@@ -1194,7 +1445,7 @@ class CKANAsyncWrapper:
             for pkgName in itertools.islice(packageIterator, self.TASK_BUNDLE_SIZE):
                 curUrl = f"{pkgShowUrl}{pkgName}"
                 fut = executor.submit(self.packageRequestTask, curUrl)
-                futures[fut] = curUrl
+                futures[fut] = pkgName
                 cnt += 1
             LOGGER.debug(f"stack size: {cnt}")
             # using futures dict as a stack of tasks
@@ -1211,11 +1462,13 @@ class CKANAsyncWrapper:
                     )
                     # LOGGER.debug(f" num done in this loop: {len(done)}")
                 for fut in done:
-                    futures.pop(fut)
-                    # you can retrieve the original task using: futures.pop(fut)
-                    # can add error catching and re-add to executor here
+                    pkgName = futures.pop(fut)
+                    # failed packages are re-requested by verify()
                     data = fut.result()
-                    self.packages.append(data)
+                    if data is not None:
+                        self.addPackage(data)
+                    else:
+                        self.manifest.addFailed(pkgName)
                 # Schedule the next set of futures.  We don't want more than N
                 # futures in the pool at a time, to keep memory consumption
                 # down.
@@ -1224,48 +1477,328 @@ class CKANAsyncWrapper:
                     # adding the package name to the url, as a param
                     curUrl = f"{pkgShowUrl}{pkgName}"
                     fut = executor.submit(self.packageRequestTask, curUrl)
-                    futures[fut] = curUrl
+                    futures[fut] = pkgName
         # verify everthing we asked for has been returned
         self.verify(packageList)
         LOGGER.debug(f"number of packages fetched: {len(self.packages)}")
 
+    def addPackage(self, packageData):
+        """adds a retrieved package to the packages that will be returned and
+        passes it to the onPackage callback if one was supplied.
+
+        :param packageData: the package that was retrieved
+        :type packageData: dict
+        """
+        self.manifest.addReceived(packageData)
+        self.packages.append(packageData)
+        if self.onPackage is not None:
+            self.onPackage(packageData)
+
     def verify(self, packageList):
         """verifies that all the requested packages have actually been
-        returned, and populated into self.packages struct.
+        returned, using the fetch manifest, and re-requests any that are
+        missing.
 
         :param packageList: list of requested package names
         :type packageList: list
         """
+        missingPkgNames = self.manifest.getMissing(packageList)
         LOGGER.info(f"num requested packages: {len(packageList)}")
-        LOGGER.info(f"packages returned: {len(self.packages)}")
-        if len(packageList) > len(self.packages):
+        LOGGER.info(f"packages returned: {len(packageList) - len(missingPkgNames)}")
+        if missingPkgNames:
             if self.currentRetry < self.maxRetries:
                 self.currentRetry += 1
-                numMissingPkgs = len(packageList) - len(self.packages)
-                LOGGER.warning(f"missing: {numMissingPkgs} packages")
-
-                # iterate through self.pkgData and populate with just names
-                pkgNamesInReturnData = [pkg["name"] for pkg in self.packages]
-                missingPkgNames = [
-                    pkgName
-                    for pkgName in packageList
-                    if pkgName not in pkgNamesInReturnData
-                ]
-
+                LOGGER.warning(f"missing: {len(missingPkgNames)} packages")
                 LOGGER.debug(f"missingPkgNames: {missingPkgNames}")
                 LOGGER.info(f"re-requesting {len(missingPkgNames)} missing packages...")
-                self.pkgFutures = []
                 self.spoolRequests(packageList, missingPkgNames)
             else:
                 msg = (
                     f"after {self.maxRetries} attempts to retrieve all the "
-                    "packages has failed, raising this exception, have retrieved"
-                    f"{len(self.packages)} of {len(packageList)} requested "
-                    "packages"
+                    "packages has failed, raising this exception, have retrieved "
+                    f"{len(packageList) - len(missingPkgNames)} of "
+                    f"{len(packageList)} requested packages"
                 )
                 raise AsyncPackagesGetError(msg)
 
 
+class CKANAsyncIOWrapper(CKANAsyncWrapper):
+    """asyncio based version of CKANAsyncWrapper.  Provides the same
+    getPackages(packageNameList) interface, however instead of spooling the
+    requests through a small thread pool, all the package_show requests are
+    scheduled as coroutines.  The number of requests that are in flight is
+    limited by the throttle for the host, which is shared with the threaded
+    clients, see HTTPClients.getThrottle.
+
+    Failed requests are retried according to the retry policy, see Retry.
+    Waits between retries do not block, so other requests continue to be
+    processed while a failed request is backing off.
+    """
+
+    def __init__(self, baseUrl, apiKey=None, header=None, onPackage=None,
+                 checkpoint=None):
+        CKANAsyncWrapper.__init__(
+            self, baseUrl, apiKey=apiKey, header=header, onPackage=onPackage,
+            checkpoint=checkpoint
+        )
+        self.packageShowEndPoint = "/api/3/action/package_show"
+
+        self.retryPolicy = Retry.getDefaultPolicy()
+        self.throttle = HTTPClients.getThrottle(self.baseUrl)
+
+    def getPackages(self, packageNameList):
+        """Retrieves the list of packages described in the arg: packageNameList
+
+        :param packageNameList: list of packages that need to be retrieved
+        :type packageNameList: list of str
+        :return: list of dicts where each dict describes one of the packages in
+            the 'packageNameList' list.
+        :rtype: list of packages
+        """
+        LOGGER.debug(f"package name list length: {len(packageNameList)}")
+        self.spoolRequests(packageNameList, self.resume(packageNameList))
+        self.manifest.complete()
+        return self.packages
+
+    def spoolRequests(self, packageList, missingPackages=None):
+        """runs the event loop that retrieves the packages, and then verifies
+        that everything that was requested was returned.
+
+        :param packageList: list of package names to retrieve
+        :type packageList: list
+        :param missingPackages: populated with the names of the packages that
+            were not retrieved when verify() re-requests missing packages
+        :type missingPackages: list of package names that failed, optional
+        """
+        pkgs2Get = packageList
+        if missingPackages is not None:
+            pkgs2Get = missingPackages
+        self.manifest.addRequested(pkgs2Get)
+        LOGGER.debug(f"pkgShowUrl: {self.baseUrl}{self.packageShowEndPoint}")
+        # the loop is shared with the pooled sessions and the other fetchers,
+        # it is closed by HTTPClients when the process exits.  Recording the
+        # packages writes to disk, so it is done in a thread of its own to
+        # not hold up the requests on the loop, one package at a time like
+        # the THREADS engine
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            HTTPClients.runCoroutine(self.fetchPackages(pkgs2Get, executor))
+
+        # verify everthing we asked for has been returned
+        self.verify(packageList)
+        LOGGER.debug(f"number of packages fetched: {len(self.packages)}")
+
+    async def fetchPackages(self, pkgNames, executor=None):
+        """coroutine that schedules a request for every package in pkgNames
+        and collects the results into self.packages as they complete.
+
+        :param pkgNames: names of the packages to retrieve
+        :type pkgNames: list of str
+        :param executor: the executor the packages are recorded in, see
+            fetchPackage(), defaults to None, the loop's default executor
+        :type executor: concurrent.futures.Executor, optional
+        """
+        pkgShowUrl = f"{self.baseUrl}{self.packageShowEndPoint}"
+        session = HTTPClients.getAsyncSession(self.baseUrl)
+
+        tasks = [
+            asyncio.ensure_future(
+                self.fetchPackage(session, pkgShowUrl, pkgName, executor)
+            )
+            for pkgName in pkgNames
+        ]
+        completed = 0
+        try:
+            for task in asyncio.as_completed(tasks):
+                await task
+                completed += 1
+                if not completed % 200:
+                    LOGGER.debug(f"total completed: {completed} of {len(pkgNames)}")
+        finally:
+            # the loop is shared and outlives the fetch, so when the fetch is
+            # stopped by an error the requests that are left are cancelled
+            for task in tasks:
+                task.cancel()
+
+    async def fetchPackage(self, session, url, pkgName, executor=None):
+        """retrieves a single package and records the outcome in the fetch
+        manifest, failed packages are re-requested by verify().  The outcome
+        is recorded in the executor, as the manifest, and the onPackage
+        callback, can write to disk
+
+        :param session: the aiohttp session used to make the request
+        :type session: aiohttp.ClientSession
+        :param url: the package_show end point
+        :type url: str
+        :param pkgName: the name of the package to retrieve
+        :type pkgName: str
+        :param executor: the executor the outcome is recorded in, defaults to
+            None, the loop's default executor
+        :type executor: concurrent.futures.Executor, optional
+        """
+        data = await self.packageRequestTask(session, url, pkgName)
+        loop = asyncio.get_event_loop()
+        if data is not None:
+            await loop.run_in_executor(executor, self.addPackage, data)
+        else:
+            await loop.run_in_executor(executor, self.manifest.addFailed, pkgName)
+
+    async def packageRequestTask(self, session, url, pkgName):
+        """retrieves a single package.  Connection errors, timeouts and
+        retryable status codes are retried according to the retry policy, the
+        wait between attempts does not hold a slot in the throttle.
+
+        :param session: the aiohttp session used to make the request
+        :type session: aiohttp.ClientSession
+        :param url: the package_show end point
+        :type url: str
+        :param pkgName: the name of the package to retrieve
+        :type pkgName: str
+        :return: the package data, or None if it could not be retrieved.  Missing
+            packages are re-requested by verify()
+        :rtype: dict
+        """
+        params = {constants.CKAN_SHOW_IDENTIFIER: pkgName}
+        timeout = aiohttp.ClientTimeout(total=self.retryPolicy.requestTimeout)
+        retVal = None
+        attempt = 0
+        while True:
+            await self.throttle.acquireAsync()
+            startTime = time.monotonic()
+            success = False
+            status = None
+            retryAfter = None
+            try:
+                async with session.get(
+                    url, params=params, headers=self.header, timeout=timeout
+                ) as resp:
+                    status = resp.status
+                    err = f"status code: {status}"
+                    retryAfter = resp.headers.get("Retry-After")
+                    success = Throttle.isSuccessStatus(status)
+                    if status == 200:
+                        try:
+                            packageData = await resp.json(content_type=None)
+                            retVal = packageData["result"]
+                        except (ValueError, KeyError, TypeError) as decodeErr:
+                            # recorded as failed, and re-requested by verify()
+                            err = f"invalid response: {decodeErr!r}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as clientErr:
+                err = repr(clientErr)
+            finally:
+                self.throttle.release(success, time.monotonic() - startTime)
+
+            if status is not None and not self.retryPolicy.isRetryableStatus(status):
+                if retVal is None:
+                    LOGGER.warning(f"{err}, package: {pkgName}")
+                break
+            delay = self.retryPolicy.getDelay(attempt, retryAfter)
+            if not self.retryPolicy.canRetry(attempt, delay):
+                LOGGER.error(f"unable to retrieve the package {pkgName}: {err}")
+                break
+            attempt += 1
+            LOGGER.warning(
+                f"request for {pkgName} failed ({err}), retry {attempt} of "
+                f"{self.retryPolicy.maxRetries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+        return retVal
+
+
+class ConditionalPackageFetcher:
+    """Provides the same getPackages(packageNameList) interface as
+    CKANAsyncWrapper, but only calls package_show for packages that have
+    changed since they were last retrieved.
+
+    A listing of the metadata_modified timestamp for every package is retrieved
+    using package_search.  Packages whose timestamp matches the copy in the
+    snapshot store are served from the store, the rest are retrieved with the
+    package fetcher configured for the ckan wrapper and written to the store.
+
+    package_search is backed by solr, which can lag behind the database.  A
+    package whose change has not been indexed yet will be served from the store
+    and picked up on a later run.
+    """
+
+    def __init__(self, ckanWrapper, snapshotStore, onPackage=None):
+        """
+        :param ckanWrapper: wrapper for the ckan instance the packages are
+            retrieved from
+        :type ckanWrapper: CKANWrapper
+        :param snapshotStore: the store where the previously retrieved packages
+            are kept
+        :type snapshotStore: SnapshotStore.SnapshotStore
+        :param onPackage: callable that is called with each package, whether
+            it is served from the store or retrieved, defaults to None
+        :type onPackage: callable, optional
+        """
+        self.ckanWrapper = ckanWrapper
+        self.snapshotStore = snapshotStore
+        self.onPackage = onPackage
+
+    def getPackages(self, packageNameList):
+        """Retrieves the list of packages described in the arg: packageNameList
+
+        :param packageNameList: list of packages that need to be retrieved
+        :type packageNameList: list of str
+        :return: list of dicts where each dict describes one of the packages in
+            the 'packageNameList' list.
+        :rtype: list of packages
+        """
+        listing = self.ckanWrapper.getPackageModifiedListing()
+
+        packages = []
+        pkgs2Get = []
+        for pkgName in packageNameList:
+            cachedPkg = None
+            modified = listing.get(pkgName)
+            if modified is not None and pkgName in self.snapshotStore:
+                cachedPkg = self.snapshotStore.getRecord(pkgName)
+            if cachedPkg is not None and isSameTimeStamp(
+                cachedPkg.get("metadata_modified"), modified
+            ):
+                packages.append(cachedPkg)
+                if self.onPackage is not None:
+                    self.onPackage(cachedPkg)
+            else:
+                pkgs2Get.append(pkgName)
+        LOGGER.info(
+            f"packages unchanged: {len(packages)}, packages to retrieve: "
+            f"{len(pkgs2Get)}"
+        )
+
+        # packages that no longer exist are removed from the store
+        requestedNames = set(packageNameList)
+        for pkgName in self.snapshotStore.getIds():
+            if pkgName not in requestedNames:
+                self.snapshotStore.removeRecord(pkgName)
+
+        if pkgs2Get:
+            fetcher = self.ckanWrapper.getPackageFetcher(
+                onPackage=combineCallbacks(self.snapshotStore.putRecord, self.onPackage)
+            )
+            packages.extend(fetcher.getPackages(pkgs2Get))
+        self.snapshotStore.save()
+        return packages
+
+
+def combineCallbacks(*callbacks):
+    """
+    :param callbacks: callables that take a single argument, None values are
+        skipped
+    :type callbacks: callable
+    :return: callable that calls each of the callbacks in turn, None if there
+        aren't any callbacks
+    :rtype: callable
+    """
+    callbacks = [callback for callback in callbacks if callback is not None]
+
+    def callAll(value):
+        for callback in callbacks:
+            callback(value)
+
+    return callAll if callbacks else None
+
+
 # ----------------- EXCEPTIONS
 class CKANPackagesGetError(Exception):
     """CKAN instances seem to randomely go offline when in the middle of paging
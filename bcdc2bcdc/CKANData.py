@@ -14,11 +14,11 @@ CKANTransform module will work directly with CKAN Data objects.
 """
 # pylint: disable=logging-format-interpolation
 
+import copy
 import json
 import logging
 import os
 import pprint
-import sys
 
 import json_delta
 
@@ -29,7 +29,7 @@ import bcdc2bcdc.CustomTransformers as CustomTransformers
 import bcdc2bcdc.Diff as Diff
 
 LOGGER = logging.getLogger(__name__)
-TRANSCONF = CKANTransform.TransformationConfig()
+TRANSCONF = CKANTransform.getSharedConfig()
 
 # pylint: disable=protected-access
 
@@ -57,8 +57,37 @@ def validateTypeIsComparable(dataObj1, dataObj2):
         raise IncompatibleTypesException(msg)
 
 
+def isSameValue(currentValue, newValue):
+    """
+    :return: True if setting currentValue to newValue would not change a
+        struct, used to avoid copying nodes when a transformation sets a value
+        that is already set
+    :rtype: bool
+    """
+    if currentValue is newValue:
+        return True
+    return (
+        type(currentValue) is type(newValue)
+        and isinstance(newValue, (str, int, float))
+        and currentValue == newValue
+    )
+
+
 # ------------- Data Record defs -------------
 
+# bit flags for the transformations that have been applied to a record, see
+# CKANRecord.operations
+OP_COMPARABLE_STRUCT = 1 << 0
+OP_ADD_UPDATE_STRUCT = 1 << 1
+OP_ID_REMAPPING = 1 << 2
+OP_AUTOGEN_FIELDS = 1 << 3
+OP_REQUIRED_FIELDS = 1 << 4
+# custom transformations are tracked separately for each update type
+OP_CUSTOM_TRANSFORMATIONS = {
+    updateType: 1 << (5 + typeCnt)
+    for typeCnt, updateType in enumerate(constants.UPDATE_TYPES)
+}
+
 # should spit CKANRecord functionality into a container for the data with
 # some surrounding methods for data retrieval like unique id.
 # then another class that extends that where the corresponding record can be
@@ -78,28 +107,56 @@ class CKANRecord:
     :ivar updateableJsonData: Derived from "comparableJsonData".  This version
         includes additional modifications that are required for the data to be
         used in either an ADD or and UPDATE operation.
-    :ivar operations: This list keeps track of the methods that have been run that
-        transform the data.  Used to prevent tranformations that have already been
-        run from being re-run
-
+    :ivar operations: Bit flags, the OP_* constants, that keep track of the
+        methods that have been run that transform the data.  Used to prevent
+        tranformations that have already been run from being re-run
+    :ivar privateNodes: the ids of the dicts and lists in the comparable and
+        the updateable structs that are not shared with any other struct, keyed
+        by the name of the struct.  Other nodes are copied before they are
+        modified, see setStructValue()
+    :ivar comparableHash: the content hash of the comparable struct, see
+        getComparableHash()
+
+    The updateable struct starts out sharing everything below its top level
+    with the comparable struct, which shares values with jsonData.  The
+    transformations copy a node the first time they change it, so jsonData
+    and the comparable struct are not modified when the updateable struct is
+    generated, and nodes that are not changed are not copied.
+
+    Records use __slots__, as there is one for every object in both the src
+    and the dest instance.
     """
 
+    __slots__ = (
+        "jsonData",
+        "dataType",
+        "origin",
+        "comparableJsonData",
+        "updateableJsonData",
+        "operations",
+        "privateNodes",
+        "comparableHash",
+        "destRecord",
+        "dataCache",
+        "customTransformerParams",
+    )
+
     def __init__(self, jsonData, dataType, origin, dataCache):
         self.jsonData = jsonData
         self.dataType = dataType
         self.origin = origin
-        self.userPopulatedFields = TRANSCONF.getUserPopulatedProperties(self.dataType)
 
         self.comparableJsonData = None  # populated when you call getComparableStruct()
         self.updateableJsonData = (
             None  # populated when you call getComparableStructUsedForAddUpdate()
         )
-        self.operations = []
+        self.operations = 0
+        self.privateNodes = None
+        self.comparableHash = None
 
         self.destRecord = None
-        # after a diff has been run for update objects this will be
-        self.diff = None
         self.dataCache = dataCache
+        self.customTransformerParams = None
 
     def getFieldValue(self, fieldName):
         return self.jsonData[fieldName]
@@ -114,7 +171,7 @@ class CKANRecord:
         # look up the name of the field in the transformation configuration
         # that describes the unique id field
         # get the unique id field value from the dict
-        uniqueFieldName = TRANSCONF.getUniqueField(self.dataType)
+        uniqueFieldName = TRANSCONF.getDataTypeConfig(self.dataType).uniqueField
         return self.jsonData[uniqueFieldName]
 
     def getComparableStruct(self):
@@ -140,16 +197,12 @@ class CKANRecord:
         #       structure that sits behind the CKANRecord
         #       see applyRequiredFields() and applyCustomTransformations() as
         #       examples of the pattern
-        methodName = sys._getframe().f_code.co_name
-        if methodName not in self.operations:
+        if not self.operations & OP_COMPARABLE_STRUCT:
             # removing the non user generated properties
-            self.comparableJsonData = self.jsonData.copy()
             self.comparableJsonData = self.filterNonUserGeneratedFields()
 
             # remove embedded ignores
-            dataCell = DataCell(self.comparableJsonData, self.dataCache, self.origin)
-            dataCellNoIgnores = self.removeEmbeddedIgnores(dataCell)
-            self.comparableJsonData = dataCellNoIgnores.struct
+            self.comparableJsonData = self.removeEmbeddedIgnores()
 
             if self.origin == constants.DATA_SOURCE.SRC:
                 # add required fields to the source
@@ -166,103 +219,129 @@ class CKANRecord:
             # the current situation
             self.applyCustomTransformations(constants.UPDATE_TYPES.COMPARE)
 
-            self.operations.append(methodName)
+            self.operations |= OP_COMPARABLE_STRUCT
 
         return self.comparableJsonData
 
-    def filterNonUserGeneratedFields(self, struct=None, flds2Include=None):
-        """Receives the data returned by one of the CKAN end points, recursively
-        iterates over it returning a new data structure that contains only the
-        fields that are user populated.  (removing auto generated fields).
+    def getComparableHash(self):
+        """The hash is calculated once, the comparable struct is not modified
+        once it has been generated.
+
+        :return: the content hash of the comparable struct, records with the
+            same hash have no diff, see Diff.getContentHash()
+        :rtype: bytes
+        """
+        if self.comparableHash is None:
+            self.comparableHash = Diff.getContentHash(self.getComparableStruct())
+        return self.comparableHash
+
+    def releaseComparable(self):
+        """Drops the comparable and updateable structs once the record has
+        been compared and is not going to be sent to the api, to limit the
+        memory used by large datasets.  They are recalculated if they are
+        requested again.
+        """
+        self.comparableJsonData = None
+        self.updateableJsonData = None
+        self.privateNodes = None
+        self.comparableHash = None
+        # all the operations modify the structs, so they all need to be rerun
+        self.operations = 0
+
+    def getStructName(self, updateType):
+        """
+        :param updateType: the type of operation the struct is used for
+        :type updateType: constants.UPDATE_TYPES
+        :return: the name of the attribute with the struct that is modified
+            for the update type, the comparable struct for COMPARE and the
+            updateable struct for ADD and UPDATE
+        :rtype: str
+        """
+        if updateType == constants.UPDATE_TYPES.COMPARE:
+            return "comparableJsonData"
+        return "updateableJsonData"
+
+    def setStructValue(self, updateType, path, value):
+        """Sets a value in the struct for the update type, see getStructName().
+        The dicts and lists on the path to the value are copied if they are
+        shared with another struct, the struct is not modified if the value is
+        already set.
+
+        :param updateType: the type of operation the struct is used for
+        :type updateType: constants.UPDATE_TYPES
+        :param path: the keys / list positions of the value, example:
+            ("resources", 0, "name")
+        :type path: tuple
+        :param value: the value to set
+        :type value: any
+        """
+        parentPath, key = path[:-1], path[-1]
+        parent = self.__getNode(updateType, parentPath)
+        if isinstance(parent, dict) and key in parent:
+            if isSameValue(parent[key], value):
+                return
+        self.__getPrivateNode(updateType, parentPath)[key] = value
+
+    def deleteStructValue(self, updateType, path):
+        """Deletes a value from the struct for the update type, copying the
+        dicts and lists on the path to the value if they are shared with
+        another struct.  Does nothing if the value does not exist.
+
+        :param updateType: the type of operation the struct is used for
+        :type updateType: constants.UPDATE_TYPES
+        :param path: the keys / list positions of the value
+        :type path: tuple
+        """
+        parentPath, key = path[:-1], path[-1]
+        if key in self.__getNode(updateType, parentPath):
+            del self.__getPrivateNode(updateType, parentPath)[key]
+
+    def __getNode(self, updateType, path):
+        node = getattr(self, self.getStructName(updateType))
+        for key in path:
+            node = node[key]
+        return node
+
+    def __getPrivateNode(self, updateType, path):
+        """returns the node at the path in the struct for the update type,
+        first copying it and any node above it that is shared with another
+        struct
+        """
+        structName = self.getStructName(updateType)
+        if self.privateNodes is None:
+            self.privateNodes = {}
+        privateNodes = self.privateNodes.setdefault(structName, set())
+        node = getattr(self, structName)
+        if id(node) not in privateNodes:
+            node = copy.copy(node)
+            privateNodes.add(id(node))
+            setattr(self, structName, node)
+        for key in path:
+            child = node[key]
+            if id(child) not in privateNodes:
+                child = copy.copy(child)
+                privateNodes.add(id(child))
+                node[key] = child
+            node = child
+        return node
+
+    def filterNonUserGeneratedFields(self):
+        """Receives the data returned by one of the CKAN end points, returns a
+        new data structure that contains only the fields that are user
+        populated.  (removing auto generated fields).
 
         Field definitions are retrieved from the transformation configuration
-        file.
+        file, and compiled once for each datatype into a projection, see
+        CKANTransform.compileProjection().  Fields that are defined but are
+        missing from the record are set to None.  jsonData is not modified.
 
-        :param struct: The input CKAN data structure
-        :type struct: list, dict
-        :param flds2Include: Used internally during recursion to ensure the
-            userfields line up with the current level of recursion, defaults to None
-        :type flds2Include: list / dict, optional
         :return: The new data structure with only user generated fields
-        :rtype: dict or list
-        """
-        if struct is None and flds2Include is None:
-            if self.comparableJsonData is None:
-                self.comparableJsonData = self.jsonData.copy()
-            struct = self.comparableJsonData
-            flds2Include = self.userPopulatedFields
-
-        newStruct = None
-
-        # only fields defined in this struct should be included in the output
-        if isinstance(flds2Include, list):
-            # currently assuming that if a list is found there will be a single
-            # record in the flds2Include configuration that describe what to
-            # do with each element in the list
-            return self.__filterUserGenFieldsList(struct, flds2Include)
-        elif isinstance(flds2Include, dict):
-            newStruct = self.__filterUserGenFieldsDict(struct, flds2Include)
-
-            return newStruct
-        elif isinstance(flds2Include, bool):
-            return struct
-        return newStruct
-
-    def __filterUserGenFieldsList(self, struct, flds2Include):
-        newStruct = []
-        if isinstance(flds2Include[0], dict):
-            for structElem in struct:
-                dataValue = self.filterNonUserGeneratedFields(
-                    structElem, flds2Include[0]
-                )
-                newStruct.append(dataValue)
-            return newStruct
-
-    def __filterUserGenFieldsDict(self, struct, flds2Include):
-        """Used by the filterNonUserGeneratedFields method.
-        filterNonUserGeneratedFields iterates recursively over the data found
-        in particular object.  Looking for property definitions in the
-        flds2Include structure.  If a field is either not found or the
-        definition or the field in flds2Include is false then the property will
-        not be included in the returned data structure.
-
-        During the recursion if, an iteration encouters a dict data structure
-        this method is called with that structure.  It iterates over the
-        flds2Include properties.  If a field is found to be required in the
-        flds2Include it is added to the struct. filterNonUserGeneratedFields
-        then gets called on the actual key and corresponding value and the
-        equivalent data structure in the flds2Include
-
-        :param struct: The input dictionary to evalute
-        :type struct: dict
-        :param flds2Include: The input dictionary that describes the required
-            properties for the 'struct'
-        :type flds2Include: dict
-        :return: a dictionary that only includes properties that are defined in
-            the flds2Include dict
         :rtype: dict
         """
-        newStruct = {}
-        for key in flds2Include:
-            # if the key is a datatype then:
-            #   - get the unique-id for that data type
-            #   - get the ignore list for that data type
-            #   - check each value to make sure its not part
-            #        of an ignore list.  If it is then do not
-            #        include the data.
-            # thinking this is part of a post process that should be run
-            # after the comparable struct is generated.
-            if key not in struct:
-                # field is defined as being required but is not in the object
-                # that was returned.  Setting it equal to None
-                struct[key] = None
-
-            newStruct[key] = self.filterNonUserGeneratedFields(
-                struct[key], flds2Include[key]
-            )
-        return newStruct
+        projection = TRANSCONF.getUserPopulatedProjection(self.dataType)
+        return projection(self.jsonData)
 
-    def removeEmbeddedIgnores(self, dataCell):
+    def removeEmbeddedIgnores(self, struct=None):
         """many data structs in CKAN can contain embedded data types.  Example
         of data types in CKAN: users, groups, organizations, packages, resources
 
@@ -280,37 +359,59 @@ class CKANRecord:
         list of embedded data types and not include these when differences between
         two objects are calculated.
 
-        This method will recursively iterate through the data structure:
-        * identify if a property is an embedded type.
-        * If so remove any children that match the ignore_list defined for the
-          type that is being embedded.
+        The paths in the comparable struct that can contain embedded data are
+        found when the transformation config is loaded, see
+        CKANTransform.compileIgnorePruner().  Embedded records are removed when
+        their unique id is in the ignore list for their type, or in the ignores
+        cached by the data cache.
 
-        :param struct: [description]
-        :type struct: [type]
+        :param struct: the comparable struct to remove the embedded ignores
+            from, defaults to comparableJsonData
+        :type struct: dict, optional
+        :return: the struct with the embedded ignores removed
+        :rtype: dict
         """
-        # need to figure out how to remove non
-        if isinstance(dataCell.struct, dict):
-            for objProperty in dataCell.struct:
-                newCell = dataCell.generateNewCell(objProperty)
-                newCell = self.removeEmbeddedIgnores(newCell)
-                dataCell.copyChanges(newCell)
-        elif isinstance(dataCell.struct, list):
-            positions2Remove = []
-            for listPos in range(0, len(dataCell.struct)):
-                newCell = dataCell.generateNewCell(listPos)
-                newCell = self.removeEmbeddedIgnores(newCell)
-                if not newCell.include:
-                    positions2Remove.append(listPos)
-            dataCell.deleteIndexes(positions2Remove)
-        return dataCell
+        if struct is None:
+            struct = self.comparableJsonData
+        pruner = TRANSCONF.getDataTypeConfig(self.dataType).embeddedIgnorePruner
+        if pruner is not None:
+            struct = pruner(struct, self.getEmbeddedIgnores)
+        return struct
 
-    def __eq__(self, inputRecord):
-        diff = self.getDiff(inputRecord)
+    def getEmbeddedIgnores(self, dataType):
+        """
+        :param dataType: the type of the embedded records
+        :type dataType: str
+        :return: the unique ids of the embedded records of the type that are
+            ignored
+        :rtype: frozenset
+        """
+        return self.dataCache.ignores.getIgnoreSet(dataType, self.origin)
 
-        retVal = True
-        if diff:
-            retVal = False
-        return retVal
+    def __eq__(self, inputRecord):
+        return self.isSame(inputRecord)
+
+    def isSame(self, inputRecord):
+        """yes / no version of getDiff(), stops comparing at the first
+        difference found.  The lists in the comparable structs, including the
+        resources, are compared regardless of order, so a package is the same
+        when getDiff() would not find a diff.  When data debug is enabled
+        getDiff() is used so the diffs are still logged and dumped.
+
+        :param inputRecord: the record to compare this record with
+        :type inputRecord: CKANRecord
+        :return: True if the records are the same
+        :rtype: bool
+        """
+        if constants.isDataDebug():
+            return not self.getDiff(inputRecord)
+        if self.getComparableHash() == inputRecord.getComparableHash():
+            return True
+        if self.isIgnore(inputRecord):
+            return True
+        return Diff.Diff(
+            self.getComparableStruct(), inputRecord.getComparableStruct()
+        ).isSame()
 
     def isIgnore(self, inputRecord):
         """evaluates the current record to determine if it is defined in the
@@ -320,8 +421,9 @@ class CKANRecord:
         :type inputRecord: dict
         """
         retVal = False
-        ignoreField = TRANSCONF.getUniqueField(self.dataType)
-        ignoreList = TRANSCONF.getIgnoreList(self.dataType)
+        dataTypeConfig = TRANSCONF.getDataTypeConfig(self.dataType)
+        ignoreField = dataTypeConfig.uniqueField
+        ignoreList = dataTypeConfig.ignoreList
         if (ignoreField in inputRecord.jsonData) and inputRecord.jsonData[ignoreField] in ignoreList:
             retVal = True
         return retVal
@@ -366,9 +468,7 @@ class CKANRecord:
                  type defined in "operationType"
         :rtype: dict
         """
-        methodName = sys._getframe().f_code.co_name
-
-        if methodName not in self.operations:
+        if not self.operations & OP_ADD_UPDATE_STRUCT:
             if destRecord is None and operationType == constants.UPDATE_TYPES.ADD:
                 # for adds don't need the dest record!
                 # ADDS
@@ -380,8 +480,12 @@ class CKANRecord:
             # for source data will apply the default field calculations
 
             # init the structure that will contain the updateable json
-            # make sure this has the required fields in it
-            self.updateableJsonData = self.getComparableStruct()
+            # make sure this has the required fields in it.  Only the top
+            # level is copied, nested values are copied when they are changed
+            self.updateableJsonData = dict(self.getComparableStruct())
+            if self.privateNodes is None:
+                self.privateNodes = {}
+            self.privateNodes["updateableJsonData"] = {id(self.updateableJsonData)}
 
             # double check that this is being run on a source object
             if self.origin != constants.DATA_SOURCE.SRC:
@@ -414,15 +518,14 @@ class CKANRecord:
                 # are configured for ADD or UPDATE, otherwise they will already
                 # have been run
                 self.applyCustomTransformations(operationType)
-            self.operations.append(methodName)
+            self.operations |= OP_ADD_UPDATE_STRUCT
         return self.updateableJsonData
 
     def applyIdRemapping(self, dataCache):
         # LOGGER.debug("REMAP FIELDS")
 
-        methodName = sys._getframe().f_code.co_name
-        if methodName not in self.operations:
-            idFields = TRANSCONF.getIdFieldConfigs(self.dataType)
+        if not self.operations & OP_ID_REMAPPING:
+            idFields = TRANSCONF.getDataTypeConfig(self.dataType).idFieldConfigs
             for idRemapObj in idFields:
                 # properties of the idRemapObj, and some sample values
                 #  * property": "owner_org",
@@ -452,7 +555,7 @@ class CKANRecord:
                     # the autogen id is dest already.  Make sure its added to the
                     # updateable object
                     self.updateableJsonData[parentFieldName] = parentFieldValue
-            self.operations.append(methodName)
+            self.operations |= OP_ID_REMAPPING
 
     def applyAutoGenFields(self, destRecord, actionType):
         """Some fields that are autogenerated by the API are 'required' fields
@@ -466,17 +569,20 @@ class CKANRecord:
         :type destRecord: CKANRecord
         """
         # TODO: complete adding logic to complete this operation
-        methodName = sys._getframe().f_code.co_name
-        if methodName not in self.operations:
+        if not self.operations & OP_AUTOGEN_FIELDS:
             if actionType == constants.UPDATE_TYPES.ADD:
-                fields2Add = TRANSCONF.getFieldsToIncludeOnAdd(self.dataType)
+                fields2Add = TRANSCONF.getDataTypeConfig(
+                    self.dataType
+                ).fieldsToIncludeOnAdd
             elif actionType == constants.UPDATE_TYPES.UPDATE:
-                fields2Add = TRANSCONF.getFieldsToIncludeOnUpdate(self.dataType)
+                fields2Add = TRANSCONF.getDataTypeConfig(
+                    self.dataType
+                ).fieldsToIncludeOnUpdate
             if fields2Add:
                 for field2Add in fields2Add:
                     fieldValue = destRecord.getFieldValue(field2Add)
                     self.updateableJsonData[field2Add] = fieldValue
-            self.operations.append(methodName)
+            self.operations |= OP_AUTOGEN_FIELDS
 
     def applyCustomTransformations(self, applicationType,
                                    customTransformationConfig=None):
@@ -503,22 +609,21 @@ class CKANRecord:
         # custom transformers are configured so that when they are called for
         # COMPARE they know to modify the structure that is used for comparison
         # and when called for ADD / UPDATE they modify a different structure.
-        # Adding the name of the operation type to the method name to keep track
-        # of which custom transformations have been run.
+        # Each operation type has its own flag to keep track of which custom
+        # transformations have been run.
         #
-        methodName = sys._getframe().f_code.co_name
-        methodName = f"{methodName}.{applicationType.name}"
+        operationFlag = OP_CUSTOM_TRANSFORMATIONS[applicationType]
         # has this already been run on this record?
-        if methodName not in self.operations:
+        if not self.operations & operationFlag:
             # if no customTransformationConfig provided then retrieve one from the
             # config file
             if not customTransformationConfig:
                 # customTransformationConfig = TRANSCONF.getCustomUpdateTransformations(
                 #    self.dataType)
                 # gets all custom transformations for all types
-                customTransformationConfig = TRANSCONF.getCustomTranformations(
+                customTransformationConfig = TRANSCONF.getDataTypeConfig(
                     self.dataType
-                )
+                ).customTransformations
 
             # if there is a custom tranformation for the current datatype
             if customTransformationConfig:
@@ -536,7 +641,7 @@ class CKANRecord:
 
 
                 for customTransformer in customTransformationConfig:
-                    self.__runCustomTransformer(applicationType, methMap, customTransformer, methodName)
+                    self.__runCustomTransformer(applicationType, methMap, customTransformer, operationFlag)
 
                     # # run the custom transformer that are configured for the current applicationType
                     # if (
@@ -553,10 +658,8 @@ class CKANRecord:
                     #     methodCall(self)
                     #     # struct = methodCall([self.comparableJsonData])
                     #     # self.comparableJsonData = struct.pop()
-                    #     if methodName not in self.operations:
-                    #         self.operations.append(methodName)
 
-    def __runCustomTransformer(self, applicationType, methodMap, customTransformerDict, methodName):
+    def __runCustomTransformer(self, applicationType, methodMap, customTransformerDict, operationFlag):
         # run the custom transformer that are configured for the current applicationType
         if (
             customTransformerDict[constants.CUSTOM_UPDATE_TYPE]
@@ -569,21 +672,21 @@ class CKANRecord:
             methodCall = methodMap.getCustomMethodCall(customTransformerName)
             self.customTransformerParams = {"updateType": applicationType}
             methodCall(self)
-            if methodName not in self.operations:
-                self.operations.append(methodName)
+            self.operations |= operationFlag
 
 
     def applyRequiredFields(self):
         """retrieves the required field config if it exists for the current
         data/object type.  Then reads it and applies the default values.
         """
-        methodName = sys._getframe().f_code.co_name
-        if methodName not in self.operations:
+        if not self.operations & OP_REQUIRED_FIELDS:
 
             if self.comparableJsonData is None:
                 self.comparableJsonData = self.jsonData.copy()
 
-            defaultFields = TRANSCONF.getRequiredFieldDefaultValues(self.dataType)
+            defaultFields = TRANSCONF.getDataTypeConfig(
+                self.dataType
+            ).requiredFieldDefaultValues
             if defaultFields:
                 currentDataset = self.comparableJsonData
                 for fieldName in defaultFields:
@@ -594,9 +697,17 @@ class CKANRecord:
                     populator = DataPopulator(currentDataset)
                     currentDataset = populator.populateField(fieldName, fieldValue)
                 self.comparableJsonData = currentDataset
-            self.operations.append(methodName)
+            self.operations |= OP_REQUIRED_FIELDS
 
     def getResourceDiff(self, inputRecord):
+        """Compares the resources of the two packages, the resources are
+        matched on the properties in the env var CKAN_RESOURCE_DIFF_KEY, see
+        Diff.KeyedDiff
+
+        :return: the resources that were added, removed or changed, empty or
+            None if no diff is found
+        :rtype: list of Diff.KeyedChange
+        """
         diff = None
 
         cacheFiles = None
@@ -604,20 +715,24 @@ class CKANRecord:
 
         if not self.isIgnore(inputRecord):
             thisComparable = self.getComparableStruct()
-            thisComparable = thisComparable.copy()
             inputComparable = inputRecord.getComparableStruct()
-            inputComparable = inputComparable.copy()
 
             diff = None
             # remove resources and compare separately
             if "resources" in thisComparable and "resources" in inputComparable:
-                resource1 = thisComparable["resources"].copy()
-                resource2 = inputComparable["resources"].copy()
+                resource1 = thisComparable["resources"]
+                resource2 = inputComparable["resources"]
 
-                resDiffIngoreEmptyTypes = Diff.Diff(resource1, resource2)
+                if isinstance(resource1, list) and isinstance(resource2, list):
+                    resDiffIngoreEmptyTypes = Diff.KeyedDiff(
+                        resource1, resource2, constants.getResourceDiffKey()
+                    )
+                else:
+                    resDiffIngoreEmptyTypes = Diff.Diff(resource1, resource2)
                 diff = resDiffIngoreEmptyTypes.getDiff()
 
                 if diff:
+                    LOGGER.debug(f"resource Diff: {diff}")
                     # This is all debugging code to help resolve change detection
                     # issues.
                     # debugging... writing the resources for closer examination
@@ -639,18 +754,13 @@ class CKANRecord:
 
     def getPackageDiff(self, inputRecord):
         """
-        deepdiff does not seem to be working for list of dicts.  Package
-        resources are effected by this.  Have modified how package diffs
-        are calculated so diffs are first calculated on resources then on
-        packages.
-
-        links relateing to diff on complex data structures:
-
-        * https://gist.github.com/samuraisam/901117
-        * https://pypi.org/project/deep/
+        Diffs are first calculated on the resources then on the rest of the
+        package, see getResourceDiff()
 
-        :return: the diff data structure, empty if no diff is found
-        :rtype: []
+        :return: the resources that are different, see getResourceDiff(), or
+            the paths that are different in the rest of the package, see
+            Diff.Diff.getDiff().  Empty if no diff is found
+        :rtype: list
         """
         diff = None
 
@@ -664,21 +774,27 @@ class CKANRecord:
             # the ignore list
             if not self.isIgnore(inputRecord):
                 thisComparable = self.getComparableStruct()
-                thisComparable = thisComparable.copy()
                 inputComparable = inputRecord.getComparableStruct()
-                inputComparable = inputComparable.copy()
 
-                diffIngoreEmptyTypes = Diff.Diff(thisComparable, inputComparable)
+                if "resources" in thisComparable and "resources" in inputComparable:
+                    # the resources have already been compared
+                    diffIngoreEmptyTypes = Diff.Diff(
+                        {key: value for key, value in thisComparable.items() if key != "resources"},
+                        {key: value for key, value in inputComparable.items() if key != "resources"},
+                    )
+                else:
+                    diffIngoreEmptyTypes = Diff.Diff(thisComparable, inputComparable)
                 pkgDiff = diffIngoreEmptyTypes.getDiff()
-
-                jsonDiff = json_delta.diff(thisComparable, inputComparable, verbose=verbosity)
-                LOGGER.debug(f"package Diff: {jsonDiff}")
+                LOGGER.debug(f"package Diff: {pkgDiff}")
                 diff = pkgDiff
 
             if pkgDiff and constants.isDataDebug():
                 recordName = self.getUniqueIdentifier()
                 LOGGER.debug(f"record name with diff: {recordName}")
 
+                jsonDiff = json_delta.diff(thisComparable, inputComparable, verbose=verbosity)
+                LOGGER.debug(f"package json diff: {jsonDiff}")
+
                 if cacheFiles is None:
                     cacheFiles = CacheFiles.CKANCacheFiles()
 
@@ -696,7 +812,10 @@ class CKANRecord:
         # retrieve a comparable structure, and remove embedded data types
         # that have been labelled as ignores
         diff = None
-        if inputRecord.dataType == "packages":
+        if self.getComparableHash() == inputRecord.getComparableHash():
+            # same content, no need to calculate the diff
+            LOGGER.debug(f"same content hash: {self.getUniqueIdentifier()}")
+        elif inputRecord.dataType == "packages":
             diff = self.getPackageDiff(inputRecord)
         else:
             diff = self.getGenericDiff(inputRecord)
@@ -763,82 +882,9 @@ class CKANRecord:
         return json.dumps(self.jsonData)
 
 
-class DataCell:
-    """an object that can be used to wrap a data value and other meta data
-    about it from the perspective of a change
-    """
-
-    def __init__(self, struct, dataCache, origin, include=True):
-        self.struct = struct
-        self.dataCache = dataCache
-        self.origin = origin
-        self.include = include
-        self.ignoreList = None
-        self.ignoreFld = None
-        self.parent = None
-        self.parentType = None
-        self.parentKey = None
-
-    def copyChanges(self, childDataCell):
-        self.struct[childDataCell.parentKey] = childDataCell.struct
-
-    def deleteIndexes(self, positions):
-        """gets a list of the position that are to be trimmed from the struct
-
-        :param positions: a list of index positions for the self.struct list that
-            are to be removed.
-        :type positions: list of ints
-        """
-        newStruct = []
-        for pos in range(0, len(self.struct)):
-            if pos not in positions:
-                newStruct.append(self.struct[pos])
-        self.struct = newStruct
-
-    def generateNewCell(self, key):
-        """The current cell is a dict, generates a new cell for the position
-        associated with the input key.
-
-        :param key: a key of struct property
-        :type key: str
-        """
-        newCell = DataCell(self.struct[key], self.dataCache, self.origin)
-        newCell.parent = self
-        newCell.parentKey = key
-        # copy the attributes from parent to child
-        newCell.include = self.include
-        newCell.ignoreList = self.ignoreList
-        newCell.ignoreFld = self.ignoreFld
-        newCell.parentType = self.parentType
-
-        # if the key is an embedded type, users, groups, etc...
-        if key in constants.VALID_TRANSFORM_TYPES:
-            newCell.ignoreList = TRANSCONF.getIgnoreList(key)
-            newCell.ignoreFld = TRANSCONF.getUniqueField(key)
-            newCell.parentType = key
-
-        if newCell.parentType is not None:
-            # if the key is equal to the name of the ignore field
-            if (  (newCell.ignoreFld) and
-                      key == newCell.ignoreFld):
-                # example key is 'name' and the ignore field is name
-                # now check to see if the value is in the ignore list
-                # also check that not in the datacache ignore list
-                # dataType in parentType, value in struct
-                if (
-                    newCell.struct in newCell.ignoreList
-                    or newCell.dataCache.ignores.isIgnored(
-                        newCell.parentType, newCell.origin, newCell.struct
-                    )
-                ):
-                    # continue with example.. now the value for the key name
-                    # is in the ignore list.  Set the enclosing object... self
-                    # to not be included.
-                    self.include = False
-        return newCell
-
-
 class CKANUserRecord(CKANRecord):
+    __slots__ = ("duplicateEmail",)
+
     def __init__(self, jsonData, origin, dataCache):
         recordType = constants.TRANSFORM_TYPE_USERS
         CKANRecord.__init__(self, jsonData, recordType, origin, dataCache)
@@ -854,18 +900,24 @@ class CKANUserRecord(CKANRecord):
 
 
 class CKANGroupRecord(CKANRecord):
+    __slots__ = ()
+
     def __init__(self, jsonData, origin, dataCache):
         recordType = constants.TRANSFORM_TYPE_GROUPS
         CKANRecord.__init__(self, jsonData, recordType, origin, dataCache)
 
 
 class CKANOrganizationRecord(CKANRecord):
+    __slots__ = ()
+
     def __init__(self, jsonData, origin, dataCache):
         recordType = constants.TRANSFORM_TYPE_ORGS
         CKANRecord.__init__(self, jsonData, recordType, origin, dataCache)
 
 
 class CKANPackageRecord(CKANRecord):
+    __slots__ = ()
+
     def __init__(self, jsonData, origin, dataCache):
         recordType = constants.TRANSFORM_TYPE_PACKAGES
         CKANRecord.__init__(self, jsonData, recordType, origin, dataCache)
@@ -1225,9 +1277,9 @@ class CKANDataSetDeltas:
 
         if isinstance(inputDataStruct, list):
             iterObj = range(0, len(inputDataStruct))
-            uniqueIdField = TRANSCONF.getUniqueField(
+            uniqueIdField = TRANSCONF.getDataTypeConfig(
                 recordCalls[additionalFieldSource].dataType
-            )
+            ).uniqueField
         else:
             iterObj = inputDataStruct
 
@@ -1348,7 +1400,9 @@ class CKANDataSet(CKANRecordCollection):
         self.dataCache = dataCache
         self.origin = origin
 
-        self.userPopulatedFields = TRANSCONF.getUserPopulatedProperties(self.dataType)
+        self.userPopulatedFields = TRANSCONF.getDataTypeConfig(
+            self.dataType
+        ).userPopulatedProperties
         self.iterCnt = 0
 
         self.srcUniqueIdSet = None
@@ -1361,8 +1415,11 @@ class CKANDataSet(CKANRecordCollection):
             self.destUniqueIdSet = set(destDataSet.getUniqueIdentifiers())
 
     def getIgnoreList(self):
-        ignoreList = TRANSCONF.getIgnoreList(self.dataType)
-        return ignoreList
+        """
+        :return: the unique ids of the records that are not updated
+        :rtype: frozenset
+        """
+        return TRANSCONF.getDataTypeConfig(self.dataType).ignoreList
 
     def calcDeleteCollection(self, destDataSet):
         """gets a set of unique ids from the source and destination ckan instances,
@@ -1423,9 +1480,23 @@ class CKANDataSet(CKANRecordCollection):
                 addCollection.addRecord(addRecord)
         return addCollection
 
-    def calcUpdatesCollection(self, destDataSet):
-
+    def calcUpdatesCollection(self, destDataSet, knownDiffs=None):
+        """Compares the records that exist in both the source and the
+        destination datasets, returning the source records that differ.
+
+        :param destDataSet: the destination dataset
+        :type destDataSet: CKANDataSet
+        :param knownDiffs: results of comparisons that have already been made,
+            unique id: True if the records differ.  Only used when the records
+            that were compared are the records in the datasets, see
+            DeltaStream, defaults to None
+        :type knownDiffs: dict, optional
+        :return: the source records that should be updated
+        :rtype: CKANRecordCollection
+        """
         self.populateDataSets(destDataSet)
+        if knownDiffs is None:
+            knownDiffs = {}
 
         ignoreList = self.getIgnoreList()
         chkForUpdateIds = self.srcUniqueIdSet.intersection(self.destUniqueIdSet)
@@ -1437,7 +1508,7 @@ class CKANDataSet(CKANRecordCollection):
 
         for chkForUpdateId in chkForUpdateIds:
             # now make sure the id is not in the ignore list
-            if chkForUpdateIds not in ignoreList:
+            if chkForUpdateId not in ignoreList:
                 srcRecordForUpdate = self.getRecordByUniqueId(chkForUpdateId)
                 destRecordForUpdate = destDataSet.getRecordByUniqueId(chkForUpdateId)
 
@@ -1452,7 +1523,14 @@ class CKANDataSet(CKANRecordCollection):
                 # method for dataset is getting called here.  __eq__ will consider
                 # ignore lists.  If record is in ignore list it will return as
                 # equal.
-                if srcRecordForUpdate != destRecordForUpdate:
+                isDiff = knownDiffs.get(chkForUpdateId)
+                if isDiff is None:
+                    isDiff = srcRecordForUpdate != destRecordForUpdate
+                # only the json data of the dest record is used by the update
+                destRecordForUpdate.releaseComparable()
+                if not isDiff:
+                    srcRecordForUpdate.releaseComparable()
+                else:
                     # updateDataList.append(srcRecordForUpdate)
                     LOGGER.debug(f"adding {chkForUpdateId} to update list")
                     # DEBUG: putting these lines in here so that we can test the
@@ -1637,13 +1715,12 @@ class CKANUsersDataSet(CKANRecordParserMixin, CKANDataSet):
         return newRecordList
 
     def getIgnoreList(self):
-        ignoreList = TRANSCONF.getIgnoreList(self.dataType)
+        ignoreList = TRANSCONF.getDataTypeConfig(self.dataType).ignoreList
         recordNamesWithDuplicateEmails = self.getDuplicateEmailAddresses()
         # for users need to get the duplicate email list and add that to the
-        # ignore list
-        for userId in recordNamesWithDuplicateEmails:
-            if userId not in ignoreList:
-                ignoreList.append(userId)
+        # ignore list, the configured ignore list is shared so a new set is
+        # created
+        ignoreList = ignoreList.union(recordNamesWithDuplicateEmails)
         LOGGER.debug(f"users 2 ignore: {ignoreList}")
         return ignoreList
 
@@ -1787,6 +1864,11 @@ class CKANPackageDataSet(CKANRecordParserMixin, CKANDataSet):
 
 
 class DataPopulator:
+    """Populates default values in a data struct.  The input struct is not
+    modified, the dicts and lists that need a value added are copied, other
+    parts of the struct are shared with the struct that is returned.
+    """
+
     def __init__(self, inputData):
         self.inputData = inputData
 
@@ -1818,7 +1900,8 @@ class DataPopulator:
             inputData.
         :type valueStruct: any
         :raises ValueError: raised when an unexpected type is encountered.
-        :return: the inputData struct with modifications
+        :return: the inputData struct if nothing was populated, otherwise a
+            copy of it with the populated values
         :rtype: any
         """
 
@@ -1840,42 +1923,52 @@ class DataPopulator:
         for elemKey in valueStruct:
             elemValue = valueStruct[elemKey]
             if isinstance(inputData, list):
-                for inputDataPosition in range(
-                    0, len(inputData)
-                ):  # pylint: disable=consider-using-enumerate
-                    inputData[inputDataPosition] = self.__populateField(
-                        inputData[inputDataPosition], elemKey, elemValue
-                    )
+                positions = range(0, len(inputData))
             elif isinstance(inputData, dict):
-                for inputKey in inputData:
-                    inputData[inputKey] = self.__populateField(
-                        inputData[inputKey], elemKey, elemValue
-                    )
+                positions = list(inputData)
+            else:
+                continue
+            newData = None
+            for position in positions:
+                value = inputData[position]
+                newValue = self.__populateField(value, elemKey, elemValue)
+                if newValue is not value:
+                    if newData is None:
+                        newData = copy.copy(inputData)
+                    newData[position] = newValue
+            if newData is not None:
+                inputData = newData
         return inputData
 
     def populateList(self, key, inputData, valueStruct):
         if isinstance(inputData, dict):
-            if key not in inputData:
-                inputData[key] = []
+            value = inputData.get(key, [])
             for nextKey in valueStruct:
-                if isinstance(nextKey, dict) and not inputData[key]:
-                    inputData[key].append({})
-                inputData[key] = self.__populateField(inputData[key], 0, nextKey)
+                if isinstance(nextKey, dict) and not value:
+                    value = [{}]
+                value = self.__populateField(value, 0, nextKey)
+            if key not in inputData or value is not inputData[key]:
+                inputData = dict(inputData)
+                inputData[key] = value
         elif isinstance(inputData, list) and valueStruct not in inputData:
-            inputData.append([])
+            newElem = []
             for nextKey in valueStruct:
-                inputData[-1] = self.__populateField(inputData[-1], 0, nextKey)
+                newElem = self.__populateField(newElem, 0, nextKey)
+            inputData = inputData + [newElem]
         return inputData
 
     def populatePrimitive(self, key, inputData, valueStruct):
         if isinstance(inputData, dict):
-            if ((key not in inputData) or inputData[key] is None) or not inputData[key]:
+            if not inputData.get(key) and not isSameValue(
+                inputData.get(key), valueStruct
+            ):
+                inputData = dict(inputData)
                 inputData[key] = valueStruct
         elif isinstance(inputData, list):
             if valueStruct not in inputData:
                 # example key would be a number, doesn't matter cause its not used
                 # input data is a string that must be in the inputData list
-                inputData.append(valueStruct)
+                inputData = inputData + [valueStruct]
         else:
             msg = (
                 'expecting "inputData" to be a dict or a list, but its a '
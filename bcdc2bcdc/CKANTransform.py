@@ -3,9 +3,11 @@ Used to transform data based on contents of the transformation configuration
 file.
 
 """
+import collections
 import json
 import logging
 import os.path
+import types
 
 import bcdc2bcdc.constants as constants
 
@@ -13,6 +15,9 @@ import bcdc2bcdc.constants as constants
 
 LOGGER = logging.getLogger(__name__)
 
+# the TransformationConfig shared by the modules, see getSharedConfig()
+SHARED_CONFIG = None
+
 
 def validateType(dataType):
     """ Transformation types are different CKAN object types that can be
@@ -62,6 +67,211 @@ def getTransformationConfig(transformConfigFile=None):
     return transConfData
 
 
+def getSharedConfig():
+    """Returns the transformation config that is shared by the modules that
+    read the default transformation config file, so the file is read and
+    parsed once.
+
+    :return: the shared transformation config
+    :rtype: TransformationConfig
+    """
+    global SHARED_CONFIG  # pylint: disable=global-statement
+    if SHARED_CONFIG is None:
+        SHARED_CONFIG = TransformationConfig()
+    return SHARED_CONFIG
+
+
+class DataTypeConfig(
+    collections.namedtuple(
+        "DataTypeConfig",
+        [
+            "dataType",
+            "uniqueField",
+            "ignoreList",
+            "userPopulatedProperties",
+            "userPopulatedProjection",
+            "embeddedIgnorePruner",
+            "fieldsToIncludeOnAdd",
+            "fieldsToIncludeOnUpdate",
+            "requiredFieldDefaultValues",
+            "idFieldConfigs",
+            "fieldMappings",
+            "customTransformations",
+        ],
+    )
+):
+    """The transformation config for a single datatype, resolved once by
+    TransformationConfig.getDataTypeConfig() so records can look up the values
+    that they use for every comparison without parsing the config again.
+
+    embeddedIgnorePruner is None when the datatype does not embed other
+    records, see compileIgnorePruner().
+
+    The view is immutable: the ignore list is a frozenset, the lists of fields
+    and field configs are tuples and the required field default values are a
+    read only mapping.
+    """
+
+    __slots__ = ()
+
+
+def compileProjection(properties):
+    """Compiles a user populated properties definition, as returned by
+    TransformationConfig.getUserPopulatedProperties(), into a function that
+    projects a record onto the properties.  The definition is only walked
+    once, when it is compiled, the returned function makes a single pass over
+    the record:
+
+    * dict definitions: builds a new dict with only the keys in the
+      definition, keys that are missing from the record are set to None
+    * list definitions: the first element in the definition describes every
+      element in the list
+    * bool definitions: the value is included as is
+
+    The input record is not modified.
+
+    :param properties: the user populated properties definition
+    :type properties: dict, list, bool
+    :return: a function that receives a record, or part of a record, and
+        returns a new data structure with only the user populated properties
+    :rtype: function
+    """
+    if isinstance(properties, dict):
+        # bool fields are copied without calling a projection
+        fieldProjections = tuple(
+            (key, None if isinstance(value, bool) else compileProjection(value))
+            for key, value in properties.items()
+        )
+
+        def projectDict(struct):
+            if not isinstance(struct, dict):
+                return None
+            newStruct = {}
+            for key, fieldProjection in fieldProjections:
+                value = struct.get(key)
+                if fieldProjection is None:
+                    newStruct[key] = value
+                else:
+                    newStruct[key] = fieldProjection(value)
+            return newStruct
+
+        return projectDict
+    elif isinstance(properties, list):
+        if not properties or not isinstance(properties[0], dict):
+            return projectNothing
+        elemProjection = compileProjection(properties[0])
+
+        def projectList(struct):
+            if struct is None:
+                return None
+            return [elemProjection(structElem) for structElem in struct]
+
+        return projectList
+    elif isinstance(properties, bool):
+        return projectAll
+    return projectNothing
+
+
+def compileIgnorePruner(properties, uniqueFields, embeddedType=None):
+    """Compiles a user populated properties definition into a function that
+    removes embedded records that are in an ignore list from a record that has
+    been projected onto the definition, see compileProjection().
+
+    Records of one type can embed records of another, example organizations
+    embed their users.  Keys in the definition that are the name of a datatype
+    identify where records of that type are embedded.  The paths to the
+    embedded records are found when the definition is compiled, parts of the
+    definition that cannot hold embedded records are not visited by the
+    returned function.
+
+    Embedded records are removed from the list they are in when the value of
+    the unique field for their type is in the ignore list for their type.
+
+    The returned function has the arguments:
+
+    * struct: the projected record, or part of it
+    * getIgnores: function that receives a datatype and returns the set of
+      unique ids that are ignored for the type
+
+    and returns the struct with the ignored records removed.  Dicts are
+    modified in place, lists are only replaced when records are removed.
+
+    :param properties: the user populated properties definition
+    :type properties: dict, list, bool
+    :param uniqueFields: the name of the unique field for each datatype
+    :type uniqueFields: dict
+    :param embeddedType: used internally during the compile, the type of the
+        records the definition describes, None for records that are not
+        embedded
+    :type embeddedType: str, optional
+    :return: the pruning function, None if no records can be embedded in the
+        data described by the definition
+    :rtype: function
+    """
+    if isinstance(properties, dict):
+        fieldPruners = []
+        for key, value in properties.items():
+            keyType = key if key in uniqueFields else embeddedType
+            fieldPruner = compileIgnorePruner(value, uniqueFields, keyType)
+            if fieldPruner is not None:
+                fieldPruners.append((key, fieldPruner))
+        if not fieldPruners:
+            return None
+        fieldPruners = tuple(fieldPruners)
+
+        def pruneDict(struct, getIgnores):
+            if isinstance(struct, dict):
+                for key, fieldPruner in fieldPruners:
+                    value = struct.get(key)
+                    if value is not None:
+                        struct[key] = fieldPruner(value, getIgnores)
+            return struct
+
+        return pruneDict
+    elif isinstance(properties, (list, bool)):
+        elemProperties = properties
+        if isinstance(properties, list):
+            elemProperties = properties[0] if properties else None
+        elemPruner = None
+        if isinstance(elemProperties, dict):
+            elemPruner = compileIgnorePruner(elemProperties, uniqueFields, embeddedType)
+        uniqueField = None
+        if embeddedType is not None:
+            uniqueField = uniqueFields[embeddedType]
+            if isinstance(elemProperties, dict) and uniqueField not in elemProperties:
+                uniqueField = None
+        if uniqueField is None and elemPruner is None:
+            return None
+
+        def isIgnored(elem, ignores):
+            return isinstance(elem, dict) and elem.get(uniqueField) in ignores
+
+        def pruneList(struct, getIgnores):
+            if not isinstance(struct, list):
+                return struct
+            if uniqueField is not None:
+                ignores = getIgnores(embeddedType)
+                if ignores and any(isIgnored(elem, ignores) for elem in struct):
+                    struct = [elem for elem in struct if not isIgnored(elem, ignores)]
+            if elemPruner is not None:
+                for elem in struct:
+                    elemPruner(elem, getIgnores)
+            return struct
+
+        return pruneList
+    return None
+
+
+def projectAll(struct):
+    """projection for definitions that include all the data"""
+    return struct
+
+
+def projectNothing(struct):  # pylint: disable=unused-argument
+    """projection for definitions that do not include any data"""
+    return None
+
+
 class TransformationConfig:
     """Reads the transformation config file and provides methods to help
     retrieve the desired information from the configuration.
@@ -70,6 +280,8 @@ class TransformationConfig:
     def __init__(self, transformationConfigFile=None):
         # LOGGER.debug(f"trans conf file: {transformationConfigFile}")
         self.transConf = getTransformationConfig(transformationConfigFile)
+        # datatype: DataTypeConfig, see getDataTypeConfig()
+        self.dataTypeConfigs = {}
 
     def __parseNestForBools(self, data, boolVal, parsedData=None):
         """A recursive method that works its way through a transformation config
@@ -186,6 +398,61 @@ class TransformationConfig:
 
         return userPopulated
 
+    def getUserPopulatedProjection(self, datatype):
+        """Returns the user populated properties for the datatype compiled into
+        a projection function, see compileProjection().
+
+        :param datatype: a data type, needs to be included in 'constants.VALID_TRANSFORM_TYPES'
+        :type datatype: str
+        :return: function that receives a record of type 'datatype' and
+            returns a new record with only the user populated fields
+        :rtype: function
+        """
+        return self.getDataTypeConfig(datatype).userPopulatedProjection
+
+    def getDataTypeConfig(self, datatype):
+        """Returns the immutable view of the config for the datatype.  The
+        view is created the first time it is requested for a datatype, after
+        that the same view is returned.
+
+        :param datatype: a data type, needs to be included in 'constants.VALID_TRANSFORM_TYPES'
+        :type datatype: str
+        :return: the config for the datatype
+        :rtype: DataTypeConfig
+        """
+        if datatype not in self.dataTypeConfigs:
+            validateType(datatype)
+            userPopulated = self.getUserPopulatedProperties(datatype)
+            requiredFieldDefaults = self.getRequiredFieldDefaultValues(datatype)
+            customTransformations = self.getCustomTranformations(datatype)
+            if customTransformations is not None:
+                customTransformations = tuple(customTransformations)
+            self.dataTypeConfigs[datatype] = DataTypeConfig(
+                dataType=datatype,
+                uniqueField=self.getUniqueField(datatype),
+                ignoreList=frozenset(self.getIgnoreList(datatype)),
+                userPopulatedProperties=userPopulated,
+                userPopulatedProjection=compileProjection(userPopulated),
+                embeddedIgnorePruner=compileIgnorePruner(
+                    userPopulated,
+                    {
+                        embeddedType: self.getUniqueField(embeddedType)
+                        for embeddedType in constants.VALID_TRANSFORM_TYPES
+                    },
+                ),
+                fieldsToIncludeOnAdd=tuple(self.getFieldsToIncludeOnAdd(datatype)),
+                fieldsToIncludeOnUpdate=tuple(
+                    self.getFieldsToIncludeOnUpdate(datatype)
+                ),
+                requiredFieldDefaultValues=types.MappingProxyType(
+                    dict(requiredFieldDefaults or {})
+                ),
+                idFieldConfigs=tuple(self.getIdFieldConfigs(datatype)),
+                fieldMappings=tuple(self.getFieldMappings(datatype) or []),
+                customTransformations=customTransformations,
+            )
+        return self.dataTypeConfigs[datatype]
+
     def getAutoPopulatedProperties(self, datatype):
         """retrieves from the transformation config file the fields that are
         defined as auto / machine generated.  These are fields that cannot
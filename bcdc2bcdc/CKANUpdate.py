@@ -131,8 +131,10 @@ class CKANUserUpdate(UpdateMixin, CKANUpdateAbstract):
     def __init__(self, dataCache, ckanWrapper=None):
         CKANUpdateAbstract.__init__(self, dataCache, ckanWrapper)
         self.dataType = constants.TRANSFORM_TYPE_USERS
-        self.CKANTranformConfig = CKANTransform.TransformationConfig()
-        self.ignoreList = self.CKANTranformConfig.getIgnoreList(self.dataType)
+        self.CKANTranformConfig = CKANTransform.getSharedConfig()
+        self.ignoreList = self.CKANTranformConfig.getDataTypeConfig(
+            self.dataType
+        ).ignoreList
 
     def doAdds(self, addCollection):
         """List of user data to be added to a ckan instance,
@@ -245,8 +247,10 @@ class CKANGroupUpdate(UpdateMixin, CKANUpdateAbstract):
         """
         CKANUpdateAbstract.__init__(self, dataCache, ckanWrapper)
         self.dataType = constants.TRANSFORM_TYPE_GROUPS
-        self.CKANTranformConfig = CKANTransform.TransformationConfig()
-        self.ignoreList = self.CKANTranformConfig.getIgnoreList(self.dataType)
+        self.CKANTranformConfig = CKANTransform.getSharedConfig()
+        self.ignoreList = self.CKANTranformConfig.getDataTypeConfig(
+            self.dataType
+        ).ignoreList
 
     def doAdds(self, addCollection):
         """gets a list of group structs that describe groups that are to be added
@@ -317,8 +321,10 @@ class CKANOrganizationUpdate(UpdateMixin, CKANUpdateAbstract):
     def __init__(self, dataCache, ckanWrapper=None):
         CKANUpdateAbstract.__init__(self, dataCache, ckanWrapper)
         self.dataType = constants.TRANSFORM_TYPE_ORGS
-        self.CKANTransformConfig = CKANTransform.TransformationConfig()
-        self.ignoreList = self.CKANTransformConfig.getIgnoreList(self.dataType)
+        self.CKANTransformConfig = CKANTransform.getSharedConfig()
+        self.ignoreList = self.CKANTransformConfig.getDataTypeConfig(
+            self.dataType
+        ).ignoreList
 
     def doAdds(self, addCollection):
         """adds the orgs described in the param addStruct
@@ -389,8 +395,10 @@ class CKANPackagesUpdate(UpdateMixin, CKANUpdateAbstract):
     def __init__(self, dataCache, ckanWrapper=None):
         CKANUpdateAbstract.__init__(self, dataCache, ckanWrapper)
         self.dataType = constants.TRANSFORM_TYPE_PACKAGES
-        self.CKANTransformConfig = CKANTransform.TransformationConfig()
-        self.ignoreList = self.CKANTransformConfig.getIgnoreList(self.dataType)
+        self.CKANTransformConfig = CKANTransform.getSharedConfig()
+        self.ignoreList = self.CKANTransformConfig.getDataTypeConfig(
+            self.dataType
+        ).ignoreList
 
     def doAdds(self, addCollection):
         """adds the packages described in the param addStruct
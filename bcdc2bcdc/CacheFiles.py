@@ -227,3 +227,29 @@ class CKANCacheFiles:
         :rtype: str
         """
         return os.path.join(self.dir, constants.CACHE_SCHEMING_FILE)
+
+    def getIncrementalStatePath(self, instanceId):
+        """The file where the package state for a ckan instance is retained
+        between incremental package syncs.
+
+        :param instanceId: string that identifies the ckan instance, should
+            only contain characters that are valid in a file name
+        :type instanceId: str
+        :return: path to the incremental state file for the instance
+        :rtype: str (path)
+        """
+        fileName = constants.CACHE_INCREMENTAL_STATE_FILE.format(instanceId)
+        return os.path.join(self.dir, fileName)
+
+    def getSnapshotDir(self):
+        """The directory where the snapshot store keeps its records and
+        manifests, created if it doesn't exist.
+
+        :return: path to the snapshot directory
+        :rtype: str (path)
+        """
+        snapshotDir = os.path.join(self.dir, constants.CACHE_SNAPSHOT_DIR)
+        if not os.path.exists(snapshotDir):
+            LOGGER.info(f"creating the snapshot dir: {snapshotDir}")
+            os.makedirs(snapshotDir)
+        return snapshotDir
@@ -0,0 +1,431 @@
+"""
+Records the api requests made during a run and their responses to a cassette
+file, so a run can later be replayed without access to the ckan instances.
+Used to profile the cpu side of a run against production like data,
+repeatedly and offline.
+
+The mode is set by the env var CKAN_CASSETTE_MODE:
+
+* RECORD: requests are sent to the api as usual, each request and the
+  response that was finally returned for it, after any retries, is appended
+  to the cassette
+* REPLAY: no requests are sent, responses are served from the cassette.  The
+  env var CKAN_CASSETTE_LATENCY determines whether responses are delayed by
+  the time they took when they were recorded
+
+The cassette is a gzip compressed file with one json object per line, for
+each interaction:
+
+    {"method": "POST", "url": "...", "body": "...", "status": 200,
+     "headers": {...}, "content": "...", "elapsed": 0.12}
+
+Request headers, which contain the api keys, are not recorded.
+
+Requests are matched to recorded interactions by method, url, including the
+query parameters in any order, and body.  Identical requests are served the
+recorded responses in the order they were recorded, once they are exhausted
+the last one is repeated.  When no interaction has the same body, the
+request is matched on method and url only, so write requests still replay
+when the data sent differs from the recording.
+
+The threaded clients use the adapters mounted by HTTPClients.getSession(),
+the asyncio clients use the session wrappers returned by
+HTTPClients.getAsyncSession().
+"""
+
+import asyncio
+import collections
+import gzip
+import io
+import json
+import logging
+import threading
+import time
+import urllib.parse
+
+import requests
+import requests.adapters
+import requests.structures
+
+import bcdc2bcdc.constants as constants
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# response headers that are written to the cassette
+RECORDED_HEADERS = ["Content-Type", "Retry-After"]
+
+CASSETTE = None
+CASSETTE_LOCK = threading.Lock()
+
+
+def getCassette():
+    """Returns the cassette configured by the env vars, opening it the first
+    time it is requested.
+
+    :return: the cassette, or None if cassettes are not enabled
+    :rtype: Cassette
+    """
+    global CASSETTE  # pylint: disable=global-statement
+    mode = constants.getCassetteMode()
+    if mode is None:
+        return None
+    with CASSETTE_LOCK:
+        if CASSETTE is None or CASSETTE.closed:
+            CASSETTE = Cassette(
+                constants.getCassettePath(), mode, constants.getCassetteLatency()
+            )
+    return CASSETTE
+
+
+def closeCassette():
+    """closes the cassette opened by getCassette(), if there is one"""
+    with CASSETTE_LOCK:
+        if CASSETTE is not None:
+            CASSETTE.close()
+
+
+def getRequestKey(method, url, body=None):
+    """
+    :param method: the http method
+    :type method: str
+    :param url: the url, including any query parameters
+    :type url: str
+    :param body: the request body
+    :type body: str, bytes, optional
+    :return: the values a request is matched on, the method and url, and the
+        body
+    :rtype: tuple
+    """
+    parsedUrl = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(
+        sorted(urllib.parse.parse_qsl(parsedUrl.query, keep_blank_values=True))
+    )
+    urlKey = urllib.parse.urlunsplit(
+        (parsedUrl.scheme.lower(), parsedUrl.netloc.lower(), parsedUrl.path, query, "")
+    )
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            pass
+    return f"{method.upper()} {urlKey}", body or None
+
+
+class Cassette:
+    """A cassette file opened for recording or for replay."""
+
+    def __init__(self, path, mode, latency=constants.DEFAULT_CASSETTE_LATENCY):
+        """
+        :param path: the path to the cassette file
+        :type path: str
+        :param mode: whether to record or replay
+        :type mode: constants.CASSETTE_MODES
+        :param latency: for replay, whether to delay the responses by their
+            recorded time
+        :type latency: constants.CASSETTE_LATENCIES
+        """
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.closed = False
+        self.lock = threading.Lock()
+        self.fh = None
+        # url key: body: deque of interactions, for replay
+        self.interactions = {}
+        if self.isReplay():
+            self.load()
+        else:
+            LOGGER.info(f"recording api requests to the cassette: {self.path}")
+            self.fh = gzip.open(self.path, "wt", encoding="utf-8")
+
+    def isReplay(self):
+        return self.mode == constants.CASSETTE_MODES.REPLAY
+
+    def isRecord(self):
+        return self.mode == constants.CASSETTE_MODES.RECORD
+
+    def load(self):
+        """reads the interactions in the cassette file"""
+        interactionCnt = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                interaction = json.loads(line)
+                urlKey, body = getRequestKey(
+                    interaction["method"], interaction["url"], interaction["body"]
+                )
+                self.interactions.setdefault(urlKey, {}).setdefault(
+                    body, collections.deque()
+                ).append(interaction)
+                interactionCnt += 1
+        LOGGER.info(
+            f"replaying {interactionCnt} api requests from the cassette: {self.path}"
+        )
+
+    def record(self, method, url, body, status, headers, content, elapsed):
+        """appends an interaction to the cassette
+
+        :param method: the http method of the request
+        :type method: str
+        :param url: the url of the request, including the query parameters
+        :type url: str
+        :param body: the request body
+        :type body: str, bytes, None
+        :param status: the response status code
+        :type status: int
+        :param headers: the response headers
+        :type headers: dict like
+        :param content: the response body
+        :type content: bytes
+        :param elapsed: the number of seconds the request took
+        :type elapsed: float
+        """
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", errors="replace")
+        interaction = {
+            "method": method.upper(),
+            "url": url,
+            "body": body,
+            "status": status,
+            "headers": {
+                header: headers[header] for header in RECORDED_HEADERS if header in headers
+            },
+            "content": content.decode("utf-8", errors="replace"),
+            "elapsed": round(elapsed, 4),
+        }
+        line = json.dumps(interaction) + "\n"
+        with self.lock:
+            if not self.closed:
+                self.fh.write(line)
+
+    def getInteraction(self, method, url, body=None):
+        """
+        :param method: the http method of the request
+        :type method: str
+        :param url: the url of the request, including the query parameters
+        :type url: str
+        :param body: the request body
+        :type body: str, bytes, optional
+        :raises CassetteMissError: when there is no recorded interaction for
+            the method and url
+        :return: the recorded interaction that matches the request
+        :rtype: dict
+        """
+        urlKey, bodyKey = getRequestKey(method, url, body)
+        with self.lock:
+            if urlKey not in self.interactions:
+                raise CassetteMissError(
+                    f"no recorded response for: {urlKey}, cassette: {self.path}"
+                )
+            bodies = self.interactions[urlKey]
+            if bodyKey not in bodies:
+                LOGGER.debug(f"no recorded response with the same body for: {urlKey}")
+                bodyKey = next(iter(bodies))
+            recorded = bodies[bodyKey]
+            interaction = recorded[0]
+            if len(recorded) > 1:
+                recorded.popleft()
+        return interaction
+
+    def getDelay(self, interaction):
+        """
+        :return: the number of seconds to wait before returning the response
+            for the interaction
+        :rtype: float
+        """
+        retVal = 0
+        if self.latency == constants.CASSETTE_LATENCIES.RECORDED:
+            retVal = interaction["elapsed"]
+        return retVal
+
+    def close(self):
+        with self.lock:
+            if not self.closed and self.fh is not None:
+                self.fh.close()
+            self.closed = True
+
+
+def recordResponse(cassette, request, resp, elapsed):
+    """records a requests response.  The response body is read, so responses
+    made with stream=True have their raw stream replaced with the content.
+
+    :param cassette: the cassette to record to
+    :type cassette: Cassette
+    :param request: the request that was sent
+    :type request: requests.PreparedRequest
+    :param resp: the response
+    :type resp: requests.Response
+    :param elapsed: the number of seconds the request took
+    :type elapsed: float
+    """
+    content = resp.content
+    resp.raw = io.BytesIO(content)
+    cassette.record(
+        request.method, request.url, request.body, resp.status_code, resp.headers,
+        content, elapsed
+    )
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """requests adapter that returns the responses in the cassette instead of
+    sending the requests
+    """
+
+    def __init__(self, cassette):
+        requests.adapters.BaseAdapter.__init__(self)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        interaction = self.cassette.getInteraction(
+            request.method, request.url, request.body
+        )
+        delay = self.cassette.getDelay(interaction)
+        if delay:
+            time.sleep(delay)
+        content = interaction["content"].encode("utf-8")
+        resp = requests.Response()
+        resp.status_code = interaction["status"]
+        resp.headers = requests.structures.CaseInsensitiveDict(interaction["headers"])
+        resp.encoding = "utf-8"
+        resp._content = content  # pylint: disable=protected-access
+        resp.raw = io.BytesIO(content)
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+
+class ReplayAsyncResponse:
+    """The parts of aiohttp.ClientResponse used by the asyncio clients, for a
+    response from the cassette
+    """
+
+    def __init__(self, interaction):
+        self.status = interaction["status"]
+        self.headers = interaction["headers"]
+        self.content = interaction["content"]
+
+    async def read(self):
+        return self.content.encode("utf-8")
+
+    async def text(self):
+        return self.content
+
+    async def json(self, content_type="application/json"):  # pylint: disable=unused-argument
+        return json.loads(self.content)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class ReplayAsyncSession:
+    """Replaces aiohttp.ClientSession when replaying, serves the responses in
+    the cassette
+    """
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+        self.closed = False
+
+    def get(self, url, params=None, **kwargs):  # pylint: disable=unused-argument
+        return self.request("GET", url, params=params)
+
+    def request(self, method, url, params=None, data=None, json=None, **kwargs):  # pylint: disable=unused-argument, redefined-outer-name
+        return ReplayAsyncRequest(self.cassette, method, url, params, data, json)
+
+    async def close(self):
+        self.closed = True
+
+
+class ReplayAsyncRequest:
+    """async context manager returned by the ReplayAsyncSession request
+    methods, waits for the recorded latency when it is entered
+    """
+
+    def __init__(self, cassette, method, url, params=None, data=None, jsonData=None):
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        if jsonData is not None:
+            data = json.dumps(jsonData)
+        self.cassette = cassette
+        self.interaction = cassette.getInteraction(method, url, data)
+
+    async def __aenter__(self):
+        delay = self.cassette.getDelay(self.interaction)
+        if delay:
+            await asyncio.sleep(delay)
+        return ReplayAsyncResponse(self.interaction)
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class RecordingAsyncSession:
+    """Wraps an aiohttp.ClientSession, recording the requests made through it
+    """
+
+    def __init__(self, session, cassette):
+        self.session = session
+        self.cassette = cassette
+
+    @property
+    def closed(self):
+        return self.session.closed
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        return RecordingAsyncRequest(self.session, self.cassette, method, url, kwargs)
+
+    async def close(self):
+        await self.session.close()
+
+
+class RecordingAsyncRequest:
+    """async context manager returned by the RecordingAsyncSession request
+    methods, reads and records the response when it is entered
+    """
+
+    def __init__(self, session, cassette, method, url, requestArgs):
+        self.session = session
+        self.cassette = cassette
+        self.method = method
+        self.url = url
+        self.requestArgs = requestArgs
+        self.resp = None
+
+    async def __aenter__(self):
+        startTime = time.monotonic()
+        self.resp = await self.session.request(self.method, self.url, **self.requestArgs)
+        # aiohttp keeps the body once it is read, so the caller can still
+        # read it
+        content = await self.resp.read()
+        body = self.requestArgs.get("data")
+        if self.requestArgs.get("json") is not None:
+            body = json.dumps(self.requestArgs["json"])
+        self.cassette.record(
+            self.method, str(self.resp.url), body, self.resp.status, self.resp.headers,
+            content, time.monotonic() - startTime
+        )
+        return self.resp
+
+    async def __aexit__(self, *args):
+        self.resp.release()
+
+
+class CassetteMissError(Exception):
+    """raised when replaying and a request has no recorded response"""
+
+    def __init__(self, message):
+        LOGGER.error(message)
+        self.message = message
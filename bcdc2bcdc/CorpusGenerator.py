@@ -0,0 +1,735 @@
+"""
+Generates synthetic src and dest corpora, used to measure how the comparison
+and the updates scale with the number of records.  The corpora can be loaded
+into the fake ckan instances used by bin/benchmarkSync.py, see FakeCKAN.
+
+The fields of each record are the properties listed in the
+user_populated_properties section of the transformation config, both the
+user and auto populated ones, so the records have the same shape as the
+records returned by the api.  The values of the properties validated by the
+custom transformers are taken from the scheming definitions.
+
+The corpora include:
+
+* users, some of which share an email address with another user
+* organizations, each with a number of sub organizations.  Sub organizations
+  refer to their parent organization through their 'groups' property
+* groups
+* packages, owned by the sub organizations, with a variable number of
+  resources
+
+For each data type a fraction of the records only exist in src (adds), only
+exist in dest (deletes), or have been changed in dest (updates).  The ids of
+the records are different in src and dest, as they are in real instances, so
+the references to other records (owner_org, resource package_id) are remapped.
+
+Every record is generated from its own random number generator, seeded from
+the corpus seed and the name of the record, so the same seed always produces
+the same corpora and a record can be regenerated for dest without copying the
+src record.
+"""
+
+import json
+import logging
+import random
+import uuid
+
+import bcdc2bcdc.CKANTransform as CKANTransform
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# namespace for the uuid5 record ids
+ID_NAMESPACE = uuid.UUID("6f0c2a4e-4d5b-4b7a-9d1e-3c8f2b1a0e57")
+
+WORDS = [
+    "air", "quality", "forest", "cover", "water", "licence", "wildlife",
+    "habitat", "road", "network", "school", "district", "population",
+    "estimate", "health", "region", "boundary", "salmon", "stream", "survey",
+    "mineral", "tenure", "park", "land", "use", "census", "traffic", "count",
+    "fire", "perimeter", "soil", "map", "watershed", "climate", "station",
+    "grassland", "coastal", "inventory", "ecosystem", "transportation",
+]
+
+WORD_POOL_SIZE = 10000
+
+SECURITY_CLASSES = [
+    "HIGH-CABINET",
+    "HIGH-CLASSIFIED",
+    "HIGH-SENSITIVITY",
+    "LOW-PUBLIC",
+    "LOW-SENSITIVITY",
+    "MEDIUM-PERSONAL",
+    "MEDIUM-SENSITIVITY",
+]
+
+MEMBER_CAPACITIES = ["admin", "editor", "member"]
+
+# values for properties that have a fixed value in a typical instance
+FIXED_VALUES = {
+    "state": "active",
+    "private": False,
+    "isopen": True,
+    "sysadmin": False,
+    "activity_streams_email_notifications": False,
+    "approval_status": "approved",
+    "more_info": "[]",
+    "datastore_active": False,
+    "retention_expiry_date": "2300-01-01",
+    "resource_status": "onGoing",
+    "license_id": "2",
+    "license_title": "Open Government Licence - British Columbia",
+    "metadata_visibility": "Public",
+    "resource_update_cycle": "unknown",
+    "projection_name": "EPSG_3005 - NAD83 BC Albers",
+    "spatial_datatype": "",
+    "edc_resource_type": "Data",
+    "format": "csv",
+    "mimetype": "text/csv",
+    "number_of_edits": 0,
+    "number_created_packages": 0,
+}
+# properties that are empty in a typical instance
+NULL_FIELDS = {
+    "version", "url_type", "mimetype_inner", "cache_url", "cache_last_updated",
+    "size", "openid", "vocabulary_id", "last_modified", "image_url",
+    "image_display_url", "replacement_record", "source_data_path", "ofi",
+}
+EMPTY_LIST_FIELDS = {
+    "relationships_as_object", "relationships_as_subject", "iso_topic_category",
+    "contacts", "dates", "extras",
+}
+EMPTY_DICT_FIELDS = {"json_table_schema", "temporal_extent"}
+TEXT_FIELDS = {"notes", "purpose", "description", "about", "resource_description"}
+
+
+class TypePlan:
+    """The names of the records of a single data type, and which of them are
+    adds, deletes and updates.
+    """
+
+    def __init__(self, names, adds, deletes, updates):
+        """
+        :param names: the names of all the records, src and dest
+        :type names: list of str
+        :param adds: names of the records that only exist in src
+        :type adds: set
+        :param deletes: names of the records that only exist in dest
+        :type deletes: set
+        :param updates: names of the records that are different in dest
+        :type updates: set
+        """
+        self.names = names
+        self.adds = adds
+        self.deletes = deletes
+        self.updates = updates
+
+    def getNames(self, dataOrigin):
+        """
+        :param dataOrigin: the instance
+        :type dataOrigin: constants.DATA_SOURCE
+        :return: the names of the records in the instance, in order
+        :rtype: list of str
+        """
+        missing = self.deletes if dataOrigin == constants.DATA_SOURCE.SRC else self.adds
+        return [name for name in self.names if name not in missing]
+
+    def getShared(self):
+        """
+        :return: the names of the records that exist in both instances
+        :rtype: list of str
+        """
+        return [
+            name
+            for name in self.names
+            if name not in self.adds and name not in self.deletes
+        ]
+
+    def getSummary(self):
+        return {
+            "src": len(self.names) - len(self.deletes),
+            "dest": len(self.names) - len(self.adds),
+            "adds": len(self.adds),
+            "deletes": len(self.deletes),
+            "updates": len(self.updates),
+        }
+
+
+class CorpusGenerator:
+    """Usage:
+
+        generator = CorpusGenerator(packageCount=10000, updateFraction=0.2)
+        srcCorpus, destCorpus = generator.generate()
+    """
+
+    def __init__(
+        self,
+        packageCount=1000,
+        userCount=None,
+        orgCount=None,
+        subOrgCount=3,
+        groupCount=None,
+        resourceCount=5,
+        duplicateEmailFraction=0.02,
+        addFraction=0.05,
+        deleteFraction=0.05,
+        updateFraction=0.1,
+        seed=0,
+        transformationConfigFile=None,
+        scheming=None,
+    ):
+        """
+        :param packageCount: the number of packages in src
+        :type packageCount: int
+        :param userCount: the number of users in src, defaults to one for
+            every 20 packages
+        :type userCount: int, optional
+        :param orgCount: the number of top level organizations, defaults to
+            one for every 200 packages
+        :type orgCount: int, optional
+        :param subOrgCount: the number of sub organizations each top level
+            organization has, defaults to 3
+        :type subOrgCount: int, optional
+        :param groupCount: the number of groups in src, defaults to one for
+            every 500 packages
+        :type groupCount: int, optional
+        :param resourceCount: the average number of resources per package,
+            defaults to 5
+        :type resourceCount: int, optional
+        :param duplicateEmailFraction: fraction of the users that have the same
+            email address as another user, defaults to 0.02
+        :type duplicateEmailFraction: float, optional
+        :param addFraction: fraction of the src records that are not in dest,
+            defaults to 0.05
+        :type addFraction: float, optional
+        :param deleteFraction: number of records that are only in dest, as a
+            fraction of the src records, defaults to 0.05
+        :type deleteFraction: float, optional
+        :param updateFraction: fraction of the src records that are different
+            in dest, defaults to 0.1
+        :type updateFraction: float, optional
+        :param seed: the random seed, defaults to 0
+        :type seed: int, optional
+        :param transformationConfigFile: the transformation config that
+            describes the properties of each data type, defaults to the config
+            used by the run
+        :type transformationConfigFile: str, optional
+        :param scheming: the scheming definitions the values of the validated
+            properties are taken from, defaults to the definitions served by
+            FakeCKAN
+        :type scheming: dict, optional
+        """
+        if addFraction + updateFraction > 1:
+            msg = (
+                f"the add fraction: {addFraction} and update fraction: "
+                f"{updateFraction} can not add up to more than 1"
+            )
+            raise ValueError(msg)
+        self.seed = seed
+        self.resourceCount = max(1, resourceCount)
+        self.subOrgCount = subOrgCount
+        self.duplicateEmailFraction = duplicateEmailFraction
+        self.fractions = (addFraction, deleteFraction, updateFraction)
+
+        self.counts = {
+            constants.TRANSFORM_TYPE_PACKAGES: packageCount,
+            constants.TRANSFORM_TYPE_USERS: userCount
+            if userCount is not None
+            else max(10, packageCount // 20),
+            constants.TRANSFORM_TYPE_ORGS: orgCount
+            if orgCount is not None
+            else max(2, packageCount // 200),
+            constants.TRANSFORM_TYPE_GROUPS: groupCount
+            if groupCount is not None
+            else max(2, packageCount // 500),
+        }
+
+        transConf = CKANTransform.getTransformationConfig(transformationConfigFile)
+        self.properties = {
+            dataType: transConf[dataType][
+                constants.TRANSFORM_PARAM_USER_POPULATED_PROPERTIES
+            ]
+            for dataType in constants.VALID_TRANSFORM_TYPES
+        }
+
+        if scheming is None:
+            scheming = FakeCKAN.DEFAULT_SCHEMING
+        # property name: allowable values
+        self.domains = {}
+        for fieldsKey in ("dataset_fields", "resource_fields"):
+            for fieldDef in scheming.get(fieldsKey, []):
+                if fieldDef.get("choices"):
+                    self.domains[fieldDef["field_name"]] = [
+                        choice["value"] for choice in fieldDef["choices"]
+                    ]
+
+        # data type: TypePlan
+        self.plans = {}
+        # top level organization name: sub organization names
+        self.subOrgs = {}
+        # picking a slice of a long list of random words is much faster than
+        # picking each word
+        poolRandom = self.getRandom("words")
+        self.wordPool = [poolRandom.choice(WORDS) for _ in range(WORD_POOL_SIZE)]
+        # (data type, is resource): [(property name, value generator)]
+        self.generators = {}
+        # names of the records that other records refer to
+        self.sharedUsers = []
+        self.sharedGroups = []
+        self.owners = []
+
+    def getRandom(self, *key):
+        """
+        :return: random number generator for a single record, seeded from the
+            corpus seed and the key
+        :rtype: random.Random
+        """
+        return random.Random(":".join([str(self.seed)] + [str(part) for part in key]))
+
+    def getId(self, dataOrigin, dataType, name):
+        """
+        :return: the id of the record in the instance, the same record has a
+            different id in src and dest
+        :rtype: str
+        """
+        return str(uuid.uuid5(ID_NAMESPACE, f"{dataOrigin.name}:{dataType}:{name}"))
+
+    def planRecords(self, dataType, prefix, names, fixedNames=None):
+        """Decides which records are adds, deletes and updates.
+
+        :param dataType: the data type
+        :type dataType: str
+        :param prefix: the start of the names of the records that only exist
+            in dest
+        :type prefix: str
+        :param names: the names of the src records
+        :type names: list of str
+        :param fixedNames: names of records that must exist in both instances
+        :type fixedNames: set, optional
+        :return: the plan for the data type
+        :rtype: TypePlan
+        """
+        fixedNames = fixedNames or set()
+        addFraction, deleteFraction, updateFraction = self.fractions
+        rng = self.getRandom("plan", dataType)
+
+        deleteCnt = int(round(len(names) * deleteFraction))
+        deleteNames = [f"{prefix}-deleted-{cnt:07d}" for cnt in range(deleteCnt)]
+
+        candidates = [name for name in names if name not in fixedNames]
+        rng.shuffle(candidates)
+        addCnt = min(len(candidates), int(round(len(names) * addFraction)))
+        updateCnt = min(len(candidates) - addCnt, int(round(len(names) * updateFraction)))
+        adds = set(candidates[:addCnt])
+        updateCandidates = candidates[addCnt:] + sorted(fixedNames)
+        updates = set(
+            rng.sample(updateCandidates, min(updateCnt, len(updateCandidates)))
+        )
+
+        plan = TypePlan(sorted(names + deleteNames), adds, set(deleteNames), updates)
+        LOGGER.debug(f"{dataType} plan: {plan.getSummary()}")
+        return plan
+
+    def plan(self):
+        """decides the names of all the records, and which are adds, deletes
+        and updates
+        """
+        userNames = [
+            f"user-{cnt:06d}" for cnt in range(self.counts[constants.TRANSFORM_TYPE_USERS])
+        ]
+        self.plans[constants.TRANSFORM_TYPE_USERS] = self.planRecords(
+            constants.TRANSFORM_TYPE_USERS, "user", userNames
+        )
+
+        groupNames = [
+            f"group-{cnt:04d}" for cnt in range(self.counts[constants.TRANSFORM_TYPE_GROUPS])
+        ]
+        self.plans[constants.TRANSFORM_TYPE_GROUPS] = self.planRecords(
+            constants.TRANSFORM_TYPE_GROUPS, "group", groupNames
+        )
+
+        orgNames = []
+        for orgCnt in range(self.counts[constants.TRANSFORM_TYPE_ORGS]):
+            orgName = f"org-{orgCnt:04d}"
+            self.subOrgs[orgName] = [
+                f"{orgName}-sub-{subCnt:02d}" for subCnt in range(self.subOrgCount)
+            ]
+            orgNames.append(orgName)
+            orgNames.extend(self.subOrgs[orgName])
+        # the top level organizations are the parents of the sub organizations
+        # in both instances, so they can't be added or deleted
+        self.plans[constants.TRANSFORM_TYPE_ORGS] = self.planRecords(
+            constants.TRANSFORM_TYPE_ORGS, "org", orgNames, fixedNames=set(self.subOrgs)
+        )
+
+        packageNames = [
+            f"dataset-{cnt:07d}"
+            for cnt in range(self.counts[constants.TRANSFORM_TYPE_PACKAGES])
+        ]
+        self.plans[constants.TRANSFORM_TYPE_PACKAGES] = self.planRecords(
+            constants.TRANSFORM_TYPE_PACKAGES, "dataset", packageNames
+        )
+
+        # records refer to records that exist in both instances, so the
+        # references are valid in both corpora
+        self.sharedUsers = self.plans[constants.TRANSFORM_TYPE_USERS].getShared()
+        self.sharedGroups = self.plans[constants.TRANSFORM_TYPE_GROUPS].getShared()
+        sharedOrgs = set(self.plans[constants.TRANSFORM_TYPE_ORGS].getShared())
+        # packages are owned by the sub organizations
+        self.owners = [
+            subOrgName
+            for subOrgNames in self.subOrgs.values()
+            for subOrgName in subOrgNames
+            if subOrgName in sharedOrgs
+        ] or sorted(self.subOrgs)
+
+    def getSummary(self):
+        """
+        :return: the number of records in each instance, and the number of
+            adds, deletes and updates, for each data type
+        :rtype: dict
+        """
+        if not self.plans:
+            self.plan()
+        return {dataType: plan.getSummary() for dataType, plan in self.plans.items()}
+
+    def getDataTypes(self):
+        """
+        :return: the data types in the order they are generated
+        :rtype: list of str
+        """
+        return [
+            constants.TRANSFORM_TYPE_USERS,
+            constants.TRANSFORM_TYPE_GROUPS,
+            constants.TRANSFORM_TYPE_ORGS,
+            constants.TRANSFORM_TYPE_PACKAGES,
+        ]
+
+    def iterRecords(self, dataType, dataOrigin):
+        """
+        :param dataType: the type of record to generate
+        :type dataType: str
+        :param dataOrigin: the instance the records are generated for
+        :type dataOrigin: constants.DATA_SOURCE
+        :return: generator that makes the records one at a time, so a large
+            corpus does not have to be held in memory
+        :rtype: generator of dict
+        """
+        if not self.plans:
+            self.plan()
+        builders = {
+            constants.TRANSFORM_TYPE_USERS: self.makeUser,
+            constants.TRANSFORM_TYPE_GROUPS: self.makeGroup,
+            constants.TRANSFORM_TYPE_ORGS: self.makeOrganization,
+            constants.TRANSFORM_TYPE_PACKAGES: self.makePackage,
+        }
+        builder = builders[dataType]
+        plan = self.plans[dataType]
+        isDest = dataOrigin == constants.DATA_SOURCE.DEST
+        for name in plan.getNames(dataOrigin):
+            yield builder(name, dataOrigin, isDest and name in plan.updates)
+
+    def generate(self):
+        """
+        :return: the src corpus and the dest corpus, each is a dict with the
+            list of records for each data type, see FakeCKAN.FakeCKANStore
+        :rtype: tuple
+        """
+        corpora = []
+        for dataOrigin in constants.DATA_SOURCE:
+            corpus = {}
+            for dataType in self.getDataTypes():
+                corpus[dataType] = list(self.iterRecords(dataType, dataOrigin))
+                LOGGER.info(
+                    f"generated {len(corpus[dataType])} {dataOrigin.name} {dataType}"
+                )
+            corpora.append(corpus)
+        return tuple(corpora)
+
+    def writeCorpus(self, dataOrigin, fh):
+        """Writes a corpus as json, a record at a time.  The output is the same
+        as json.dumps() of the corpus returned by generate().
+
+        :param dataOrigin: the instance to write the corpus for
+        :type dataOrigin: constants.DATA_SOURCE
+        :param fh: text file the corpus is written to
+        :type fh: file
+        """
+        fh.write("{")
+        for typeCnt, dataType in enumerate(self.getDataTypes()):
+            if typeCnt:
+                fh.write(", ")
+            fh.write(f"{json.dumps(dataType)}: [")
+            recordCnt = 0
+            for record in self.iterRecords(dataType, dataOrigin):
+                if recordCnt:
+                    fh.write(", ")
+                # json.dumps uses the c encoder, json.dump does not
+                fh.write(json.dumps(record))
+                recordCnt += 1
+            fh.write("]")
+            LOGGER.info(f"wrote {recordCnt} {dataOrigin.name} {dataType}")
+        fh.write("}")
+
+    def getWords(self, rng, minWords, maxWords):
+        """
+        :return: between minWords and maxWords random words, taken from a
+            random position in the word pool
+        :rtype: str
+        """
+        wordCnt = minWords + int(rng.random() * (maxWords - minWords + 1))
+        start = int(rng.random() * (len(self.wordPool) - wordCnt))
+        return " ".join(self.wordPool[start:start + wordCnt])
+
+    def getTimeStamp(self, rng):
+        return (
+            f"20{rng.randint(14, 20)}-{rng.randint(1, 12):02d}-"
+            f"{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:"
+            f"{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}.{rng.randint(0, 999999):06d}"
+        )
+
+    def getValueGenerator(self, fieldName):
+        """Decides how the values for a property are generated, based on the
+        name of the property
+
+        :param fieldName: the name of the property, None for properties that
+            are lists of records
+        :type fieldName: str
+        :return: callable that returns a value for the property, called with
+            the random number generator and the name of the record
+        :rtype: callable
+        """
+        # pylint: disable=unused-argument
+        if fieldName is None:
+            # list properties are populated by the record builders
+            generator = lambda rng, recordName: []
+        elif fieldName in self.domains:
+            domain = self.domains[fieldName]
+            generator = lambda rng, recordName: rng.choice(domain)
+        elif fieldName in FIXED_VALUES:
+            value = FIXED_VALUES[fieldName]
+            generator = lambda rng, recordName: value
+        elif fieldName in NULL_FIELDS:
+            generator = lambda rng, recordName: None
+        elif fieldName in EMPTY_LIST_FIELDS:
+            generator = lambda rng, recordName: []
+        elif fieldName in EMPTY_DICT_FIELDS:
+            generator = lambda rng, recordName: {}
+        elif fieldName == "security_class":
+            generator = lambda rng, recordName: rng.choice(SECURITY_CLASSES)
+        elif fieldName.endswith("email"):
+            generator = lambda rng, recordName: f"{recordName}@gov.bc.ca"
+        elif "url" in fieldName:
+            generator = lambda rng, recordName: f"https://www2.gov.bc.ca/{recordName}"
+        elif fieldName in ("created", "metadata_created", "metadata_modified"):
+            generator = lambda rng, recordName: self.getTimeStamp(rng)
+        elif fieldName in TEXT_FIELDS:
+            generator = (
+                lambda rng, recordName: self.getWords(rng, 8, 40).capitalize() + "."
+            )
+        else:
+            generator = lambda rng, recordName: self.getWords(rng, 1, 4)
+        return generator
+
+    def fillProperties(self, dataType, rng, recordName, properties=None):
+        """
+        :param dataType: the data type of the record
+        :type dataType: str
+        :param rng: the random number generator for the record
+        :type rng: random.Random
+        :param recordName: the name of the record
+        :type recordName: str
+        :param properties: the properties to fill, defaults to the properties
+            of the data type, the resource properties are passed in for
+            resources
+        :type properties: dict, optional
+        :return: a record with a value for each of the properties described in
+            the transformation config, list properties are left empty
+        :rtype: dict
+        """
+        generatorKey = (dataType, properties is not None)
+        if generatorKey not in self.generators:
+            if properties is None:
+                properties = self.properties[dataType]
+            self.generators[generatorKey] = [
+                (
+                    fieldName,
+                    self.getValueGenerator(
+                        None if isinstance(fieldDef, list) else fieldName
+                    ),
+                )
+                for fieldName, fieldDef in properties.items()
+            ]
+        return {
+            fieldName: generator(rng, recordName)
+            for fieldName, generator in self.generators[generatorKey]
+        }
+
+    def getMembers(self, rng):
+        members = rng.sample(
+            self.sharedUsers, min(len(self.sharedUsers), rng.randint(1, 3))
+        )
+        return [
+            {"name": userName, "capacity": rng.choice(MEMBER_CAPACITIES)}
+            for userName in sorted(members)
+        ]
+
+    def makeUser(self, name, dataOrigin, isChanged=False):
+        dataType = constants.TRANSFORM_TYPE_USERS
+        rng = self.getRandom(dataType, name)
+        user = self.fillProperties(dataType, rng, name)
+        fullName = self.getWords(rng, 2, 2).title()
+        user.update(
+            {
+                "id": self.getId(dataOrigin, dataType, name),
+                "name": name,
+                "fullname": fullName,
+                "display_name": fullName,
+                "email_hash": uuid.uuid5(ID_NAMESPACE, name).hex,
+            }
+        )
+        if rng.random() < self.duplicateEmailFraction:
+            # shares the email address of another user
+            emailUser = rng.choice(self.plans[dataType].names)
+            user["email"] = f"{emailUser}@gov.bc.ca"
+        if isChanged:
+            user["fullname"] = f"{fullName} {self.getWords(rng, 1, 1).title()}"
+        return user
+
+    def makeGroup(self, name, dataOrigin, isChanged=False):
+        dataType = constants.TRANSFORM_TYPE_GROUPS
+        rng = self.getRandom(dataType, name)
+        group = self.fillProperties(dataType, rng, name)
+        group.update(
+            {
+                "id": self.getId(dataOrigin, dataType, name),
+                "name": name,
+                "title": self.getWords(rng, 2, 4).title(),
+                "is_organization": False,
+                "type": "group",
+                "users": self.getMembers(rng),
+            }
+        )
+        if isChanged:
+            group["title"] = f"{group['title']} {self.getWords(rng, 1, 1).title()}"
+        return group
+
+    def makeOrganization(self, name, dataOrigin, isChanged=False):
+        dataType = constants.TRANSFORM_TYPE_ORGS
+        rng = self.getRandom(dataType, name)
+        org = self.fillProperties(dataType, rng, name)
+        org.update(
+            {
+                "id": self.getId(dataOrigin, dataType, name),
+                "name": name,
+                "title": self.getWords(rng, 2, 5).title(),
+                "is_organization": True,
+                "type": "organization",
+                "users": self.getMembers(rng),
+            }
+        )
+        if "-sub-" in name:
+            parentName = name.rsplit("-sub-", 1)[0]
+            org["groups"] = [{"name": parentName, "capacity": "public"}]
+        if isChanged:
+            org["description"] = self.getWords(rng, 10, 30).capitalize() + "."
+        return org
+
+    def makeResource(self, rng, packageName, packageId, position):
+        resourceName = f"{packageName}-resource-{position}"
+        resourceProperties = self.properties[constants.TRANSFORM_TYPE_PACKAGES][
+            "resources"
+        ][0]
+        resource = self.fillProperties(
+            constants.TRANSFORM_TYPE_PACKAGES, rng, resourceName, resourceProperties
+        )
+        resource.update(
+            {
+                "id": str(uuid.uuid5(ID_NAMESPACE, f"{packageId}:{position}")),
+                "package_id": packageId,
+                "name": self.getWords(rng, 2, 5).title(),
+                "url": f"https://openmaps.gov.bc.ca/{packageName}/{position}.csv",
+                "position": position,
+            }
+        )
+        return resource
+
+    def makePackage(self, name, dataOrigin, isChanged=False):
+        dataType = constants.TRANSFORM_TYPE_PACKAGES
+        rng = self.getRandom(dataType, name)
+        pkgId = self.getId(dataOrigin, dataType, name)
+        pkg = self.fillProperties(dataType, rng, name)
+
+        ownerName = rng.choice(self.owners)
+        ownerId = self.getId(dataOrigin, constants.TRANSFORM_TYPE_ORGS, ownerName)
+        groupNames = rng.sample(
+            self.sharedGroups, min(len(self.sharedGroups), rng.randint(0, 2))
+        )
+        tagNames = sorted(set(rng.choice(WORDS) for _ in range(rng.randint(1, 6))))
+        resourceCnt = rng.randint(1, 2 * self.resourceCount - 1)
+
+        pkg.update(
+            {
+                "id": pkgId,
+                "name": name,
+                "title": self.getWords(rng, 3, 8).title(),
+                "type": "bcdc_dataset",
+                "owner_org": ownerId,
+                "org": ownerId,
+                "organization": {"id": ownerId, "name": ownerName},
+                "resources": [
+                    self.makeResource(rng, name, pkgId, position)
+                    for position in range(resourceCnt)
+                ],
+                "num_resources": resourceCnt,
+                "tags": [
+                    {
+                        "id": str(uuid.uuid5(ID_NAMESPACE, tagName)),
+                        "name": tagName,
+                        "display_name": tagName,
+                        "state": "active",
+                        "vocabulary_id": None,
+                    }
+                    for tagName in tagNames
+                ],
+                "num_tags": len(tagNames),
+                "groups": [
+                    {
+                        "id": self.getId(
+                            dataOrigin, constants.TRANSFORM_TYPE_GROUPS, groupName
+                        ),
+                        "name": groupName,
+                        "title": groupName,
+                        "display_name": groupName,
+                        "description": "",
+                        "image_display_url": "",
+                    }
+                    for groupName in sorted(groupNames)
+                ],
+            }
+        )
+        if isChanged:
+            self.changePackage(rng, pkg)
+        return pkg
+
+    def changePackage(self, rng, pkg):
+        """makes one of the changes typically made to a package"""
+        change = rng.choice(["title", "notes", "resource", "resourceCount"])
+        if change == "title":
+            pkg["title"] = f"{pkg['title']} {self.getWords(rng, 1, 2).title()}"
+        elif change == "notes":
+            pkg["notes"] = self.getWords(rng, 8, 40).capitalize() + "."
+        elif change == "resource":
+            resource = rng.choice(pkg["resources"])
+            resource["name"] = self.getWords(rng, 2, 5).title()
+        elif len(pkg["resources"]) > 1:
+            del pkg["resources"][-1]
+            pkg["num_resources"] -= 1
+        else:
+            pkg["resources"].append(
+                self.makeResource(rng, pkg["name"], pkg["id"], len(pkg["resources"]))
+            )
+            pkg["num_resources"] += 1
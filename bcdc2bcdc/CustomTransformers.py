@@ -121,6 +121,13 @@ class MethodMapping:
 
 
 class CkanObjectUpdateMixin:
+    """Transformers read the struct returned by getStructToUpdate() and write
+    changes through setValue(), setResourceValue(), deleteValue() and
+    deleteResourceValue().  The record copies the parts of the struct that are
+    changed, so the struct that is returned by getStructToUpdate() is never
+    modified, see CKANData.CKANRecord.setStructValue()
+    """
+
     def getStructToUpdate(self, record):
         """using self.updateType parameter determines the update type
         that was defined for this custom transformation.
@@ -150,6 +157,43 @@ class CkanObjectUpdateMixin:
             updateStruct = record.updateableJsonData
         return updateStruct
 
+    def setValue(self, record, propertyName, value):
+        """sets a property of the record's struct for the update type
+
+        :param record: The CKANRecord that is to be updated
+        :type record: CKANData.CKANRecord
+        :param propertyName: the name of the property to set
+        :type propertyName: str
+        :param value: the value to set the property to
+        :type value: any
+        """
+        record.setStructValue(self.updateType, (propertyName,), value)
+
+    def setResourceValue(self, record, resourcePosition, propertyName, value):
+        """sets a property of one of the resources in the record's struct for
+        the update type
+
+        :param record: The CKANRecord that is to be updated
+        :type record: CKANData.CKANRecord
+        :param resourcePosition: the position of the resource in the resources
+        :type resourcePosition: int
+        :param propertyName: the name of the resource property to set
+        :type propertyName: str
+        :param value: the value to set the property to
+        :type value: any
+        """
+        record.setStructValue(
+            self.updateType, ("resources", resourcePosition, propertyName), value
+        )
+
+    def deleteValue(self, record, propertyName):
+        record.deleteStructValue(self.updateType, (propertyName,))
+
+    def deleteResourceValue(self, record, resourcePosition, propertyName):
+        record.deleteStructValue(
+            self.updateType, ("resources", resourcePosition, propertyName)
+        )
+
     def fixNoneAsString(self, record):
         """Looks at all values associated with all the resource properties.
         Replaces any values that are set to "None" to actual python None
@@ -167,7 +211,7 @@ class CkanObjectUpdateMixin:
             for resCnt in range(0, len(recordStruct["resources"])):
                 for resourceKey in recordStruct["resources"][resCnt]:
                     if recordStruct["resources"][resCnt][resourceKey] == "None":
-                        recordStruct["resources"][resCnt][resourceKey] = None
+                        self.setResourceValue(record, resCnt, resourceKey, None)
 
 
 class users(CkanObjectUpdateMixin):
@@ -182,9 +226,7 @@ class users(CkanObjectUpdateMixin):
         :return: [description]
         :rtype: [type]
         """
-        recordStruct = self.getStructToUpdate(record)
-        if "name" in recordStruct:
-            del recordStruct["name"]
+        self.deleteValue(record, "name")
 
 
 class organizations(CkanObjectUpdateMixin):
@@ -219,9 +261,10 @@ class organizations(CkanObjectUpdateMixin):
                         "Cannot find a corresponding user for the "
                         f"source user: {currentName}, email: {userSrcEmail}"
                     )
-                user["name"] = userDestName
-                modifiedUsers.append(user)
-            recordStruct["users"] = modifiedUsers
+                modifiedUser = dict(user)
+                modifiedUser["name"] = userDestName
+                modifiedUsers.append(modifiedUser)
+            self.setValue(record, "users", modifiedUsers)
 
     def revertUserName(self, record):
         # swap the username back to how it was
@@ -240,9 +283,10 @@ class organizations(CkanObjectUpdateMixin):
                 userSrcName = record.dataCache.getAutoDefinedValue(
                     "name", userDestEmail, "users", constants.DATA_SOURCE.SRC
                 )
-                user["name"] = userSrcName
-                modifiedUsers.append(user)
-            recordStruct["users"] = modifiedUsers
+                modifiedUser = dict(user)
+                modifiedUser["name"] = userSrcName
+                modifiedUsers.append(modifiedUser)
+            self.setValue(record, "users", modifiedUsers)
 
 
 class groups(CkanObjectUpdateMixin):
@@ -277,9 +321,10 @@ class groups(CkanObjectUpdateMixin):
                         "Cannot find a corresponding user for the "
                         f"source user: {currentName}, email: {userSrcEmail}"
                     )
-                user["name"] = userDestName
-                modifiedUsers.append(user)
-            recordStruct["users"] = modifiedUsers
+                modifiedUser = dict(user)
+                modifiedUser["name"] = userDestName
+                modifiedUsers.append(modifiedUser)
+            self.setValue(record, "users", modifiedUsers)
 
 
 # names of specific classes need to align with the names in
@@ -299,8 +344,7 @@ class packages(CkanObjectUpdateMixin):
         :param record: The CKANRecord that is to be updated
         :type record: CKANData.CKANRecord
         """
-        recordStruct = self.getStructToUpdate(record)
-        recordStruct["type"] = "bcdc_dataset"
+        self.setValue(record, "type", "bcdc_dataset")
 
     def checkJsonTableSchemaForNone(self, record):
         """json table schema is getting returned as None on one instance and
@@ -332,10 +376,7 @@ class packages(CkanObjectUpdateMixin):
                     "true",
                     "false",
                 ]:
-                    if ofiValue.lower() == "true":
-                        recordStruct["ofi"] = True
-                    else:
-                        recordStruct["ofi"] = False
+                    self.setValue(record, "ofi", ofiValue.lower() == "true")
 
     def adjustURLDomain(self, record):
         """Looks at the URL field that is part of each packages resources.  The
@@ -372,9 +413,9 @@ class packages(CkanObjectUpdateMixin):
                             srcUrlParser.hostname, destUrlParser.hostname
                         )
                         LOGGER.debug(f"new url: {newUrl}")
-                        recordStruct["resources"][resCnt]["url"] = newUrl
+                        self.setResourceValue(record, resCnt, "url", newUrl)
                 else:
-                    recordStruct["resources"][resCnt]["url"] = defaultURL
+                    self.setResourceValue(record, resCnt, "url", defaultURL)
 
     def checkSpatialDatatypeForNone(self, record):
         self.__checkForNoneInResource(record, "spatial_datatype", "")
@@ -394,12 +435,12 @@ class packages(CkanObjectUpdateMixin):
                 if (
                     property2Check not in recordStruct["resources"][resCnt]
                 ) or recordStruct["resources"][resCnt][property2Check] is None:
-                    recordStruct["resources"][resCnt][property2Check] = sub4NoneValue
+                    self.setResourceValue(record, resCnt, property2Check, sub4NoneValue)
                 elif (
                     otherNulls is not None
                     and recordStruct["resources"][resCnt][property2Check] in otherNulls
                 ):
-                    recordStruct["resources"][resCnt][property2Check] = sub4NoneValue
+                    self.setResourceValue(record, resCnt, property2Check, sub4NoneValue)
 
     def fixResourceBCDC_TYPE(self, record):
         """ the property bcdc_type of a Resources that is part of a bcdc
@@ -466,7 +507,7 @@ class packages(CkanObjectUpdateMixin):
                     if (
                         fld2Check in recordStruct["resources"][resCnt]
                     ) and not recordStruct["resources"][resCnt][fld2Check]:
-                        del recordStruct["resources"][resCnt][fld2Check]
+                        self.deleteResourceValue(record, resCnt, fld2Check)
 
     def fixResourceType(self, record):
         propertyName = "resource_type"
@@ -484,17 +525,12 @@ class packages(CkanObjectUpdateMixin):
             if "resources" in recordStruct:
                 for resCnt in range(0, len(recordStruct["resources"])):
                     if "iso_topic_category" in recordStruct["resources"][resCnt]:
-                        for isoTopicCnt in range(
-                            0,
-                            len(
-                                recordStruct["resources"][resCnt]["iso_topic_category"]
-                            ),
-                        ):
-                            recordStruct["resources"][resCnt]["iso_topic_category"][
-                                isoTopicCnt
-                            ] = recordStruct["resources"][resCnt]["iso_topic_category"][
-                                isoTopicCnt
-                            ].strip()
+                        isoTopics = recordStruct["resources"][resCnt]["iso_topic_category"]
+                        strippedIsoTopics = [isoTopic.strip() for isoTopic in isoTopics]
+                        if strippedIsoTopics != isoTopics:
+                            self.setResourceValue(
+                                record, resCnt, "iso_topic_category", strippedIsoTopics
+                            )
 
     def fixResourceStorageLocation(self, record):
         """Checks that the resource storage location (resource_storage_location)
@@ -569,11 +605,11 @@ class packages(CkanObjectUpdateMixin):
                         recordStruct["resources"][resourceCnt][propertyName]
                         not in validationDomainList
                     ):
-                        recordStruct["resources"][resourceCnt][
-                            propertyName
-                        ] = defaultValue
+                        self.setResourceValue(
+                            record, resourceCnt, propertyName, defaultValue
+                        )
                 else:
-                    recordStruct["resources"][resourceCnt][propertyName] = defaultValue
+                    self.setResourceValue(record, resourceCnt, propertyName, defaultValue)
 
     def __validateProperty(
         self, record, validationDomainList, propertyName, defaultValue=None
@@ -596,7 +632,7 @@ class packages(CkanObjectUpdateMixin):
 
         if propertyName in recordStruct:
             if recordStruct[propertyName] not in validationDomainList:
-                recordStruct[propertyName] = defaultValue
+                self.setValue(record, propertyName, defaultValue)
 
     def fixSecurityClass(self, record):
         """ The security class for a dataset must be one of the following:
@@ -632,9 +668,9 @@ class packages(CkanObjectUpdateMixin):
                 ("security_class" in recordStruct) and recordStruct["security_class"]
             ) and recordStruct["security_class"] not in validSecurityClasses:
                 if recordStruct["security_class"] == "HIGH-CONFIDENTIAL":
-                    recordStruct["security_class"] = "HIGH-CLASSIFIED"
+                    self.setValue(record, "security_class", "HIGH-CLASSIFIED")
                 else:
-                    recordStruct["security_class"] = defaultClass
+                    self.setValue(record, "security_class", defaultClass)
 
     def fixResourceStatus(self, record):
         """ Records that have their properties 'resource_status' set to
@@ -653,7 +689,7 @@ class packages(CkanObjectUpdateMixin):
                 and recordStruct["resource_status"] == "historicalArchive"
                 and "retention_expiry_date" not in recordStruct
             ):
-                recordStruct["retention_expiry_date"] = "2222-02-02"
+                self.setValue(record, "retention_expiry_date", "2222-02-02")
 
     def fixDownloadAudience(self, record):
         """download_audience must be set to something other than null,
@@ -698,7 +734,7 @@ class packages(CkanObjectUpdateMixin):
             complete = False
             if propertyName in recordStruct:
                 if recordStruct[propertyName] is None:
-                    recordStruct[propertyName] = defaultValue
+                    self.setValue(record, propertyName, defaultValue)
                 elif recordStruct[propertyName] not in validDownloadAudiences:
                     # work iteration looking for a word in the current struct
                     # that matches an entry in the domain of valid values
@@ -710,7 +746,7 @@ class packages(CkanObjectUpdateMixin):
                                 break
                         if complete:
                             break
-                    recordStruct[propertyName] = defaultValue
+                    self.setValue(record, propertyName, defaultValue)
 
     def fixMoreInfo(self, record):
         """ fixes the 'more_info' field so that it can be consistently compared
@@ -729,29 +765,27 @@ class packages(CkanObjectUpdateMixin):
         :rtype: dict, ckan package
         """
         recordStruct = self.getStructToUpdate(record)
+        if "more_info" not in recordStruct:
+            return
+        moreInfo = recordStruct["more_info"]
 
-        if ("more_info") in recordStruct and recordStruct["more_info"] is None:
-            recordStruct["more_info"] = "[]"
+        if moreInfo is None:
+            moreInfo = "[]"
         # if more info has a value but is not a string, ie its a list
-        if (("more_info" in recordStruct) and recordStruct["more_info"]) and isinstance(
-            recordStruct["more_info"], list
-        ):
-            recordStruct["more_info"] = json.dumps(
-                recordStruct["more_info"], sort_keys=True, separators=(",", ":")
-            )
-        if (("more_info" in recordStruct) and recordStruct["more_info"]) and isinstance(
-            recordStruct["more_info"], str
-        ):
+        if moreInfo and isinstance(moreInfo, list):
+            moreInfo = json.dumps(moreInfo, sort_keys=True, separators=(",", ":"))
+        if moreInfo and isinstance(moreInfo, str):
             # more info exists, has a value in it, and its a string.
             # in this situation code will:
             # * de-stringify
             # * parse
             # * convert link to url
             # * re-stringify with consistent format
-            recordStruct = self.__fixMoreInfoAsStr(recordStruct)
+            moreInfo = self.__fixMoreInfoAsStr(moreInfo)
+        self.setValue(record, "more_info", moreInfo)
 
-    def __fixMoreInfoAsStr(self, recordStruct):
-        moreInfoRecord = json.loads(recordStruct["more_info"])
+    def __fixMoreInfoAsStr(self, moreInfo):
+        moreInfoRecord = json.loads(moreInfo)
         if moreInfoRecord is None:
             moreInfoRecord = []
         for listPos in range(0, len(moreInfoRecord)):  # noqa
@@ -759,10 +793,7 @@ class packages(CkanObjectUpdateMixin):
                 moreInfoRecord[listPos]["url"] = moreInfoRecord[listPos]["link"]
                 del moreInfoRecord[listPos]["link"]
 
-        recordStruct["more_info"] = json.dumps(
-            moreInfoRecord, sort_keys=True, separators=(",", ":")
-        )
-        return recordStruct
+        return json.dumps(moreInfoRecord, sort_keys=True, separators=(",", ":"))
 
     def noNullMoreInfo(self, record):
         """checks to see if moreInfo is set to Null, if it is then it removes
@@ -776,7 +807,7 @@ class packages(CkanObjectUpdateMixin):
         recordStruct = self.getStructToUpdate(record)
         if record.origin == constants.DATA_SOURCE.SRC:
             if ("more_info" in recordStruct) and recordStruct["more_info"] is None:
-                del recordStruct["more_info"]
+                self.deleteValue(record, "more_info")
 
     def addStrangeFields(self, record):
         """ These are fields that are "required" for update / add
@@ -789,11 +820,11 @@ class packages(CkanObjectUpdateMixin):
         recordStruct = self.getStructToUpdate(record)
 
         if ("tag_string" not in recordStruct) or recordStruct["tag_string"] is None:
-            recordStruct["tag_string"] = "dummy tag string"
+            self.setValue(record, "tag_string", "dummy tag string")
         if ("iso_topic_string" not in recordStruct) or recordStruct[
             "iso_topic_string"
         ] is None:
-            recordStruct["iso_topic_string"] = "TBD"
+            self.setValue(record, "iso_topic_string", "TBD")
 
     def orgAndSubOrgToNames(self, record):
         """owner_org and sub_orgs are references to organization id values.
@@ -811,8 +842,6 @@ class packages(CkanObjectUpdateMixin):
         """
         dataCache = record.dataCache
 
-        recordStruct = self.getStructToUpdate(record)
-
         existsMethodMap = {
             constants.DATA_SOURCE.DEST: dataCache.isAutoValueInDest,
             constants.DATA_SOURCE.SRC: dataCache.isAutoValueInSrc,
@@ -831,7 +860,7 @@ class packages(CkanObjectUpdateMixin):
                         "id", currentFieldValue, "name", "organizations", record.origin
                     )
                     # write the user defined value to the compare structure
-                    recordStruct[orgTypeKey] = userField
+                    self.setValue(record, orgTypeKey, userField)
 
         return record
 
@@ -96,7 +96,7 @@ class DataCache:
     """
 
     def __init__(self):
-        self.transConf = CKANTransform.TransformationConfig()
+        self.transConf = CKANTransform.getSharedConfig()
         self.cacheLoader = CacheLoader()
 
         # example struct for source:
@@ -106,7 +106,7 @@ class DataCache:
         #    self.cacheStruct['id']['organizations']['dest']['BCGOV_organization'] = 'klsdjjfonvuweoiisdfxoi3o89kjsk'
         self.cacheStruct = {}
         self.reverseStruct = {}
-        self.ignores = CachedIgnores()
+        self.ignores = CachedIgnores(self.transConf)
         self.scheming = None
 
     def setScheming(self, schemingObj):
@@ -158,7 +158,7 @@ class DataCache:
             )
             raise InValidDataType(msg)
         dataType = dataSet.dataType
-        fieldmaps = self.transConf.getFieldMappings(dataType)
+        fieldmaps = self.transConf.getDataTypeConfig(dataType).fieldMappings
 
         for fieldmap in fieldmaps:
             autoGenFieldName = fieldmap[constants.FIELD_MAPPING_AUTOGEN_FIELD]
@@ -199,7 +199,7 @@ class DataCache:
         :type dataOrigin: constants.DATA_SOURCE
         """
 
-        fieldmaps = self.transConf.getFieldMappings(dataType)
+        fieldmaps = self.transConf.getDataTypeConfig(dataType).fieldMappings
 
         for record in rawData:
             for fieldmap in fieldmaps:
@@ -242,7 +242,7 @@ class DataCache:
         :type identifier: unique id, either user generated or autogenerated.
         """
         # read the fieldmap and extract the auto vs user gen unique id data:
-        fieldmaps = self.transConf.getFieldMappings(dataType)
+        fieldmaps = self.transConf.getDataTypeConfig(dataType).fieldMappings
         for fieldmap in fieldmaps:
             tmpAutoFldName = fieldmap[constants.FIELD_MAPPING_AUTOGEN_FIELD]
             tmpUserFldName = fieldmap[constants.FIELD_MAPPING_USER_FIELD]
@@ -566,8 +566,14 @@ class CachedIgnores:
     ignores.  This class is created to cache and retrieve that data
     """
 
-    def __init__(self):
+    def __init__(self, transConf=None):
         self.struct = {}
+        self.transConf = transConf
+        if self.transConf is None:
+            self.transConf = CKANTransform.getSharedConfig()
+        # (dataType, origin): the cached ignores merged with the ignore list
+        # in the transformation config, see getIgnoreSet()
+        self.ignoreSets = {}
 
     def addIgnore(self, dataType, origin, value):
         if dataType not in self.struct:
@@ -576,6 +582,26 @@ class CachedIgnores:
             self.struct[dataType][origin] = {}
         if value not in self.struct[dataType]:
             self.struct[dataType][origin][value] = 1
+        self.ignoreSets.pop((dataType, origin), None)
+
+    def getIgnoreSet(self, dataType, origin):
+        """
+        :param dataType: the datatype
+        :type dataType: str
+        :param origin: the instance the records are from
+        :type origin: constants.DATA_SOURCE
+        :return: the unique ids of the records of the datatype that are
+            ignored, both those in the transformation config ignore list and
+            those that have been cached
+        :rtype: frozenset
+        """
+        key = (dataType, origin)
+        if key not in self.ignoreSets:
+            configIgnores = self.transConf.getDataTypeConfig(dataType).ignoreList
+            self.ignoreSets[key] = configIgnores.union(
+                self.struct.get(dataType, {}).get(origin, {})
+            )
+        return self.ignoreSets[key]
 
     def isIgnored(self, dataType, origin, value):
         retVal = False
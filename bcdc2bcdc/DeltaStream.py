@@ -0,0 +1,187 @@
+"""
+Calculates the package delta while the packages are still being retrieved.
+
+The package fetchers call a callback as each package is received, see
+CKANWrapper.getPackagesAndData(onPackage=...).  PackageDeltaStream queues the
+packages from both the src and the dest instance and compares each package
+as soon as both of its sides have been received, so the comparisons run while
+the rest of the packages are still in transit.
+
+Once both retrievals are complete the lists they returned are reconciled with
+the packages that were streamed, any package that was not streamed is
+compared then, and the adds, deletes and updates are calculated the same way
+as CKANDataSet.getDelta.
+"""
+
+import functools
+import logging
+import queue
+
+import bcdc2bcdc.CKANData as CKANData
+import bcdc2bcdc.constants as constants
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# put on the queue when a retrieval is complete
+RETRIEVAL_COMPLETE = object()
+
+
+class PackageDeltaStream:
+    """Usage:
+
+        stream = PackageDeltaStream()
+        srcFuture = <start src retrieval with onPackage=stream.getCallback(SRC)>
+        destFuture = <start dest retrieval with onPackage=stream.getCallback(DEST)>
+        deltaObj = stream.getDelta(dataCache, srcFuture, destFuture)
+    """
+
+    def __init__(self):
+        # (data origin, package) tuples, filled by the retrieval threads
+        self.queue = queue.Queue()
+        # data origin: {unique id: CKANPackageRecord}
+        self.records = {dataOrigin: {} for dataOrigin in constants.DATA_SOURCE}
+        # unique id: True if the src and dest packages differ
+        self.diffs = {}
+        self.dataCache = None
+
+    def getCallback(self, dataOrigin):
+        """
+        :param dataOrigin: the instance the packages are retrieved from
+        :type dataOrigin: constants.DATA_SOURCE
+        :return: callable that queues a package received from the instance,
+            safe to call from any thread
+        :rtype: callable
+        """
+        return functools.partial(self.putPackage, dataOrigin)
+
+    def putPackage(self, dataOrigin, package):
+        self.queue.put((dataOrigin, package))
+
+    def getDelta(self, dataCache, srcFuture, destFuture):
+        """Compares the packages as they arrive, returns once both retrievals
+        are complete and all the packages have been compared.
+
+        :param dataCache: the data cache, the groups and organizations must
+            already have been loaded into it
+        :type dataCache: DataCache.DataCache
+        :param srcFuture: future for the src package retrieval, returns the
+            list of src packages
+        :type srcFuture: concurrent.futures.Future
+        :param destFuture: future for the dest package retrieval
+        :type destFuture: concurrent.futures.Future
+        :return: the adds, deletes and updates for the packages
+        :rtype: CKANData.CKANDataSetDeltas
+        """
+        self.dataCache = dataCache
+        futures = {
+            constants.DATA_SOURCE.SRC: srcFuture,
+            constants.DATA_SOURCE.DEST: destFuture,
+        }
+        for dataOrigin, future in futures.items():
+            future.add_done_callback(
+                lambda _future, dataOrigin=dataOrigin: self.putPackage(
+                    dataOrigin, RETRIEVAL_COMPLETE
+                )
+            )
+
+        retrieving = set(futures)
+        while retrieving:
+            dataOrigin, package = self.queue.get()
+            if package is RETRIEVAL_COMPLETE:
+                LOGGER.info(f"{dataOrigin.name} package retrieval complete")
+                retrieving.discard(dataOrigin)
+            else:
+                self.addPackage(dataOrigin, package)
+        LOGGER.info(f"compared {len(self.diffs)} packages during retrieval")
+
+        srcDataSet = self.getDataSet(
+            constants.DATA_SOURCE.SRC, srcFuture.result()
+        )
+        destDataSet = self.getDataSet(
+            constants.DATA_SOURCE.DEST, destFuture.result()
+        )
+        return self.calcDelta(srcDataSet, destDataSet)
+
+    def addPackage(self, dataOrigin, package):
+        """creates the record for the package, and compares it with the other
+        side if it has been received
+
+        :param dataOrigin: the instance the package was retrieved from
+        :type dataOrigin: constants.DATA_SOURCE
+        :param package: the package data
+        :type package: dict
+        :return: the record for the package
+        :rtype: CKANData.CKANPackageRecord
+        """
+        record = CKANData.CKANPackageRecord(package, dataOrigin, self.dataCache)
+        uniqueId = record.getUniqueIdentifier()
+        self.records[dataOrigin][uniqueId] = record
+        # a package received again replaces the earlier comparison
+        self.diffs.pop(uniqueId, None)
+
+        srcRecord = self.records[constants.DATA_SOURCE.SRC].get(uniqueId)
+        destRecord = self.records[constants.DATA_SOURCE.DEST].get(uniqueId)
+        if srcRecord is not None and destRecord is not None:
+            srcRecord.setDestRecord(destRecord)
+            isDiff = srcRecord != destRecord
+            self.diffs[uniqueId] = isDiff
+            # the comparable structs are only kept for the packages that will
+            # be updated
+            destRecord.releaseComparable()
+            if not isDiff:
+                srcRecord.releaseComparable()
+        return record
+
+    def getDataSet(self, dataOrigin, packages):
+        """Creates the dataset from the list of packages returned by the
+        retrieval.  Packages that were streamed but are not in the list are
+        dropped, packages in the list that were not streamed are added.
+
+        :param dataOrigin: the instance the packages were retrieved from
+        :type dataOrigin: constants.DATA_SOURCE
+        :param packages: the packages returned by the retrieval
+        :type packages: list of dict
+        :return: dataset made up of the package records
+        :rtype: CKANData.CKANPackageDataSet
+        """
+        streamedRecords = self.records[dataOrigin]
+        self.records[dataOrigin] = {}
+        uniqueField = CKANData.TRANSCONF.getDataTypeConfig(
+            constants.TRANSFORM_TYPE_PACKAGES
+        ).uniqueField
+        for package in packages:
+            uniqueId = package[uniqueField]
+            record = streamedRecords.get(uniqueId)
+            if record is not None and record.jsonData is package:
+                self.records[dataOrigin][uniqueId] = record
+            else:
+                self.addPackage(dataOrigin, package)
+
+        dataSet = CKANData.CKANPackageDataSet([], self.dataCache, dataOrigin)
+        for record in self.records[dataOrigin].values():
+            dataSet.addRecord(record)
+        return dataSet
+
+    def calcDelta(self, srcDataSet, destDataSet):
+        """
+        :param srcDataSet: all the src packages
+        :type srcDataSet: CKANData.CKANPackageDataSet
+        :param destDataSet: all the dest packages
+        :type destDataSet: CKANData.CKANPackageDataSet
+        :return: the adds, deletes and updates for the packages
+        :rtype: CKANData.CKANDataSetDeltas
+        """
+        deltaObj = CKANData.CKANDataSetDeltas(srcDataSet, destDataSet)
+
+        self.dataCache.addData(srcDataSet, constants.DATA_SOURCE.SRC)
+        self.dataCache.addData(destDataSet, constants.DATA_SOURCE.DEST)
+        srcDataSet.populateDataSets(destDataSet)
+
+        deltaObj.setDeleteCollection(srcDataSet.calcDeleteCollection(destDataSet))
+        deltaObj.setAddCollection(srcDataSet.calcAddCollection(destDataSet))
+        deltaObj.setUpdateCollection(
+            srcDataSet.calcUpdatesCollection(destDataSet, knownDiffs=self.diffs)
+        )
+        return deltaObj
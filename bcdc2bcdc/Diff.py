@@ -1,67 +1,336 @@
 """
-Up to now been using the amazing deepdiff module to calculate
-differences between two objects.
+Calculates the differences between two records, tuned to the structs that are
+returned by the CKAN api.
 
-Want more callback functionality in deep diff so that I can:
-* identify logic for comparison of specific keys in the dict
-* logic would identify if the boolean representation of the value is False
-* if that is the case for both the objects we are trying to compare then
-  no diff should be reported.
+Rules:
+* dicts are compared key by key, a key that only exists in one of the dicts
+  is a difference
+* the order of lists doesn't matter, lists are the same when they contain the
+  same elements, the same number of times
+* falsy values are the same, example:
 
-example:
 obj1 = root['source_data_path'] = None
 obj2 = root['source_data_path'] = [] or '' or {}
 
-in all cases above want to consider this to be no change.
+in all cases above want to consider this to be no change.  By default this
+applies to all fields, the fields it applies to can be limited with the
+falsyFields parameter.
 
-Implementation:
+The diff is a list of the paths that are different, in the format:
+root['resources'][2]['url'].  For lists that are different the paths are
+the positions of the elements that were not matched, in either list.
 
-* going to cludge this using the existing callback option: exclude_obj_callback
-* putting in its own class so that the callback function will have easy access
-   to the original object that is being compared
-* first time it encounters a key: it does nothing,
-* second time it encounters the key it will:
-   * retrieve the value the first time it encountered it
-   * get the current value
-   * do they both resolve to False
-   * if so then return True to exclude
+Diff objects don't keep any state between comparisons, so they can be used
+from multiple threads.
+
+Keyed lists:
+
+KeyedDiff compares lists of dicts, like the resources of a package, by
+matching the dicts in the two lists on the values of key fields, example the
+resource name, and diffing each pair.  The result says which elements were
+added, removed or changed, instead of the positions that didn't match.
+
+Content hashes:
+
+Most records that are compared are the same.  getContentHash() calculates a
+hash of a canonical version of a struct that follows the same rules as the
+diff.  When the hashes of two structs are the same there is no diff, and the
+diff doesn't need to be calculated.
 
 """
-import deepdiff
+import collections
+import hashlib
+import json
 import logging
 
+import bcdc2bcdc.constants as constants
+
 LOGGER = logging.getLogger(__name__)
 
+# the canonical form of all falsy values, None, "", [], {}, 0 and False
+CANONICAL_FALSY = "null"
+
+# a change to an element of a list, see KeyedDiff.  The positions are None
+# when the element isn't in that list, paths are the paths that are different
+# in the element, see Diff.getDiff()
+KeyedChange = collections.namedtuple(
+    "KeyedChange", ["changeType", "key", "position1", "position2", "paths"]
+)
+
+
+def isFalsyEquivalent(fieldName, falsyFields=None):
+    """
+    :param fieldName: the name of the dict key the value belongs to, values in
+        a list belong to the key of the list, None for the root of a struct
+    :type fieldName: str
+    :param falsyFields: the fields where falsy values are the same, None for
+        all fields
+    :type falsyFields: set, optional
+    :return: True if all falsy values of the field are the same
+    :rtype: bool
+    """
+    return falsyFields is None or fieldName in falsyFields
+
+
+def getCanonicalForm(struct, falsyFields=None, fieldName=None):
+    """Serializes a struct so that structs that the diff considers to be the
+    same are serialized to the same string.
+
+    * dict keys are sorted
+    * lists are sorted by the canonical form of their elements
+    * falsy values are all serialized as null
+
+    :param struct: the struct to serialize, made up of the types that are
+        returned by json.loads
+    :type struct: dict, list, str, int, float, bool, None
+    :param falsyFields: the fields where falsy values are the same, see
+        isFalsyEquivalent()
+    :type falsyFields: set, optional
+    :param fieldName: the name of the field the struct belongs to
+    :type fieldName: str, optional
+    :return: the canonical json for the struct
+    :rtype: str
+    """
+    if not struct and isFalsyEquivalent(fieldName, falsyFields):
+        return CANONICAL_FALSY
+    if isinstance(struct, dict):
+        members = [
+            f"{json.dumps(key)}:{getCanonicalForm(struct[key], falsyFields, key)}"
+            for key in sorted(struct)
+        ]
+        return "{" + ",".join(members) + "}"
+    if isinstance(struct, (list, tuple)):
+        items = sorted(
+            getCanonicalForm(item, falsyFields, fieldName) for item in struct
+        )
+        return "[" + ",".join(items) + "]"
+    return json.dumps(struct)
+
+
+def getContentHash(struct):
+    """
+    :param struct: the struct to hash
+    :type struct: dict, list
+    :return: blake2b digest of the canonical form of the struct, see
+        getCanonicalForm()
+    :rtype: bytes
+    """
+    canonical = getCanonicalForm(struct)
+    return hashlib.blake2b(canonical.encode("utf8"), digest_size=16).digest()
+
+
 class Diff:
 
-    def __init__(self, data1, data2):
+    def __init__(self, data1, data2, falsyFields=None):
+        """
+        :param data1: the first struct to compare
+        :type data1: dict, list
+        :param data2: the second struct to compare
+        :type data2: dict, list
+        :param falsyFields: the fields where falsy values are the same, None
+            for all fields, defaults to None
+        :type falsyFields: set, optional
+        """
         self.data1 = data1
         self.data2 = data2
+        self.falsyFields = falsyFields
 
-        # idea here is if I eventually want to specify the specific fields
-        # that I want the logic to apply to...  ... would require lots
-        # more logic
-        #self.typeIgnoreKeys = typeIgnoreKeys
+    def getDiff(self):
+        """
+        :return: the paths that are different, empty if the structs are the
+            same
+        :rtype: list of str
+        """
+        changes = []
+        self.compare(self.data1, self.data2, "root", None, changes, False)
+        return changes
+
+    def isSame(self):
+        """
+        :return: True if there is no diff, stops at the first difference
+        :rtype: bool
+        """
+        return not self.compare(self.data1, self.data2, "root", None, [], True)
+
+    def compare(self, value1, value2, path, fieldName, changes, firstOnly):
+        """adds the paths that are different in the two values to changes
+
+        :param value1: the value from the first struct
+        :param value2: the value from the second struct
+        :param path: the path to the values
+        :type path: str
+        :param fieldName: the name of the field the values belong to
+        :type fieldName: str
+        :param changes: the list the paths that are different are added to
+        :type changes: list
+        :param firstOnly: stop at the first difference
+        :type firstOnly: bool
+        :return: True if a difference was found and firstOnly is set
+        :rtype: bool
+        """
+        if value1 is value2:
+            return False
+        if (
+            not value1
+            and not value2
+            and isFalsyEquivalent(fieldName, self.falsyFields)
+        ):
+            return False
+        if isinstance(value1, dict) and isinstance(value2, dict):
+            return self.compareDicts(value1, value2, path, changes, firstOnly)
+        if isinstance(value1, list) and isinstance(value2, list):
+            return self.compareLists(
+                value1, value2, path, fieldName, changes, firstOnly
+            )
+        # type is checked so that 1, 1.0 and True are different
+        if type(value1) is type(value2) and value1 == value2:
+            return False
+        changes.append(path)
+        return firstOnly
+
+    def compareDicts(self, dict1, dict2, path, changes, firstOnly):
+        for key, value1 in dict1.items():
+            keyPath = f"{path}[{key!r}]"
+            if key not in dict2:
+                changes.append(keyPath)
+                if firstOnly:
+                    return True
+            elif self.compare(value1, dict2[key], keyPath, key, changes, firstOnly):
+                return True
+        for key in dict2:
+            if key not in dict1:
+                changes.append(f"{path}[{key!r}]")
+                if firstOnly:
+                    return True
+        return False
+
+    def compareLists(self, list1, list2, path, fieldName, changes, firstOnly):
+        # usually the lists are in the same order, so try that first
+        if len(list1) == len(list2) and not any(
+            self.compare(item1, item2, path, fieldName, [], True)
+            for item1, item2 in zip(list1, list2)
+        ):
+            return False
+
+        # match the elements regardless of order using their canonical forms
+        forms1 = [getCanonicalForm(item, self.falsyFields, fieldName) for item in list1]
+        forms2 = [getCanonicalForm(item, self.falsyFields, fieldName) for item in list2]
+        unmatched = collections.Counter(forms2)
+        unmatched.subtract(forms1)
+        if not any(unmatched.values()):
+            return False
+        if firstOnly:
+            changes.append(path)
+            return True
+
+        # positions of the elements that don't have a match in the other list
+        unmatchedPaths = []
+        for forms, sign in ((forms1, -1), (forms2, 1)):
+            for pos, form in enumerate(forms):
+                if unmatched[form] * sign > 0:
+                    unmatched[form] -= sign
+                    itemPath = f"{path}[{pos}]"
+                    if itemPath not in unmatchedPaths:
+                        unmatchedPaths.append(itemPath)
+        changes.extend(unmatchedPaths)
+        return False
 
-        self.keysFound = {}
+
+class KeyedDiff:
+    """Compares two lists of dicts, matching the dicts on the values of the
+    key fields.  Falsy key values are all the same.  When more than one dict
+    in a list has the same key, the dicts that are the same are matched first,
+    then the rest in the order they are in.
+    """
+
+    def __init__(self, list1, list2, keyFields, falsyFields=None):
+        """
+        :param list1: the first list of dicts
+        :type list1: list
+        :param list2: the second list of dicts
+        :type list2: list
+        :param keyFields: the names of the fields that identify a dict
+        :type keyFields: tuple of str
+        :param falsyFields: the fields where falsy values are the same, see
+            Diff
+        :type falsyFields: set, optional
+        """
+        self.list1 = list1
+        self.list2 = list2
+        self.keyFields = keyFields
+        self.falsyFields = falsyFields
+
+    def getKey(self, struct):
+        return tuple(struct.get(keyField) or None for keyField in self.keyFields)
+
+    def getPositionsByKey(self, structs):
+        positions = collections.OrderedDict()
+        for pos, struct in enumerate(structs):
+            positions.setdefault(self.getKey(struct), []).append(pos)
+        return positions
 
     def getDiff(self):
-        diff = deepdiff.DeepDiff(self.data1,
-                                 self.data2,
-                                 ignore_order=True,
-                                 exclude_obj_callback=self.excludeCallback)
-        return diff
-
-    def excludeCallback(self, *args):
-        keyVal = args[0]
-        keyRef = args[1]
-        retVal = False
-        if keyRef not in self.keysFound:
-            self.keysFound[keyRef] = keyVal
-        else:
-            # this is the second time the key has been encountered,
-            # exists in both datasets.
-            if not keyVal and not self.keysFound[keyRef]:
-                LOGGER.debug("ignore: {keyVal}")
-                retVal = True
-        return retVal
+        """
+        :return: the elements that were added, removed or changed, empty if
+            the lists are the same
+        :rtype: list of KeyedChange
+        """
+        positions1 = self.getPositionsByKey(self.list1)
+        positions2 = self.getPositionsByKey(self.list2)
+        changes = []
+        for key, keyPositions1 in positions1.items():
+            keyPositions2 = positions2.get(key, [])
+            pairs, unmatched1, unmatched2 = self.pairPositions(
+                keyPositions1, keyPositions2
+            )
+            for pos1, pos2 in pairs:
+                paths = Diff(self.list1[pos1], self.list2[pos2], self.falsyFields).getDiff()
+                if paths:
+                    changes.append(
+                        KeyedChange(constants.CHANGE_TYPES.CHANGED, key, pos1, pos2, paths)
+                    )
+            for pos1 in unmatched1:
+                changes.append(
+                    KeyedChange(constants.CHANGE_TYPES.REMOVED, key, pos1, None, [])
+                )
+            for pos2 in unmatched2:
+                changes.append(
+                    KeyedChange(constants.CHANGE_TYPES.ADDED, key, None, pos2, [])
+                )
+        for key, keyPositions2 in positions2.items():
+            if key not in positions1:
+                for pos2 in keyPositions2:
+                    changes.append(
+                        KeyedChange(constants.CHANGE_TYPES.ADDED, key, None, pos2, [])
+                    )
+        return changes
+
+    def pairPositions(self, positions1, positions2):
+        """pairs the positions of the elements with the same key in the two
+        lists
+
+        :return: the pairs of positions that need to be diffed, and the
+            positions in each list that don't have a pair
+        :rtype: tuple(list, list, list)
+        """
+        if len(positions1) == 1 and len(positions2) == 1:
+            return [(positions1[0], positions2[0])], [], []
+
+        # elements with the same content don't need to be diffed
+        positionsByForm = {}
+        for pos2 in positions2:
+            form = getCanonicalForm(self.list2[pos2], self.falsyFields)
+            positionsByForm.setdefault(form, collections.deque()).append(pos2)
+        remaining1 = []
+        for pos1 in positions1:
+            samePositions = positionsByForm.get(
+                getCanonicalForm(self.list1[pos1], self.falsyFields)
+            )
+            if samePositions:
+                samePositions.popleft()
+            else:
+                remaining1.append(pos1)
+        remaining2 = sorted(pos2 for same in positionsByForm.values() for pos2 in same)
+        pairCnt = min(len(remaining1), len(remaining2))
+        pairs = list(zip(remaining1[:pairCnt], remaining2[:pairCnt]))
+        return pairs, remaining1[pairCnt:], remaining2[pairCnt:]
@@ -0,0 +1,614 @@
+"""
+Self contained fake of the CKAN action api, used to benchmark complete runs
+without a real ckan instance.
+
+The users, groups, organizations and packages are held in memory by
+FakeCKANStore, and served by FakeCKANServer over http, from a background
+thread.  The server implements the actions that CKANWrapper, the package
+fetchers and ckanapi.RemoteCKAN use:
+
+* listings: package_list, package_search, user_list, group_list,
+  organization_list
+* reads: package_show, user_show, group_show, organization_show,
+  scheming_dataset_schema_show
+* writes: <type>_create, <type>_update, <type>_delete, user_generate_apikey
+
+Actions are served from both /api/3/action/<action> and /api/action/<action>
+(used by ckanapi), parameters are read from the query string and from a json
+body, regardless of the http method.  Deletes set the record state to
+'deleted' the same way ckan does, and deleted records are left out of the
+listings.
+
+Every request is delayed by the configured latency, so the effect of network
+round trips on a run can be reproduced.
+
+Usage:
+
+    store = FakeCKANStore({"packages": [...], "users": [...]})
+    server = FakeCKANServer(store, latency=0.05)
+    server.start()
+    ... point CKAN_URL_SRC / CKAN_URL_DEST at server.url ...
+    server.stop()
+"""
+
+import collections
+import copy
+import datetime
+import http.server
+import json
+import logging
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+import uuid
+
+import bcdc2bcdc.constants as constants
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+API_PATHS = ("/api/3/action/", "/api/action/")
+
+# maps the action prefix to the type of record the action works on
+ACTION_TYPES = {
+    "user": constants.TRANSFORM_TYPE_USERS,
+    "group": constants.TRANSFORM_TYPE_GROUPS,
+    "organization": constants.TRANSFORM_TYPE_ORGS,
+    "package": constants.TRANSFORM_TYPE_PACKAGES,
+}
+
+# the message ckan returns when a user name is already taken, CKANWrapper.addUser
+# looks for this message
+USER_NAME_UNAVAILABLE = "That login name is not available."
+NAME_UNAVAILABLE = "That URL is already in use."
+
+# the fields in the scheming definitions that the custom transformers validate,
+# see CustomTransformers
+DEFAULT_SCHEMING = {
+    "dataset_type": "bcdc_dataset",
+    "dataset_fields": [
+        {
+            "field_name": "publish_state",
+            "choices": [
+                {"value": value}
+                for value in ["DRAFT", "PUBLISHED", "PENDING ARCHIVE", "ARCHIVED"]
+            ],
+        },
+        {
+            "field_name": "download_audience",
+            "choices": [
+                {"value": value} for value in ["Public", "Government", "Named users"]
+            ],
+        },
+        {
+            "field_name": "view_audience",
+            "choices": [
+                {"value": value} for value in ["Public", "Government", "Named users"]
+            ],
+        },
+    ],
+    "resource_fields": [
+        {
+            "field_name": "bcdc_type",
+            "choices": [
+                {"value": value}
+                for value in ["geographic", "document", "webservice", "application"]
+            ],
+        },
+        {
+            "field_name": "resource_access_method",
+            "choices": [
+                {"value": value}
+                for value in [
+                    "direct access",
+                    "indirect access",
+                    "service",
+                    "application",
+                ]
+            ],
+        },
+        {
+            "field_name": "resource_storage_format",
+            "choices": [
+                {"value": value}
+                for value in [
+                    "arcgis_rest",
+                    "csv",
+                    "fgdb",
+                    "geojson",
+                    "html",
+                    "json",
+                    "kml",
+                    "oracle_sde",
+                    "other",
+                    "pdf",
+                    "shp",
+                    "wms",
+                    "xlsx",
+                    "zip",
+                ]
+            ],
+        },
+        {
+            "field_name": "resource_type",
+            "choices": [
+                {"value": value}
+                for value in ["abstraction", "data", "metadata", "reference"]
+            ],
+        },
+        {
+            "field_name": "resource_storage_location",
+            "choices": [
+                {"value": value}
+                for value in [
+                    "bc geographic warehouse",
+                    "catalogue data store",
+                    "external",
+                    "web or ftp site",
+                ]
+            ],
+        },
+    ],
+}
+
+
+def getTimeStamp():
+    """
+    :return: the current time in the format ckan uses for metadata_modified,
+        example: 2020-05-01T18:20:11.123456
+    :rtype: str
+    """
+    return datetime.datetime.utcnow().isoformat()
+
+
+def getSolrTimeStamp(timeStamp):
+    """
+    :param timeStamp: a timestamp in the format ckan uses for metadata_modified
+    :type timeStamp: str
+    :return: the timestamp in the format solr returns it in when the fields are
+        selected with fl, milliseconds without trailing zeros and a trailing
+        Z, example: 2020-05-01T18:20:11.12Z
+    :rtype: str
+    """
+    seconds, _, fraction = timeStamp.partition(".")
+    milliseconds = fraction[:3].rstrip("0")
+    if milliseconds:
+        seconds = f"{seconds}.{milliseconds}"
+    return f"{seconds}Z"
+
+
+def getBool(params, key, default=False):
+    """
+    :param params: the request parameters
+    :type params: dict
+    :param key: the name of the parameter
+    :type key: str
+    :param default: the value if the parameter is not defined
+    :type default: bool
+    :return: the parameter as a bool, query string values are strings
+    :rtype: bool
+    """
+    value = params.get(key, default)
+    if isinstance(value, str):
+        value = value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+
+def getInt(params, key, default=None):
+    """
+    :param params: the request parameters
+    :type params: dict
+    :param key: the name of the parameter
+    :type key: str
+    :param default: the value if the parameter is not defined
+    :type default: int
+    :return: the parameter as an int
+    :rtype: int
+    """
+    value = params.get(key)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+class FakeCKANError(Exception):
+    """Raised by the actions, returned to the client as a ckan error
+    response.
+    """
+
+    def __init__(self, status, errorType, message, fieldErrors=None):
+        self.status = status
+        self.errorType = errorType
+        self.message = message
+        self.fieldErrors = fieldErrors or {}
+        LOGGER.debug(f"{status} {errorType}: {message}")
+        super().__init__(message)
+
+    def getError(self):
+        """
+        :return: the error property of the response, in the format that
+            ckanapi translates back into its exceptions
+        :rtype: dict
+        """
+        error = {"__type": self.errorType, "message": self.message}
+        error.update(self.fieldErrors)
+        return error
+
+
+class NotFound(FakeCKANError):
+    def __init__(self, message):
+        super().__init__(404, "Not Found Error", message)
+
+
+class ValidationError(FakeCKANError):
+    def __init__(self, fieldErrors):
+        super().__init__(409, "Validation Error", "Validation Error", fieldErrors)
+
+
+class FakeCKANStore:
+    """In memory records for a single fake ckan instance, and the
+    implementation of the actions that read and write them.  Thread safe.
+    """
+
+    def __init__(self, data=None, scheming=None):
+        """
+        :param data: the initial records, keyed by data type, example:
+            {"users": [...], "packages": [...]}
+        :type data: dict, optional
+        :param scheming: the scheming definitions returned by
+            scheming_dataset_schema_show, defaults to DEFAULT_SCHEMING
+        :type scheming: dict, optional
+        """
+        # data type: {record name: record}
+        self.records = {dataType: {} for dataType in ACTION_TYPES.values()}
+        # record id: record name, per data type
+        self.idIndex = {dataType: {} for dataType in ACTION_TYPES.values()}
+        # data type: active records ordered by name, rebuilt after a write
+        self.activeCache = {}
+        self.scheming = scheming if scheming is not None else DEFAULT_SCHEMING
+        self.lock = threading.RLock()
+        if data:
+            self.load(data)
+
+    def load(self, data):
+        """adds records to the store without changing their timestamps
+
+        :param data: the records, keyed by data type
+        :type data: dict
+        """
+        with self.lock:
+            for dataType, records in data.items():
+                for record in records:
+                    self.putRecord(dataType, copy.deepcopy(record))
+
+    def dump(self):
+        """
+        :return: copy of all the records in the store, keyed by data type
+        :rtype: dict
+        """
+        with self.lock:
+            return {
+                dataType: [copy.deepcopy(record) for record in records.values()]
+                for dataType, records in self.records.items()
+            }
+
+    def putRecord(self, dataType, record):
+        record.setdefault("id", str(uuid.uuid4()))
+        record.setdefault("state", "active")
+        self.records[dataType][record["name"]] = record
+        self.idIndex[dataType][record["id"]] = record["name"]
+        self.activeCache.pop(dataType, None)
+
+    def findRecord(self, dataType, identifier):
+        """
+        :param dataType: the type of record
+        :type dataType: str
+        :param identifier: the name or id of the record
+        :type identifier: str
+        :raises NotFound: when there is no record with the name or id
+        :return: the record
+        :rtype: dict
+        """
+        name = self.idIndex[dataType].get(identifier, identifier)
+        if name not in self.records[dataType]:
+            raise NotFound(f"{dataType} {identifier} not found")
+        return self.records[dataType][name]
+
+    def getActive(self, dataType):
+        """
+        :return: the records that have not been deleted, ordered by name
+        :rtype: list of dict
+        """
+        if dataType not in self.activeCache:
+            records = self.records[dataType]
+            self.activeCache[dataType] = [
+                records[name]
+                for name in sorted(records)
+                if records[name].get("state", "active") == "active"
+            ]
+        return self.activeCache[dataType]
+
+    def call(self, action, params):
+        """Runs an action.
+
+        :param action: the action name, example: package_show
+        :type action: str
+        :param params: the action parameters
+        :type params: dict
+        :raises FakeCKANError: when the action fails
+        :return: the result of the action
+        """
+        handlerName = "action_" + action
+        if hasattr(self, handlerName):
+            handler = getattr(self, handlerName)
+            with self.lock:
+                return copy.deepcopy(handler(params))
+
+        objType, _, operation = action.partition("_")
+        if objType not in ACTION_TYPES or operation not in (
+            "show",
+            "create",
+            "update",
+            "delete",
+        ):
+            raise FakeCKANError(400, "Bad Request", f"unknown action: {action}")
+        dataType = ACTION_TYPES[objType]
+        with self.lock:
+            if operation == "show":
+                result = self.findRecord(dataType, params.get("id", ""))
+            elif operation == "create":
+                result = self.createRecord(dataType, objType, params)
+            elif operation == "update":
+                result = self.updateRecord(dataType, params)
+            else:
+                record = self.findRecord(dataType, params.get("id", ""))
+                record["state"] = "deleted"
+                self.activeCache.pop(dataType, None)
+                result = None
+            return copy.deepcopy(result)
+
+    def createRecord(self, dataType, objType, params):
+        record = copy.deepcopy(params)
+        name = record.get("name")
+        if not name:
+            raise ValidationError({"name": ["Missing value"]})
+        if name in self.records[dataType]:
+            message = USER_NAME_UNAVAILABLE if objType == "user" else NAME_UNAVAILABLE
+            raise ValidationError({"name": [message]})
+        if record.get("id") in self.idIndex[dataType]:
+            del record["id"]
+        if dataType == constants.TRANSFORM_TYPE_PACKAGES:
+            record["metadata_created"] = record["metadata_modified"] = getTimeStamp()
+        self.putRecord(dataType, record)
+        return record
+
+    def updateRecord(self, dataType, params):
+        identifier = params.get("id") or params.get("name", "")
+        existing = self.findRecord(dataType, identifier)
+        # update replaces the record, but it keeps its identity
+        record = copy.deepcopy(params)
+        record["id"] = existing["id"]
+        record.setdefault("name", existing["name"])
+        record.setdefault("state", existing.get("state", "active"))
+        if record["name"] != existing["name"]:
+            del self.records[dataType][existing["name"]]
+            self.activeCache.pop(dataType, None)
+        if dataType == constants.TRANSFORM_TYPE_PACKAGES:
+            record["metadata_created"] = existing.get("metadata_created")
+            record["metadata_modified"] = getTimeStamp()
+        self.putRecord(dataType, record)
+        return record
+
+    def getPage(self, records, params, defaultLimit=None):
+        offset = getInt(params, "offset", 0)
+        limit = getInt(params, "limit", defaultLimit)
+        if limit is None:
+            return records[offset:]
+        return records[offset:offset + limit]
+
+    def action_package_list(self, params):
+        packages = self.getActive(constants.TRANSFORM_TYPE_PACKAGES)
+        return [pkg["name"] for pkg in self.getPage(packages, params)]
+
+    def action_package_search(self, params):
+        """supports the subset of solr used by CKANWrapper: rows, start,
+        fl, sort by a single field, and a metadata_modified range in fq.
+        Dates in the fields selected with fl are in the solr format
+        """
+        packages = self.getActive(constants.TRANSFORM_TYPE_PACKAGES)
+        fq = params.get("fq") or ""
+        if fq.startswith("metadata_modified:["):
+            since = fq[len("metadata_modified:["):].split(" TO ")[0].rstrip("Z")
+            packages = [
+                pkg for pkg in packages if pkg.get("metadata_modified", "") >= since
+            ]
+        sortField, _, sortOrder = (params.get("sort") or "name asc").partition(" ")
+        if sortField != "name" or sortOrder.strip() == "desc":
+            packages = sorted(
+                packages,
+                key=lambda pkg: pkg.get(sortField) or "",
+                reverse=sortOrder.strip() == "desc",
+            )
+        rows = getInt(params, "rows", 10)
+        start = getInt(params, "start", 0)
+        results = packages[start:start + rows]
+        if params.get("fl"):
+            fields = [field.strip() for field in params["fl"].split(",")]
+            results = [
+                {field: pkg.get(field) for field in fields if field in pkg}
+                for pkg in results
+            ]
+            # dates come from the solr index rather than the stored package
+            for result in results:
+                for field in ("metadata_created", "metadata_modified"):
+                    if result.get(field):
+                        result[field] = getSolrTimeStamp(result[field])
+        return {"count": len(packages), "results": results}
+
+    def action_user_list(self, params):
+        users = self.getActive(constants.TRANSFORM_TYPE_USERS)
+        if not getBool(params, "all_fields", True):
+            return [user["name"] for user in users]
+        return users
+
+    def getGroupList(self, dataType, params):
+        groups = self.getPage(self.getActive(dataType), params)
+        if not getBool(params, "all_fields"):
+            return [group["name"] for group in groups]
+        return groups
+
+    def action_group_list(self, params):
+        return self.getGroupList(constants.TRANSFORM_TYPE_GROUPS, params)
+
+    def action_organization_list(self, params):
+        return self.getGroupList(constants.TRANSFORM_TYPE_ORGS, params)
+
+    def action_user_generate_apikey(self, params):
+        user = self.findRecord(constants.TRANSFORM_TYPE_USERS, params.get("id", ""))
+        user["apikey"] = str(uuid.uuid4())
+        return user
+
+    def action_scheming_dataset_schema_show(self, params):  # pylint: disable=unused-argument
+        return self.scheming
+
+
+class FakeCKANRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Translates http requests into FakeCKANStore actions"""
+
+    # keep alive, so the client connection pools are exercised the same way
+    # they would be against a real instance
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.handleAction()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.handleAction()
+
+    def getParams(self):
+        """
+        :return: the query string parameters merged with the json body
+        :rtype: dict
+        """
+        parsedUrl = urllib.parse.urlparse(self.path)
+        params = {
+            key: values[-1]
+            for key, values in urllib.parse.parse_qs(parsedUrl.query).items()
+        }
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length)
+            if body:
+                params.update(json.loads(body.decode("utf-8")))
+        return params
+
+    def getAction(self):
+        path = urllib.parse.urlparse(self.path).path
+        for apiPath in API_PATHS:
+            if path.startswith(apiPath):
+                return path[len(apiPath):].strip("/")
+        return None
+
+    def handleAction(self):
+        server = self.server
+        action = self.getAction()
+        status = 200
+        try:
+            params = self.getParams()
+            if action is None:
+                raise NotFound(f"not an action api path: {self.path}")
+            server.recordRequest(action)
+            server.delay(action)
+            respStruct = {"success": True, "result": server.store.call(action, params)}
+        except FakeCKANError as err:
+            status = err.status
+            respStruct = {"success": False, "error": err.getError()}
+        except ValueError as err:
+            status = 400
+            respStruct = {
+                "success": False,
+                "error": {"__type": "Bad Request", "message": str(err)},
+            }
+        body = json.dumps(respStruct).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOGGER.debug(f"{self.address_string()} {format % args}")
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class FakeCKANServer(ThreadingHTTPServer):
+    """Serves a FakeCKANStore, each request is handled in its own thread."""
+
+    def __init__(self, store=None, host="127.0.0.1", port=0, latency=0,
+                 writeLatency=None, jitter=0):
+        """
+        :param store: the records to serve, defaults to an empty store
+        :type store: FakeCKANStore, optional
+        :param host: the interface to listen on, defaults to 127.0.0.1
+        :type host: str, optional
+        :param port: the port to listen on, defaults to 0, any free port
+        :type port: int, optional
+        :param latency: seconds every read request is delayed by, defaults to 0
+        :type latency: float, optional
+        :param writeLatency: seconds every write request is delayed by,
+            defaults to the read latency
+        :type writeLatency: float, optional
+        :param jitter: fraction the latency is randomly varied by, example
+            0.2 delays each request by +/- 20% of the latency, defaults to 0
+        :type jitter: float, optional
+        """
+        self.store = store if store is not None else FakeCKANStore()
+        self.latency = latency
+        self.writeLatency = latency if writeLatency is None else writeLatency
+        self.jitter = jitter
+        # action name: number of requests
+        self.requestCounts = collections.Counter()
+        self.countLock = threading.Lock()
+        self.thread = None
+        ThreadingHTTPServer.__init__(self, (host, port), FakeCKANRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def recordRequest(self, action):
+        with self.countLock:
+            self.requestCounts[action] += 1
+
+    def delay(self, action):
+        """sleeps for the latency configured for the action"""
+        objType, _, operation = action.partition("_")
+        isWrite = action == "user_generate_apikey" or (
+            objType in ACTION_TYPES and operation in ("create", "update", "delete")
+        )
+        latency = self.writeLatency if isWrite else self.latency
+        if self.jitter:
+            latency *= 1 + random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+    def start(self):
+        """starts serving requests from a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        LOGGER.info(f"fake ckan listening on: {self.url}")
+
+    def stop(self):
+        """stops serving requests and closes the socket"""
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
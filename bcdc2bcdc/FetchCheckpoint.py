@@ -0,0 +1,263 @@
+"""
+Keeps track of the packages requested and received by the package fetchers.
+
+FetchManifest records, in memory, which package names have been requested,
+received and have failed.  The fetchers use it to identify the packages that
+are missing once a pass through the package list is complete.
+
+FetchCheckpoint is a FetchManifest that is also written to disk as the fetch
+progresses, so a fetch that fails part way through can be resumed by the next
+run, only requesting the packages that were not received.
+
+* each received package is written to the snapshot store objects, see
+  SnapshotStore
+* every event is appended to a journal, one json object per line:
+      {"event": "requested", "names": [...]}
+      {"event": "received", "name": "...", "hash": "..."}
+      {"event": "failed", "name": "..."}
+* once the fetch is complete the journal is deleted
+
+Checkpoints older than constants.FETCH_CHECKPOINT_MAX_AGE_HOURS are discarded
+rather than resumed, as the packages they contain are likely out of date.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.SnapshotStore as SnapshotStore
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+EVENT_REQUESTED = "requested"
+EVENT_RECEIVED = "received"
+EVENT_FAILED = "failed"
+
+
+class FetchManifest:
+    """In memory record of the packages that have been requested, received
+    and that failed.
+    """
+
+    def __init__(self):
+        self.requested = set()
+        self.received = set()
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def resume(self, packageNameList):  # pylint: disable=unused-argument
+        """
+        :param packageNameList: the packages that are about to be retrieved
+        :type packageNameList: list of str
+        :return: packages that were received by an earlier fetch and do not
+            need to be requested again
+        :rtype: list of dict
+        """
+        return []
+
+    def addRequested(self, packageNames):
+        """
+        :param packageNames: names of the packages that are being requested
+        :type packageNames: list of str
+        """
+        with self.lock:
+            self.requested.update(packageNames)
+
+    def addReceived(self, packageData):
+        """
+        :param packageData: a package that has been retrieved
+        :type packageData: dict
+        :return: False if the package had already been received
+        :rtype: bool
+        """
+        pkgName = packageData["name"]
+        with self.lock:
+            isNew = pkgName not in self.received
+            self.received.add(pkgName)
+            self.failed.discard(pkgName)
+        return isNew
+
+    def addFailed(self, pkgName):
+        """
+        :param pkgName: name of a package that could not be retrieved
+        :type pkgName: str
+        """
+        with self.lock:
+            self.failed.add(pkgName)
+
+    def getMissing(self, packageNameList):
+        """
+        :param packageNameList: the packages that were requested
+        :type packageNameList: list of str
+        :return: the names in packageNameList that have not been received, in
+            the same order
+        :rtype: list of str
+        """
+        return [pkgName for pkgName in packageNameList if pkgName not in self.received]
+
+    def complete(self):
+        """called once all the requested packages have been received"""
+
+
+class FetchCheckpoint(FetchManifest):
+    """FetchManifest that is written to disk so an interrupted fetch can be
+    resumed.
+    """
+
+    # how often the object manifest is saved, keeps the objects that have
+    # been received from being removed by SnapshotStore.pruneObjects()
+    SAVE_INTERVAL = 500
+
+    def __init__(self, instanceId, cacheFiles=None):
+        """
+        :param instanceId: identifies the ckan instance, see
+            SnapshotStore.getInstanceId()
+        :type instanceId: str
+        :param cacheFiles: used to calculate the snapshot directory, defaults
+            to None
+        :type cacheFiles: CacheFiles.CKANCacheFiles, optional
+        """
+        FetchManifest.__init__(self)
+        self.store = SnapshotStore.SnapshotStore(
+            instanceId, "fetch_checkpoint", cacheFiles=cacheFiles
+        )
+        self.journalPath = os.path.join(
+            self.store.dir, f"{instanceId}_fetch_journal.jsonl"
+        )
+        self.journal = None
+        self.unsaved = 0
+
+    def readJournal(self):
+        """replays the journal left by an earlier fetch into the manifest"""
+        with open(self.journalPath) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line may have been cut off when the process
+                    # stopped
+                    LOGGER.warning(f"skipping incomplete journal line: {line!r}")
+                    continue
+                if entry["event"] == EVENT_REQUESTED:
+                    self.requested.update(entry["names"])
+                elif entry["event"] == EVENT_RECEIVED:
+                    self.received.add(entry["name"])
+                    self.failed.discard(entry["name"])
+                    self.store.manifest[entry["name"]] = entry["hash"]
+                elif entry["event"] == EVENT_FAILED:
+                    self.failed.add(entry["name"])
+
+    def isExpired(self):
+        """
+        :return: whether the journal is too old to be resumed
+        :rtype: bool
+        """
+        ageHours = (time.time() - os.path.getmtime(self.journalPath)) / 3600
+        return ageHours > constants.FETCH_CHECKPOINT_MAX_AGE_HOURS
+
+    def resume(self, packageNameList):
+        """Loads the packages received by an earlier fetch that did not
+        complete, and starts a new journal containing them.
+
+        :param packageNameList: the packages that are about to be retrieved
+        :type packageNameList: list of str
+        :return: the packages in packageNameList that were received by the
+            earlier fetch
+        :rtype: list of dict
+        """
+        packages = []
+        # the journal is the record of what was received, the object manifest
+        # may not have been saved since the last packages were received
+        self.store.clear()
+        if os.path.exists(self.journalPath):
+            if self.isExpired():
+                LOGGER.info(f"discarding expired checkpoint: {self.journalPath}")
+            else:
+                self.readJournal()
+        requestedNames = set(packageNameList)
+        for pkgName in list(self.store.getIds()):
+            contentHash = self.store.getHash(pkgName)
+            if pkgName in requestedNames and os.path.exists(
+                self.store.getObjectPath(contentHash)
+            ):
+                packages.append(self.store.getRecord(pkgName))
+            else:
+                self.store.removeRecord(pkgName)
+        self.received = set(self.store.getIds())
+        self.requested = set()
+        self.failed = set()
+        if packages:
+            LOGGER.info(
+                f"resuming from checkpoint, {len(packages)} of "
+                f"{len(packageNameList)} packages already received"
+            )
+
+        # start a new journal with the packages carried over.  The new journal
+        # is closed before it replaces the old one, an open file can't be
+        # replaced on windows
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        tmpPath = self.journalPath + ".tmp"
+        with open(tmpPath, "w") as fh:
+            for pkgName in self.store.getIds():
+                entry = {
+                    "event": EVENT_RECEIVED,
+                    "name": pkgName,
+                    "hash": self.store.getHash(pkgName),
+                }
+                fh.write(json.dumps(entry) + "\n")
+        os.replace(tmpPath, self.journalPath)
+        self.journal = open(self.journalPath, "a")
+        self.store.save()
+        return packages
+
+    def writeEntry(self, **entry):
+        """appends an entry to the journal, flushed so it survives the process
+        stopping
+        """
+        if self.journal is None:
+            self.journal = open(self.journalPath, "a")
+        self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+
+    def addRequested(self, packageNames):
+        FetchManifest.addRequested(self, packageNames)
+        with self.lock:
+            self.writeEntry(event=EVENT_REQUESTED, names=list(packageNames))
+
+    def addReceived(self, packageData):
+        isNew = FetchManifest.addReceived(self, packageData)
+        if isNew:
+            contentHash = self.store.putRecord(packageData)
+            with self.lock:
+                self.writeEntry(
+                    event=EVENT_RECEIVED, name=packageData["name"], hash=contentHash
+                )
+                self.unsaved += 1
+                if self.unsaved >= self.SAVE_INTERVAL:
+                    self.store.save()
+                    self.unsaved = 0
+        return isNew
+
+    def addFailed(self, pkgName):
+        FetchManifest.addFailed(self, pkgName)
+        with self.lock:
+            self.writeEntry(event=EVENT_FAILED, name=pkgName)
+
+    def complete(self):
+        """deletes the checkpoint, the objects it referred to are removed the
+        next time the snapshot objects are pruned
+        """
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        for filePath in [self.journalPath, self.store.manifestPath]:
+            if os.path.exists(filePath):
+                os.remove(filePath)
+        LOGGER.debug(f"fetch complete, removed checkpoint: {self.journalPath}")
@@ -0,0 +1,315 @@
+"""
+Process wide registry of http clients.
+
+Every component that talks to a ckan instance (CKANWrapper, the package
+fetchers, CacheLoader, Scheming) gets its http client from here, so there is
+one connection pool per host rather than a pool per object.  Pools are sized
+from the configured fetch concurrency.
+
+Requests to a host, from both the threaded and the asyncio clients, are
+limited by the host's throttle, see Throttle.
+
+Requests made through the sessions are retried according to the retry policy
+by RetryingHTTPAdapter, see Retry.
+
+Sessions are shared between components, including the src and dest wrappers
+when they point at the same host, so api keys must be sent as per request
+headers and never set on the session.
+
+aiohttp sessions are bound to an event loop, so the asyncio clients share a
+single process wide event loop that runs in its own thread, see
+getEventLoop() and runCoroutine()
+
+When a cassette is enabled, see Cassette, the responses are recorded by the
+adapters and the async sessions, or are served from the cassette instead of
+the network.
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+import time
+import urllib.parse
+
+import aiohttp
+import requests
+import requests.adapters
+import urllib3.exceptions
+
+import bcdc2bcdc.Cassette as Cassette
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.Retry as Retry
+import bcdc2bcdc.Throttle as Throttle
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# host key: requests.Session
+SESSIONS = {}
+# host key: aiohttp.ClientSession
+ASYNC_SESSIONS = {}
+# host key: Throttle.HostThrottle
+THROTTLES = {}
+
+EVENT_LOOP = None
+EVENT_LOOP_THREAD = None
+REGISTRY_LOCK = threading.Lock()
+
+
+class RetryingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter that applies the retry policy to every request sent through
+    it, and adds the policy's timeout to requests that don't define one.  Every
+    attempt waits on the host's throttle, using the write rate limit for the
+    actions that modify data.  When a cassette is provided the response that is
+    finally returned for each request is recorded to it.
+    """
+
+    def __init__(self, throttle, retryPolicy=None, cassette=None, **kwargs):
+        self.throttle = throttle
+        self.retryPolicy = retryPolicy
+        if self.retryPolicy is None:
+            self.retryPolicy = Retry.getDefaultPolicy()
+        self.cassette = cassette
+        requests.adapters.HTTPAdapter.__init__(self, **kwargs)
+
+    def sendThrottled(self, request, **kwargs):
+        """sends a single attempt of the request once the throttle allows it,
+        and reports the outcome back to the throttle.
+
+        :param request: the request to send
+        :type request: requests.PreparedRequest
+        :return: the response
+        :rtype: requests.Response
+        """
+        self.throttle.acquire(Throttle.isWriteRequest(request.method, request.url))
+        startTime = time.monotonic()
+        success = False
+        try:
+            resp = requests.adapters.HTTPAdapter.send(self, request, **kwargs)
+            success = Throttle.isSuccessStatus(resp.status_code)
+        finally:
+            self.throttle.release(success, time.monotonic() - startTime)
+        return resp
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        startTime = time.monotonic()
+        resp = self.sendWithRetries(request, **kwargs)
+        if self.cassette is not None:
+            Cassette.recordResponse(
+                self.cassette, request, resp, time.monotonic() - startTime
+            )
+        return resp
+
+    def sendWithRetries(self, request, **kwargs):
+        """sends the request, retrying it according to the retry policy
+
+        :param request: the request to send
+        :type request: requests.PreparedRequest
+        :return: the response to the last attempt
+        :rtype: requests.Response
+        """
+        policy = self.retryPolicy
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = policy.requestTimeout
+        idempotent = Retry.isIdempotent(request.method, request.url)
+        attempt = 0
+        while True:
+            try:
+                resp = self.sendThrottled(request, **kwargs)
+            except requests.exceptions.ConnectionError as err:
+                # connect failures mean the request was never sent, so they
+                # can be retried for any request.
+                delay = policy.getDelay(attempt)
+                if (not idempotent and not isConnectFailure(err)) or (
+                    not policy.canRetry(attempt, delay)
+                ):
+                    raise
+                LOGGER.warning(
+                    f"{request.method} {request.url} failed: {err}, retry "
+                    f"{attempt + 1} of {policy.maxRetries} in {delay:.1f}s"
+                )
+            except requests.exceptions.Timeout:
+                delay = policy.getDelay(attempt)
+                if not idempotent or not policy.canRetry(attempt, delay):
+                    raise
+                LOGGER.warning(
+                    f"{request.method} {request.url} timed out, retry "
+                    f"{attempt + 1} of {policy.maxRetries} in {delay:.1f}s"
+                )
+            else:
+                if not policy.isRetryableStatus(
+                    resp.status_code, request.method, request.url
+                ):
+                    return resp
+                delay = policy.getDelay(attempt, resp.headers.get("Retry-After"))
+                if not policy.canRetry(attempt, delay):
+                    return resp
+                LOGGER.warning(
+                    f"{request.method} {request.url} status: {resp.status_code}, "
+                    f"retry {attempt + 1} of {policy.maxRetries} in {delay:.1f}s"
+                )
+                resp.close()
+            policy.sleep(delay)
+            attempt += 1
+
+
+def isConnectFailure(err):
+    """
+    :param err: exception raised when sending a request
+    :type err: requests.exceptions.ConnectionError
+    :return: whether the error occurred while establishing the connection,
+        ie before any of the request was sent
+    :rtype: bool
+    """
+    reason = None
+    if err.args:
+        reason = getattr(err.args[0], "reason", None)
+    return isinstance(err, requests.exceptions.ConnectTimeout) or isinstance(
+        reason, urllib3.exceptions.NewConnectionError
+    )
+
+
+def getHostKey(url):
+    """
+    :param url: any url for the host
+    :type url: str
+    :return: the scheme and host portion of the url, example
+        https://cat.data.gov.bc.ca
+    :rtype: str
+    """
+    parsedUrl = urllib.parse.urlparse(url)
+    return f"{parsedUrl.scheme}://{parsedUrl.netloc}".lower()
+
+
+def getPoolSize():
+    """
+    :return: the number of connections to keep in the pool for each host
+    :rtype: int
+    """
+    return constants.getFetchConcurrency()
+
+
+def getThrottle(url):
+    """Returns the throttle for the host in the url, shared by all the clients
+    that talk to the host.
+
+    :param url: any url for the host
+    :type url: str
+    :return: the throttle for the host
+    :rtype: Throttle.HostThrottle
+    """
+    hostKey = getHostKey(url)
+    with REGISTRY_LOCK:
+        if hostKey not in THROTTLES:
+            THROTTLES[hostKey] = Throttle.HostThrottle(hostKey)
+    return THROTTLES[hostKey]
+
+
+def getSession(url):
+    """Returns the requests session for the host in the url, creating it the
+    first time a host is requested.
+
+    :param url: any url for the host
+    :type url: str
+    :return: session with a connection pool for the host
+    :rtype: requests.Session
+    """
+    hostKey = getHostKey(url)
+    throttle = getThrottle(url)
+    with REGISTRY_LOCK:
+        if hostKey not in SESSIONS:
+            poolSize = getPoolSize()
+            LOGGER.debug(f"creating session for: {hostKey}, pool size: {poolSize}")
+            cassette = Cassette.getCassette()
+            if cassette is not None and cassette.isReplay():
+                adapter = Cassette.ReplayAdapter(cassette)
+            else:
+                adapter = RetryingHTTPAdapter(
+                    throttle, cassette=cassette, pool_connections=1,
+                    pool_maxsize=poolSize
+                )
+            session = requests.Session()
+            session.mount(f"{hostKey}/", adapter)
+            SESSIONS[hostKey] = session
+    return SESSIONS[hostKey]
+
+
+def getEventLoop():
+    """
+    :return: the event loop that all the asyncio clients run on.  The loop
+        runs in its own thread so it can be used by more than one thread at a
+        time, for example the src and dest prefetches, see runCoroutine()
+    :rtype: asyncio.AbstractEventLoop
+    """
+    global EVENT_LOOP, EVENT_LOOP_THREAD  # pylint: disable=global-statement
+    with REGISTRY_LOCK:
+        if EVENT_LOOP is None or EVENT_LOOP.is_closed():
+            EVENT_LOOP = asyncio.new_event_loop()
+            EVENT_LOOP_THREAD = threading.Thread(
+                target=EVENT_LOOP.run_forever, name="asyncio-clients", daemon=True
+            )
+            EVENT_LOOP_THREAD.start()
+    return EVENT_LOOP
+
+
+def runCoroutine(coroutine):
+    """runs a coroutine on the shared event loop, and waits for it to complete
+
+    :param coroutine: the coroutine to run
+    :type coroutine: coroutine
+    :return: the value returned by the coroutine
+    :rtype: any
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, getEventLoop()).result()
+
+
+def getAsyncSession(url):
+    """Returns the aiohttp session for the host in the url.  Must be called
+    from a coroutine running on the loop returned by getEventLoop()
+
+    :param url: any url for the host
+    :type url: str
+    :return: session with a connection pool for the host, or when a cassette
+        is enabled, a session that records to or replays from the cassette
+    :rtype: aiohttp.ClientSession
+    """
+    hostKey = getHostKey(url)
+    if hostKey not in ASYNC_SESSIONS or ASYNC_SESSIONS[hostKey].closed:
+        cassette = Cassette.getCassette()
+        if cassette is not None and cassette.isReplay():
+            ASYNC_SESSIONS[hostKey] = Cassette.ReplayAsyncSession(cassette)
+        else:
+            connections = getPoolSize()
+            LOGGER.debug(
+                f"creating async session for: {hostKey}, connections: {connections}"
+            )
+            connector = aiohttp.TCPConnector(limit_per_host=connections)
+            session = aiohttp.ClientSession(connector=connector)
+            if cassette is not None:
+                session = Cassette.RecordingAsyncSession(session, cassette)
+            ASYNC_SESSIONS[hostKey] = session
+    return ASYNC_SESSIONS[hostKey]
+
+
+def closeAll():
+    """closes all the sessions and the event loop, called when the process
+    exits.
+    """
+    for session in SESSIONS.values():
+        session.close()
+    SESSIONS.clear()
+
+    if EVENT_LOOP is not None and not EVENT_LOOP.is_closed():
+        for session in ASYNC_SESSIONS.values():
+            if not session.closed:
+                runCoroutine(session.close())
+        EVENT_LOOP.call_soon_threadsafe(EVENT_LOOP.stop)
+        EVENT_LOOP_THREAD.join()
+        EVENT_LOOP.close()
+    ASYNC_SESSIONS.clear()
+    Cassette.closeCassette()
+
+
+atexit.register(closeAll)
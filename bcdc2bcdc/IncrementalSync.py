@@ -0,0 +1,201 @@
+"""
+Incremental retrieval of package data.
+
+Retrieving all the packages from a ckan instance requires a package_show call
+for every package, which can take hours.  This module retains the package data
+that was retrieved in the previous run in a SnapshotStore, along with the
+highest metadata_modified value that was seen (the watermark).  Subsequent runs only
+request the packages that have been modified since the watermark and merge them
+into the retained state.
+
+Package deletions do not show up in the modified packages search.  The
+package_list (names only) is compared with the retained state to drop deleted
+packages, and on a configurable interval (CKAN_INCREMENTAL_FULL_SYNC_HOURS) a
+full retrieval of the package data is made, which replaces the retained state.
+
+The src and dest snapshots share their objects, see SnapshotStore, and both
+are written to at the same time.  The objects that are no longer used are
+removed by pruneSnapshots() once all the package retrievals are complete.
+"""
+
+import json
+import logging
+import os
+import time
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.SnapshotStore as SnapshotStore
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+
+class IncrementalPackageSync:
+    """Retrieves the packages for a ckan instance, using the state saved by the
+    previous run to only request packages that have changed.
+
+    State file structure:
+
+    {
+        "watermark": <highest metadata_modified value seen>,
+        "lastFullSync": <epoch time of the last full retrieval>
+    }
+
+    The package data itself is retained in the packages snapshot for the
+    instance.
+    """
+
+    def __init__(self, ckanWrapper, cacheFiles=None):
+        """
+        :param ckanWrapper: wrapper for the ckan instance to retrieve packages
+            from
+        :type ckanWrapper: CKAN.CKANWrapper
+        :param cacheFiles: used to calculate the path to the state file,
+            defaults to None
+        :type cacheFiles: CacheFiles.CKANCacheFiles, optional
+        """
+        self.ckanWrapper = ckanWrapper
+        self.cacheFiles = cacheFiles
+        if self.cacheFiles is None:
+            self.cacheFiles = CacheFiles.CKANCacheFiles()
+        self.instanceId = SnapshotStore.getInstanceId(ckanWrapper.CKANUrl)
+        self.statePath = self.cacheFiles.getIncrementalStatePath(self.instanceId)
+        self.fullSyncInterval = constants.getIncrementalFullSyncHours() * 3600
+        self.snapshot = SnapshotStore.SnapshotStore(
+            self.instanceId,
+            constants.TRANSFORM_TYPE_PACKAGES,
+            cacheFiles=self.cacheFiles,
+        )
+        self.state = None
+
+    def getPackages(self):
+        """Returns the package data for the ckan instance.  If there is no
+        retained state, or the full sync interval has passed, all the packages
+        are retrieved, otherwise only the packages that have been modified
+        since the last run are retrieved.
+
+        :return: list of package data, same structure as returned by
+            CKANWrapper.getPackagesAndData
+        :rtype: list of dict
+        """
+        self.state = self.readState()
+        fullSync = self.isFullSyncRequired(self.state) or not len(self.snapshot)
+        if fullSync:
+            LOGGER.info(f"full package retrieval for: {self.ckanWrapper.CKANUrl}")
+            self.state = {"watermark": None, "lastFullSync": time.time()}
+            self.snapshot.clear()
+            pkgNames = self.ckanWrapper.getPackageNames()
+        else:
+            LOGGER.info(
+                f"incremental package retrieval for: {self.ckanWrapper.CKANUrl}, "
+                f"watermark: {self.state['watermark']}"
+            )
+            modifiedNames = self.ckanWrapper.getPackageNamesModifiedSince(
+                self.state["watermark"]
+            )
+            LOGGER.info(f"packages modified since last run: {len(modifiedNames)}")
+
+            # package_list is cheap compared with the package_show calls, use it
+            # to drop deleted packages and to pick up any that were missed.  It
+            # also defines the packages a full retrieval would return, so
+            # modified packages that are not listed are skipped.
+            listedNames = set(self.ckanWrapper.getPackageNames())
+            self.removeUnlistedPackages(listedNames)
+            knownNames = set(self.snapshot.getIds())
+            pkgNames = listedNames.intersection(modifiedNames).union(
+                listedNames.difference(knownNames)
+            )
+        if pkgNames:
+            fetcher = self.ckanWrapper.getPackageFetcher(onPackage=self.addPackage)
+            fetcher.getPackages(sorted(pkgNames))
+        self.snapshot.save()
+        self.writeState(self.state)
+        return list(self.snapshot.iterRecords())
+
+    def isFullSyncRequired(self, state):
+        """
+        :param state: the state retained by the previous run
+        :type state: dict
+        :return: indicates whether all the packages should be retrieved
+        :rtype: bool
+        """
+        retVal = True
+        if state and state["watermark"]:
+            elapsed = time.time() - state["lastFullSync"]
+            retVal = elapsed >= self.fullSyncInterval
+            LOGGER.debug(f"seconds since last full sync: {elapsed}")
+        return retVal
+
+    def addPackage(self, pkg):
+        """Adds or replaces a retrieved package in the snapshot, and advances
+        the watermark.  Used as the onPackage callback of the package fetcher
+        so packages are written as they are received.
+
+        :param pkg: a package that was retrieved
+        :type pkg: dict
+        """
+        self.snapshot.putRecord(pkg)
+        modified = pkg.get("metadata_modified")
+        if modified and (
+            self.state["watermark"] is None or modified > self.state["watermark"]
+        ):
+            self.state["watermark"] = modified
+
+    def removeUnlistedPackages(self, listedNames):
+        """removes packages from the snapshot that are no longer returned by
+        package_list, ie they have been deleted, renamed or made private.
+
+        :param listedNames: names of the packages returned by package_list
+        :type listedNames: set
+        """
+        unlistedNames = [
+            pkgName for pkgName in self.snapshot.getIds()
+            if pkgName not in listedNames
+        ]
+        LOGGER.info(f"packages removed since last run: {len(unlistedNames)}")
+        for pkgName in unlistedNames:
+            self.snapshot.removeRecord(pkgName)
+
+    def readState(self):
+        """
+        :return: the state retained by the previous run, or None if there isn't
+            any
+        :rtype: dict
+        """
+        state = None
+        if os.path.exists(self.statePath):
+            with open(self.statePath) as fh:
+                state = json.load(fh)
+        return state
+
+    def writeState(self, state):
+        """writes the state to a temp file then replaces the state file with
+        it, so a failed write does not corrupt the previous state
+
+        :param state: the state to write
+        :type state: dict
+        """
+        tmpPath = f"{self.statePath}.tmp"
+        with open(tmpPath, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmpPath, self.statePath)
+        LOGGER.debug(f"wrote incremental state: {self.statePath}")
+
+
+def pruneSnapshots(cacheFiles=None):
+    """deletes the snapshot objects that are not used by any of the retained
+    package states.  Must be called once all the package retrievals are
+    complete, a retrieval that is still running has objects that are not in a
+    saved manifest yet.
+
+    :param cacheFiles: used to calculate the snapshot directory, defaults to
+        None
+    :type cacheFiles: CacheFiles.CKANCacheFiles, optional
+    :return: the number of objects that were deleted
+    :rtype: int
+    """
+    if cacheFiles is None:
+        cacheFiles = CacheFiles.CKANCacheFiles()
+    return SnapshotStore.pruneObjects(cacheFiles.getSnapshotDir())
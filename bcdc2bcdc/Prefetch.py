@@ -0,0 +1,307 @@
+"""
+Retrieves all the data a run needs up front.
+
+The user, group, organization and package data for the src and dest
+instances, and the scheming definitions do not depend on each other, so
+DataPrefetcher starts all of them at once in a thread pool and hands out a
+future for each one.  Each update step then waits only for the data it needs,
+and the time spent retrieving data is that of the slowest retrieval instead
+of the sum of all of them.
+
+The number of requests in flight to a single host is still bounded by the
+host's throttle, which is shared by all the retrievals, see Throttle.
+
+Each update step only writes records of its own type, but the dest groups
+and organizations embed their users, and the dest packages embed their
+organization and groups.  The retrieval of dest data types that embed other
+types is started once the update steps for those types are complete, see
+DEST_DEPENDENCIES and DataPrefetcher.setStepComplete(), so the deltas are
+calculated against the dest data as it is after the earlier steps.  The dest
+users are retrieved before any of the update steps write to dest.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+import bcdc2bcdc.CKANScheming as CKANScheming
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.DeltaStream as DeltaStream
+import bcdc2bcdc.IncrementalSync as IncrementalSync
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# dest data type: the data types whose update steps have to be complete
+# before the dest data is retrieved, as it embeds records of those types
+DEST_DEPENDENCIES = {
+    constants.TRANSFORM_TYPE_GROUPS: (constants.TRANSFORM_TYPE_USERS,),
+    constants.TRANSFORM_TYPE_ORGS: (constants.TRANSFORM_TYPE_USERS,),
+    constants.TRANSFORM_TYPE_PACKAGES: (
+        constants.TRANSFORM_TYPE_USERS,
+        constants.TRANSFORM_TYPE_GROUPS,
+        constants.TRANSFORM_TYPE_ORGS,
+    ),
+}
+
+
+class DataPrefetcher:
+    """Starts the retrieval of all the data types for both the src and the
+    dest instance.  Usage:
+
+        prefetcher = DataPrefetcher(srcWrapper, destWrapper)
+        prefetcher.start()
+        futures = prefetcher.getFutures(constants.TRANSFORM_TYPE_USERS)
+        srcUsers = futures[constants.DATA_SOURCE.SRC].result()
+        ...
+        prefetcher.setStepComplete(constants.TRANSFORM_TYPE_USERS)
+    """
+
+    def __init__(self, srcCKANWrapper, destCKANWrapper, useCache=False):
+        """
+        :param srcCKANWrapper: wrapper for the src instance
+        :type srcCKANWrapper: CKAN.CKANWrapper
+        :param destCKANWrapper: wrapper for the dest instance
+        :type destCKANWrapper: CKAN.CKANWrapper
+        :param useCache: when True the data is read from the cache files,
+            defaults to False
+        :type useCache: bool, optional
+        """
+        self.wrapperMap = {
+            constants.DATA_SOURCE.SRC: srcCKANWrapper,
+            constants.DATA_SOURCE.DEST: destCKANWrapper,
+        }
+        self.useCache = useCache
+        self.cacheFiles = CacheFiles.CKANCacheFiles()
+        # datatype: {DATA_SOURCE: future}
+        self.futures = {}
+        self.schemingFuture = None
+        self.executor = None
+        # datatype: event that is set once the update step is complete
+        self.stepEvents = {
+            dataType: threading.Event()
+            for dataType in constants.VALID_TRANSFORM_TYPES
+        }
+        self.cancelled = False
+        # packages are compared as they arrive, see DeltaStream
+        self.packageStream = None
+        if constants.isStreamingDelta() and not useCache:
+            self.packageStream = DeltaStream.PackageDeltaStream()
+
+    def start(self):
+        """submits all the retrievals, returns immediately"""
+        dataTypes = constants.VALID_TRANSFORM_TYPES
+        workers = len(dataTypes) * len(constants.DATA_SOURCE) + 1
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        self.schemingFuture = self.executor.submit(refreshScheming)
+        for dataType in dataTypes:
+            self.futures[dataType] = {}
+            for dataOrigin in constants.DATA_SOURCE:
+                LOGGER.debug(f"starting retrieval of {dataOrigin.name} {dataType}")
+                onPackage = None
+                if self.packageStream and dataType == constants.TRANSFORM_TYPE_PACKAGES:
+                    onPackage = self.packageStream.getCallback(dataOrigin)
+                self.futures[dataType][dataOrigin] = self.executor.submit(
+                    self.fetchData,
+                    self.wrapperMap[dataOrigin],
+                    dataType,
+                    dataOrigin,
+                    self.useCache,
+                    self.cacheFiles,
+                    onPackage,
+                )
+        # threads exit once the queued retrievals are complete
+        self.executor.shutdown(wait=False)
+
+    def fetchData(self, ckanWrapper, dataType, dataOrigin, *args):
+        """waits for the update steps the dest data depends on, see
+        DEST_DEPENDENCIES, then retrieves the data, see fetchData()
+        """
+        if dataOrigin == constants.DATA_SOURCE.DEST:
+            for dependency in DEST_DEPENDENCIES.get(dataType, ()):
+                LOGGER.debug(
+                    f"{dataOrigin.name} {dataType} waiting for the {dependency} step"
+                )
+                self.stepEvents[dependency].wait()
+                if self.cancelled:
+                    raise concurrent.futures.CancelledError()
+        return fetchData(ckanWrapper, dataType, dataOrigin, *args)
+
+    def setStepComplete(self, dataType):
+        """called once the update step for a data type is complete, starts the
+        retrieval of the dest data that depends on it
+
+        :param dataType: one of the constants.VALID_TRANSFORM_TYPES
+        :type dataType: str
+        """
+        self.stepEvents[dataType].set()
+
+    def getFutures(self, dataType):
+        """
+        :param dataType: one of the constants.VALID_TRANSFORM_TYPES
+        :type dataType: str
+        :return: the futures for the src and dest data, keyed by
+            constants.DATA_SOURCE
+        :rtype: dict
+        """
+        return self.futures[dataType]
+
+    def getSchemingFuture(self):
+        """
+        :return: future for the CKANScheming.Scheming object
+        :rtype: concurrent.futures.Future
+        """
+        return self.schemingFuture
+
+    def getPackageStream(self):
+        """
+        :return: the stream the packages are sent to as they are received,
+            None unless CKAN_STREAMING_DELTA is enabled
+        :rtype: DeltaStream.PackageDeltaStream
+        """
+        return self.packageStream
+
+    def cancel(self):
+        """cancels any retrievals that have not started yet, used when an
+        update step fails
+        """
+        self.cancelled = True
+        for event in self.stepEvents.values():
+            event.set()
+        for dataFutures in self.futures.values():
+            for future in dataFutures.values():
+                future.cancel()
+
+
+def refreshScheming():
+    """Deletes the scheming cache file and retrieves the scheming definitions.
+
+    :return: the scheming definitions
+    :rtype: CKANScheming.Scheming
+    """
+    cacheFiles = CacheFiles.CKANCacheFiles()
+    schemingCacheFile = cacheFiles.getSchemingCacheFilePath()
+    if os.path.exists(schemingCacheFile):
+        LOGGER.info(f"deleting the scheming cache file: {schemingCacheFile}")
+        os.remove(schemingCacheFile)
+    return CKANScheming.Scheming()
+
+
+def startPackageStream(srcCKANWrapper, destCKANWrapper, cacheFiles=None):
+    """Starts retrieving the src and dest packages, sending them to a
+    DeltaStream.PackageDeltaStream as they are received.  Used when the
+    packages were not prefetched.
+
+    :param srcCKANWrapper: wrapper for the src instance
+    :type srcCKANWrapper: CKAN.CKANWrapper
+    :param destCKANWrapper: wrapper for the dest instance
+    :type destCKANWrapper: CKAN.CKANWrapper
+    :param cacheFiles: the cache file paths, defaults to None
+    :type cacheFiles: CacheFiles.CKANCacheFiles, optional
+    :return: the package stream, and the futures for the src and dest
+        retrievals keyed by constants.DATA_SOURCE
+    :rtype: tuple
+    """
+    packageStream = DeltaStream.PackageDeltaStream()
+    wrapperMap = {
+        constants.DATA_SOURCE.SRC: srcCKANWrapper,
+        constants.DATA_SOURCE.DEST: destCKANWrapper,
+    }
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(wrapperMap))
+    futures = {}
+    for dataOrigin, ckanWrapper in wrapperMap.items():
+        futures[dataOrigin] = executor.submit(
+            fetchData,
+            ckanWrapper,
+            constants.TRANSFORM_TYPE_PACKAGES,
+            dataOrigin,
+            cacheFiles=cacheFiles,
+            onPackage=packageStream.getCallback(dataOrigin),
+        )
+    executor.shutdown(wait=False)
+    return packageStream, futures
+
+
+def fetchData(
+    ckanWrapper, dataType, dataOrigin, useCache=False, cacheFiles=None, onPackage=None
+):
+    """Retrieves the data for a single data type from a single instance.
+    Records that are streamed from the response are collected into a list so
+    that the retrieval is complete when the future is.
+
+    :param ckanWrapper: wrapper for the instance to read from
+    :type ckanWrapper: CKAN.CKANWrapper
+    :param dataType: one of the constants.VALID_TRANSFORM_TYPES
+    :type dataType: str
+    :param dataOrigin: whether the wrapper is for the src or dest instance
+    :type dataOrigin: constants.DATA_SOURCE
+    :param useCache: when True the data is read from the cache files,
+        defaults to False
+    :type useCache: bool, optional
+    :param cacheFiles: the cache file paths, defaults to None
+    :type cacheFiles: CacheFiles.CKANCacheFiles, optional
+    :param onPackage: called with each package as it is received, only used
+        for packages, defaults to None
+    :type onPackage: callable, optional
+    :return: the records for the data type
+    :rtype: list
+    """
+    if cacheFiles is None:
+        cacheFiles = CacheFiles.CKANCacheFiles()
+    isSrc = dataOrigin == constants.DATA_SOURCE.SRC
+    LOGGER.info(f"retrieving {dataOrigin.name} {dataType}...")
+
+    if dataType == constants.TRANSFORM_TYPE_USERS:
+        cacheFileName = None
+        if useCache:
+            cacheFileName = (
+                cacheFiles.getSrcUserJsonPath()
+                if isSrc
+                else cacheFiles.getDestUserJsonPath()
+            )
+        data = ckanWrapper.getUsers(cacheFileName=cacheFileName, includeData=True)
+    elif dataType == constants.TRANSFORM_TYPE_GROUPS:
+        if useCache:
+            cacheFileName = (
+                cacheFiles.getSrcGroupJsonPath()
+                if isSrc
+                else cacheFiles.getDestGroupJsonPath()
+            )
+            data = ckanWrapper.getGroups(cacheFileName=cacheFileName, includeData=True)
+        else:
+            data = list(ckanWrapper.iterGroups(includeData=True))
+    elif dataType == constants.TRANSFORM_TYPE_ORGS:
+        if useCache:
+            cacheFileName = (
+                cacheFiles.getSrcOrganizationsJsonPath()
+                if isSrc
+                else cacheFiles.getDestOrganizationsJsonPath()
+            )
+            data = ckanWrapper.getOrganizations(
+                cacheFileName=cacheFileName, includeData=True
+            )
+        else:
+            data = list(ckanWrapper.iterOrganizations(includeData=True))
+    elif dataType == constants.TRANSFORM_TYPE_PACKAGES:
+        if useCache:
+            cacheFileName = (
+                cacheFiles.getSrcPackagesJsonPath()
+                if isSrc
+                else cacheFiles.getDestPackagesJsonPath()
+            )
+            data = ckanWrapper.getPackagesAndData(cacheFileName=cacheFileName)
+        elif constants.isIncrementalSync():
+            data = IncrementalSync.IncrementalPackageSync(
+                ckanWrapper, cacheFiles
+            ).getPackages()
+        else:
+            data = ckanWrapper.getPackagesAndData(onPackage=onPackage)
+    else:
+        msg = f"unable to retrieve the data type: {dataType}"
+        raise ValueError(msg)
+    LOGGER.info(f"retrieved {dataOrigin.name} {dataType}")
+    return data
@@ -0,0 +1,206 @@
+"""
+Retry policy used by every request made to a ckan instance.
+
+The policy is applied by the http adapter that HTTPClients mounts on the
+shared requests sessions, and by the asyncio package fetcher, so individual
+api methods do not implement their own retries.
+
+* delays grow exponentially with full jitter, capped at maxDelay
+* a Retry-After header on the response overrides the calculated delay
+* every request gets a timeout if the caller did not supply one
+* an optional deadline for the whole run (CKAN_RUN_DEADLINE_MINUTES), once it
+  has passed no further retries are attempted
+* only connection errors, timeouts and the status codes in RETRYABLE_STATUS
+  are retried.  Create actions are not idempotent, so they are only retried
+  when the connection could not be established, ie the request was never
+  sent.
+"""
+
+import email.utils
+import logging
+import random
+import time
+import urllib.parse
+
+import bcdc2bcdc.constants as constants
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# start time used to calculate the run deadline
+RUN_START = time.monotonic()
+
+RETRYABLE_STATUS = frozenset([408, 429, 500, 502, 503, 504])
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+NON_IDEMPOTENT_ACTION_SUFFIXES = ("_create",)
+
+
+class RetryPolicy:
+    """Calculates whether a request should be retried, and how long to wait
+    before retrying it.
+    """
+
+    def __init__(
+        self, maxRetries=None, baseDelay=1, maxDelay=60, requestTimeout=None,
+        runDeadline=None
+    ):
+        """
+        :param maxRetries: the maximum number of retries for a single request,
+            defaults to the env var CKAN_RETRY_MAX
+        :type maxRetries: int, optional
+        :param baseDelay: seconds to wait before the first retry
+        :type baseDelay: float, optional
+        :param maxDelay: maximum seconds to wait between retries
+        :type maxDelay: float, optional
+        :param requestTimeout: seconds to wait for a response when the request
+            does not define a timeout, defaults to the env var
+            CKAN_REQUEST_TIMEOUT
+        :type requestTimeout: float, optional
+        :param runDeadline: seconds after RUN_START after which no more
+            retries are made, defaults to the env var CKAN_RUN_DEADLINE_MINUTES
+        :type runDeadline: float, optional
+        """
+        self.maxRetries = maxRetries
+        if self.maxRetries is None:
+            self.maxRetries = constants.getRetryMax()
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.requestTimeout = requestTimeout
+        if self.requestTimeout is None:
+            self.requestTimeout = constants.getRequestTimeout()
+        self.runDeadline = runDeadline
+        if self.runDeadline is None:
+            deadlineMinutes = constants.getRunDeadlineMinutes()
+            if deadlineMinutes:
+                self.runDeadline = deadlineMinutes * 60
+
+    def getDelay(self, attempt, retryAfter=None):
+        """
+        :param attempt: the number of the retry that is about to be made,
+            starting at 0
+        :type attempt: int
+        :param retryAfter: value of the Retry-After header, defaults to None
+        :type retryAfter: str, optional
+        :return: seconds to wait before making the retry
+        :rtype: float
+        """
+        delay = parseRetryAfter(retryAfter)
+        if delay is None:
+            cap = min(self.maxDelay, self.baseDelay * (2 ** attempt))
+            delay = random.uniform(0, cap)
+        return min(delay, self.maxDelay)
+
+    def getRemainingTime(self):
+        """
+        :return: seconds left before the run deadline, None if there isn't a
+            deadline
+        :rtype: float
+        """
+        remaining = None
+        if self.runDeadline is not None:
+            remaining = self.runDeadline - (time.monotonic() - RUN_START)
+        return remaining
+
+    def canRetry(self, attempt, delay=0):
+        """
+        :param attempt: the number of retries that have already been made
+        :type attempt: int
+        :param delay: the seconds that will be waited before the retry
+        :type delay: float
+        :return: whether another retry can be made
+        :rtype: bool
+        """
+        retVal = attempt < self.maxRetries
+        remaining = self.getRemainingTime()
+        if retVal and remaining is not None and remaining < delay:
+            LOGGER.warning("run deadline reached, no more retries will be made")
+            retVal = False
+        return retVal
+
+    def isRetryableStatus(self, statusCode, method="GET", url=None):
+        """
+        :param statusCode: status code of the response
+        :type statusCode: int
+        :param method: the http method used for the request
+        :type method: str
+        :param url: the url for the request, used to identify the ckan action
+        :type url: str
+        :return: whether a response with this status should be retried
+        :rtype: bool
+        """
+        return statusCode in RETRYABLE_STATUS and isIdempotent(method, url)
+
+    def sleep(self, delay):
+        """blocking wait, used by the threaded clients
+
+        :param delay: seconds to wait
+        :type delay: float
+        """
+        time.sleep(delay)
+
+
+def isIdempotent(method, url=None):
+    """Identifies requests that can safely be sent more than once.  All ckan
+    actions are called with GET or POST, POST is considered idempotent for all
+    actions except the create actions.
+
+    :param method: the http method
+    :type method: str
+    :param url: the url for the request
+    :type url: str
+    :return: whether the request can be repeated
+    :rtype: bool
+    """
+    retVal = method.upper() in IDEMPOTENT_METHODS
+    if not retVal and url:
+        retVal = not getActionName(url).endswith(NON_IDEMPOTENT_ACTION_SUFFIXES)
+    return retVal
+
+
+def getActionName(url):
+    """
+    :param url: the url for the request, example
+        https://ckan/api/3/action/package_update
+    :type url: str
+    :return: the last part of the path in the url, ie the ckan action name
+    :rtype: str
+    """
+    return urllib.parse.urlparse(url).path.rstrip("/").split("/")[-1]
+
+
+def parseRetryAfter(retryAfter):
+    """
+    :param retryAfter: value of a Retry-After header, either seconds or an http
+        date
+    :type retryAfter: str
+    :return: the number of seconds to wait, None if the value is missing or
+        can't be parsed
+    :rtype: float
+    """
+    delay = None
+    if retryAfter:
+        retryAfter = retryAfter.strip()
+        if retryAfter.isdigit():
+            delay = float(retryAfter)
+        else:
+            try:
+                retryDate = email.utils.parsedate_to_datetime(retryAfter)
+                delay = max(0, retryDate.timestamp() - time.time())
+            except (TypeError, ValueError):
+                LOGGER.warning(f"unable to parse Retry-After: {retryAfter}")
+    return delay
+
+
+DEFAULT_POLICY = None
+
+
+def getDefaultPolicy():
+    """
+    :return: the policy shared by all the http clients
+    :rtype: RetryPolicy
+    """
+    global DEFAULT_POLICY  # pylint: disable=global-statement
+    if DEFAULT_POLICY is None:
+        DEFAULT_POLICY = RetryPolicy()
+    return DEFAULT_POLICY
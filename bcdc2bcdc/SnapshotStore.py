@@ -0,0 +1,267 @@
+"""
+On disk snapshot of the records retrieved from a ckan instance.
+
+Each record is written to its own gzipped json file, named by the sha256 hash
+of the record's content, so identical records are only ever stored once.  A
+manifest for each ckan instance / data type combination maps the unique id of
+the record (usually 'name') to the hash of its content.
+
+Records can be written as they are received, and any single record can be read
+back without loading the rest of the snapshot.
+
+The objects are shared by all the stores in the directory.  An object that has
+been put but is not in a saved manifest yet is not protected from pruning, so
+pruneObjects() must not be called while another store in the same directory
+is being written to.
+
+Directory structure:
+
+<temp dir>/snapshots/
+    objects/<first 2 chars of hash>/<hash>.json.gz
+    <instance id>_<data type>.json   <- manifest
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import urllib.parse
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+
+def getInstanceId(url):
+    """creates a string from a ckan url that can be used in a file name
+
+    :param url: the url for the ckan instance
+    :type url: str
+    :return: file name safe version of the url
+    :rtype: str
+    """
+    parsedUrl = urllib.parse.urlparse(url)
+    instanceId = f"{parsedUrl.netloc}{parsedUrl.path}".strip("/")
+    return re.sub(r"[^A-Za-z0-9]+", "_", instanceId)
+
+
+def getContentHash(record):
+    """calculates the hash used to identify the content of a record
+
+    :param record: the record to hash
+    :type record: dict
+    :return: sha256 hex digest of the canonical json for the record
+    :rtype: str
+    """
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf8")).hexdigest()
+
+
+def writeAtomic(filePath, data, opener=open):
+    """writes data to a temp file and then moves it into place, so readers
+    never see a partially written file
+
+    :param filePath: the file to write
+    :type filePath: str
+    :param data: the data to write
+    :type data: bytes
+    :param opener: function used to open the file, example gzip.open
+    :type opener: callable
+    """
+    # the temp file is unique to the call, stores in different threads can
+    # write the same object at the same time.  It starts with the file name,
+    # so pruneObjects() treats it the same as the object it will become, it
+    # is only kept if the object is referenced by a saved manifest
+    fileDescriptor, tmpPath = tempfile.mkstemp(
+        dir=os.path.dirname(filePath),
+        prefix=f"{os.path.basename(filePath)}.",
+        suffix=".tmp",
+    )
+    os.close(fileDescriptor)
+    try:
+        with opener(tmpPath, "wb") as fh:
+            fh.write(data)
+        os.replace(tmpPath, filePath)
+    except BaseException:
+        os.remove(tmpPath)
+        raise
+
+
+def pruneObjects(snapshotDir, referenced=()):
+    """deletes any objects that are not referenced by any of the manifests
+    in the snapshot directory.  The objects are shared by all the stores in
+    the directory, and the objects a store has put are not referenced until
+    its manifest is saved.  Must not be called while another store in the
+    directory is being written to, example during the package retrievals, see
+    IncrementalSync.pruneSnapshots().
+
+    :param snapshotDir: the snapshot directory, see
+        CacheFiles.CKANCacheFiles.getSnapshotDir()
+    :type snapshotDir: str
+    :param referenced: hashes of objects to keep that are not in a saved
+        manifest, defaults to ()
+    :type referenced: iterable of str, optional
+    :return: the number of objects that were deleted
+    :rtype: int
+    """
+    referenced = set(referenced)
+    for fileName in os.listdir(snapshotDir):
+        if fileName.endswith(".json"):
+            with open(os.path.join(snapshotDir, fileName)) as fh:
+                referenced.update(json.load(fh).values())
+
+    deleted = 0
+    objectsDir = os.path.join(snapshotDir, "objects")
+    if os.path.exists(objectsDir):
+        for dirPath, _, fileNames in os.walk(objectsDir):
+            for fileName in fileNames:
+                if fileName.split(".")[0] not in referenced:
+                    os.remove(os.path.join(dirPath, fileName))
+                    deleted += 1
+    LOGGER.debug(f"pruned {deleted} unreferenced objects")
+    return deleted
+
+
+class SnapshotStore:
+    """Stores the records for a single ckan instance and data type"""
+
+    def __init__(self, instanceId, dataType, uniqueIdField="name", cacheFiles=None):
+        """
+        :param instanceId: identifies the ckan instance, see getInstanceId()
+        :type instanceId: str
+        :param dataType: the type of record, example: packages
+        :type dataType: str
+        :param uniqueIdField: the field in the records that uniquely identifies
+            them, defaults to "name"
+        :type uniqueIdField: str, optional
+        :param cacheFiles: used to calculate the snapshot directory, defaults
+            to None
+        :type cacheFiles: CacheFiles.CKANCacheFiles, optional
+        """
+        if cacheFiles is None:
+            cacheFiles = CacheFiles.CKANCacheFiles()
+        self.dir = cacheFiles.getSnapshotDir()
+        self.objectsDir = os.path.join(self.dir, "objects")
+        self.uniqueIdField = uniqueIdField
+        self.manifestPath = os.path.join(self.dir, f"{instanceId}_{dataType}.json")
+        self.manifest = self.readManifest()
+
+    def readManifest(self):
+        """
+        :return: the manifest, unique id to content hash
+        :rtype: dict
+        """
+        manifest = {}
+        if os.path.exists(self.manifestPath):
+            with open(self.manifestPath) as fh:
+                manifest = json.load(fh)
+        return manifest
+
+    def save(self):
+        """writes the manifest to disk, records are written as they are put
+        but they are not part of the snapshot until the manifest is saved.
+        """
+        data = json.dumps(self.manifest).encode("utf8")
+        writeAtomic(self.manifestPath, data)
+        LOGGER.debug(f"saved manifest: {self.manifestPath}, records: {len(self.manifest)}")
+
+    def getObjectPath(self, contentHash):
+        """
+        :param contentHash: the hash of the record
+        :type contentHash: str
+        :return: path to the file that contains the record
+        :rtype: str
+        """
+        return os.path.join(self.objectsDir, contentHash[:2], f"{contentHash}.json.gz")
+
+    def putRecord(self, record):
+        """adds or replaces a record in the snapshot.  The record is written to
+        disk unless a record with the same content is already stored.
+
+        :param record: the record to store
+        :type record: dict
+        :return: the hash of the record
+        :rtype: str
+        """
+        contentHash = getContentHash(record)
+        objPath = self.getObjectPath(contentHash)
+        if not os.path.exists(objPath):
+            os.makedirs(os.path.dirname(objPath), exist_ok=True)
+            writeAtomic(objPath, json.dumps(record).encode("utf8"), gzip.open)
+        self.manifest[record[self.uniqueIdField]] = contentHash
+        return contentHash
+
+    def removeRecord(self, uniqueId):
+        """removes a record from the snapshot, the object file is left in place
+        as other manifests may refer to it, see pruneObjects()
+
+        :param uniqueId: the unique id of the record
+        :type uniqueId: str
+        """
+        self.manifest.pop(uniqueId, None)
+
+    def clear(self):
+        """removes all the records from the snapshot"""
+        self.manifest = {}
+
+    def getHash(self, uniqueId):
+        """
+        :param uniqueId: the unique id of the record
+        :type uniqueId: str
+        :return: the content hash for the record or None if its not in the
+            snapshot
+        :rtype: str
+        """
+        return self.manifest.get(uniqueId)
+
+    def getRecord(self, uniqueId):
+        """reads a single record from the snapshot
+
+        :param uniqueId: the unique id of the record, example a package name
+        :type uniqueId: str
+        :return: the record, or None if it is not in the snapshot
+        :rtype: dict
+        """
+        record = None
+        contentHash = self.manifest.get(uniqueId)
+        if contentHash is not None:
+            with gzip.open(self.getObjectPath(contentHash), "rb") as fh:
+                record = json.load(fh)
+        return record
+
+    def getIds(self):
+        """
+        :return: the unique ids of all the records in the snapshot
+        :rtype: list of str
+        """
+        return list(self.manifest.keys())
+
+    def iterRecords(self):
+        """reads the records in the snapshot one at a time
+
+        :yield: the records in the snapshot
+        :rtype: dict
+        """
+        for uniqueId in self.getIds():
+            yield self.getRecord(uniqueId)
+
+    def pruneObjects(self):
+        """deletes any objects that are not referenced by this store or by any
+        of the manifests in the snapshot directory.  The unsaved objects of
+        other stores in the directory are deleted too, see pruneObjects()
+
+        :return: the number of objects that were deleted
+        :rtype: int
+        """
+        return pruneObjects(self.dir, self.manifest.values())
+
+    def __len__(self):
+        return len(self.manifest)
+
+    def __contains__(self, uniqueId):
+        return uniqueId in self.manifest
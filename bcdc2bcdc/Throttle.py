@@ -0,0 +1,383 @@
+"""
+Adaptive concurrency control for the requests made to a ckan instance.
+
+Each host gets a HostThrottle made up of:
+
+* AdaptiveLimiter: limits the number of requests in flight.  The limit is
+  raised additively while requests succeed within the latency target and is
+  cut multiplicatively when a request times out, or returns a 429 or 5xx
+  (AIMD).
+* CircuitBreaker: after a run of consecutive failures requests stop being
+  sent to the host for a cool down period, then a single trial request is
+  allowed through to test whether the host has recovered.
+* TokenBucket: limits the rate requests are sent at, with a separate bucket
+  for reads and for writes.  Writes trigger solr indexing on the destination,
+  so they are limited independently of the reads, see CKAN_WRITE_RATE.
+
+Both threads and coroutines can wait on the same throttle, so the threaded
+and the asyncio clients share the limits for a host.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.Retry as Retry
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=logging-format-interpolation
+
+# ckan actions that modify data on the host
+WRITE_ACTION_SUFFIXES = ("_create", "_update", "_patch", "_delete", "_purge")
+WRITE_ACTIONS = frozenset(["user_generate_apikey"])
+
+
+class AdaptiveLimiter:
+    """AIMD limit on the number of requests in flight"""
+
+    def __init__(self, minLimit, maxLimit, initialLimit, latencyTarget):
+        """
+        :param minLimit: the lowest the limit will be reduced to
+        :type minLimit: int
+        :param maxLimit: the highest the limit will be raised to
+        :type maxLimit: int
+        :param initialLimit: the starting limit
+        :type initialLimit: int
+        :param latencyTarget: responses slower than this, in seconds, are
+            treated as a sign the host is congested
+        :type latencyTarget: float
+        """
+        self.minLimit = minLimit
+        self.maxLimit = maxLimit
+        self.limit = float(max(minLimit, min(initialLimit, maxLimit)))
+        self.latencyTarget = latencyTarget
+        self.backoffRatio = 0.5
+
+        self.inFlight = 0
+        self.lastDecrease = 0
+        self.condition = threading.Condition()
+        # (loop, future) for coroutines waiting on a slot
+        self.asyncWaiters = []
+
+    def tryAcquire(self):
+        """
+        :return: whether a slot was acquired
+        :rtype: bool
+        """
+        with self.condition:
+            retVal = self.inFlight < int(self.limit)
+            if retVal:
+                self.inFlight += 1
+        return retVal
+
+    def acquire(self):
+        """waits until there is a slot available"""
+        with self.condition:
+            while self.inFlight >= int(self.limit):
+                self.condition.wait()
+            self.inFlight += 1
+
+    async def acquireAsync(self):
+        """waits until there is a slot available, without blocking the event
+        loop
+        """
+        loop = asyncio.get_event_loop()
+        while not self.tryAcquire():
+            future = loop.create_future()
+            with self.condition:
+                self.asyncWaiters.append((loop, future))
+            # re-check in case a slot came free before the waiter was added
+            if self.tryAcquire():
+                self.wakeWaiters()
+                break
+            await future
+
+    def release(self, success, latency):
+        """frees the slot and adjusts the limit based on the outcome
+
+        :param success: False if the request timed out, or got a 429 or 5xx
+        :type success: bool
+        :param latency: seconds the request took
+        :type latency: float
+        """
+        with self.condition:
+            self.inFlight -= 1
+            if success and latency <= self.latencyTarget:
+                # additive increase, about +1 per limit's worth of requests
+                self.limit = min(self.maxLimit, self.limit + 1.0 / self.limit)
+            else:
+                # only cut once per congestion event, requests that were in
+                # flight when the limit was cut don't cut it again
+                now = time.monotonic()
+                if now - self.lastDecrease > latency:
+                    self.limit = max(self.minLimit, self.limit * self.backoffRatio)
+                    self.lastDecrease = now
+                    LOGGER.info(
+                        f"backing off, concurrency limit is now: {int(self.limit)}"
+                    )
+            self.condition.notify_all()
+        self.wakeWaiters()
+
+    def setLimit(self, limit):
+        """
+        :param limit: the new concurrency limit
+        :type limit: float
+        """
+        with self.condition:
+            self.limit = float(max(self.minLimit, min(limit, self.maxLimit)))
+            self.condition.notify_all()
+        self.wakeWaiters()
+
+    def wakeWaiters(self):
+        """wakes all the waiting coroutines, they re-check for a free slot"""
+        with self.condition:
+            waiters = self.asyncWaiters
+            self.asyncWaiters = []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(setFutureDone, future)
+
+
+def setFutureDone(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CircuitBreaker:
+    """Stops requests to a host after failureThreshold consecutive failures.
+    Once resetTimeout seconds have passed a single trial request is allowed,
+    if it succeeds the breaker closes, otherwise it opens again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failureThreshold, resetTimeout):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedAt = 0
+        self.trialInFlight = False
+        self.lock = threading.Lock()
+
+    def getWaitTime(self):
+        """Determines if a request can be sent, see checkRequest()
+
+        :return: seconds to wait before checking again, 0 if the request can
+            be sent
+        :rtype: float
+        """
+        return self.checkRequest()[0]
+
+    def checkRequest(self):
+        """Determines if a request can be sent.  When the cool down has
+        passed, the first caller is given the trial request.  A caller that
+        is given the trial and doesn't send the request has to call
+        cancelTrial(), otherwise no other request is ever sent.
+
+        :return: seconds to wait before checking again, 0 if the request can
+            be sent, and whether the caller was given the trial request
+        :rtype: tuple(float, bool)
+        """
+        with self.lock:
+            waitTime = 0
+            isTrial = False
+            if self.state == self.OPEN:
+                waitTime = self.openedAt + self.resetTimeout - time.monotonic()
+                if waitTime <= 0:
+                    LOGGER.info("circuit half open, sending a trial request")
+                    self.state = self.HALF_OPEN
+                    self.trialInFlight = True
+                    isTrial = True
+                    waitTime = 0
+            elif self.state == self.HALF_OPEN and self.trialInFlight:
+                waitTime = min(1, self.resetTimeout)
+            elif self.state == self.HALF_OPEN:
+                self.trialInFlight = True
+                isTrial = True
+        return waitTime, isTrial
+
+    def cancelTrial(self):
+        """called when the trial request is not sent, for example when the
+        caller is cancelled while it waits for the rate limit, so the next
+        caller is given the trial
+        """
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.trialInFlight = False
+
+    def record(self, success):
+        """
+        :param success: the outcome of a request
+        :type success: bool
+        """
+        with self.lock:
+            self.trialInFlight = False
+            if success:
+                if self.state != self.CLOSED:
+                    LOGGER.info("circuit closed")
+                self.state = self.CLOSED
+                self.failures = 0
+            else:
+                self.failures += 1
+                if self.state == self.HALF_OPEN or (
+                    self.failures >= self.failureThreshold
+                ):
+                    if self.state != self.OPEN:
+                        LOGGER.warning(
+                            f"circuit opened after {self.failures} failures, "
+                            f"pausing requests for {self.resetTimeout}s"
+                        )
+                    self.state = self.OPEN
+                    self.openedAt = time.monotonic()
+
+
+class TokenBucket:
+    """Limits requests to rate per second, allowing bursts of up to burst
+    requests.  Callers reserve a token and are told how long to wait for it,
+    so waiting callers are served in the order they arrived.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: tokens added per second, 0 or less means unlimited
+        :type rate: float
+        :param burst: the maximum number of tokens the bucket holds
+        :type burst: int
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.lastRefill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """takes a token from the bucket, if the bucket is empty the token is
+        borrowed from the future.
+
+        :return: seconds to wait before the token can be used
+        :rtype: float
+        """
+        waitTime = 0
+        if self.rate > 0:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.lastRefill) * self.rate
+                )
+                self.lastRefill = now
+                self.tokens -= 1
+                if self.tokens < 0:
+                    waitTime = -self.tokens / self.rate
+        return waitTime
+
+    def acquire(self):
+        """waits until a token is available"""
+        waitTime = self.reserve()
+        if waitTime:
+            time.sleep(waitTime)
+
+    async def acquireAsync(self):
+        """waits until a token is available, without blocking the event loop"""
+        waitTime = self.reserve()
+        if waitTime:
+            await asyncio.sleep(waitTime)
+
+
+class HostThrottle:
+    """The rate limits, limiter and circuit breaker for a single host.  Usage:
+
+        throttle.acquire(isWrite)
+        startTime = time.monotonic()
+        <make the request>
+        throttle.release(success, time.monotonic() - startTime)
+    """
+
+    def __init__(self, hostKey):
+        self.hostKey = hostKey
+        self.limiter = AdaptiveLimiter(
+            minLimit=constants.getFetchConcurrencyMin(),
+            maxLimit=constants.getFetchConcurrency(),
+            initialLimit=constants.DEFAULT_INITIAL_CONCURRENCY,
+            latencyTarget=constants.getLatencyTarget(),
+        )
+        self.breaker = CircuitBreaker(
+            failureThreshold=constants.CIRCUIT_FAILURE_THRESHOLD,
+            resetTimeout=constants.CIRCUIT_RESET_SECONDS,
+        )
+        self.readBucket = TokenBucket(
+            rate=constants.getReadRate(), burst=constants.getReadBurst()
+        )
+        self.writeBucket = TokenBucket(
+            rate=constants.getWriteRate(), burst=constants.getWriteBurst()
+        )
+
+    def getBucket(self, isWrite):
+        """
+        :param isWrite: whether the request modifies data on the host
+        :type isWrite: bool
+        :return: the rate limit that applies to the request
+        :rtype: TokenBucket
+        """
+        return self.writeBucket if isWrite else self.readBucket
+
+    def acquire(self, isWrite=False):
+        waitTime, isTrial = self.breaker.checkRequest()
+        while waitTime:
+            time.sleep(waitTime)
+            waitTime, isTrial = self.breaker.checkRequest()
+        try:
+            self.getBucket(isWrite).acquire()
+            self.limiter.acquire()
+        except BaseException:
+            if isTrial:
+                self.breaker.cancelTrial()
+            raise
+
+    async def acquireAsync(self, isWrite=False):
+        waitTime, isTrial = self.breaker.checkRequest()
+        while waitTime:
+            await asyncio.sleep(waitTime)
+            waitTime, isTrial = self.breaker.checkRequest()
+        try:
+            await self.getBucket(isWrite).acquireAsync()
+            await self.limiter.acquireAsync()
+        except BaseException:
+            # includes asyncio.CancelledError, example the run deadline
+            if isTrial:
+                self.breaker.cancelTrial()
+            raise
+
+    def release(self, success, latency):
+        self.breaker.record(success)
+        self.limiter.release(success, latency)
+
+
+def isSuccessStatus(statusCode):
+    """
+    :param statusCode: the status code of a response
+    :type statusCode: int
+    :return: False for the status codes that indicate the host is overloaded
+    :rtype: bool
+    """
+    return statusCode < 500 and statusCode != 429
+
+
+def isWriteRequest(method, url):
+    """
+    :param method: the http method
+    :type method: str
+    :param url: the url for the request
+    :type url: str
+    :return: whether the request calls a ckan action that modifies data
+    :rtype: bool
+    """
+    retVal = False
+    if method.upper() == "POST":
+        action = Retry.getActionName(url)
+        retVal = action in WRITE_ACTIONS or action.endswith(WRITE_ACTION_SUFFIXES)
+    return retVal
@@ -34,8 +34,104 @@ REQUIRED_ENV_VARS = [CKAN_APIKEY_DEST, CKAN_URL_DEST, CKAN_APIKEY_SRC,
 # debug why change control is getting triggered.
 DUMP_DEBUG_DATA = "DUMP_DEBUG_DATA"
 
+# package fetch engine used by CKANWrapper.getPackagesAndData, valid values are
+# described in the FETCH_ENGINES enumeration.  Defaults to THREADS
+CKAN_FETCH_ENGINE = "CKAN_FETCH_ENGINE"
+# maximum number of requests that will be in flight to a single host at any
+# one time.  The actual number is adjusted between the min and max depending
+# on how the host is responding, see Throttle
+CKAN_FETCH_CONCURRENCY = "CKAN_FETCH_CONCURRENCY"
+CKAN_FETCH_CONCURRENCY_MIN = "CKAN_FETCH_CONCURRENCY_MIN"
+# responses that take longer than this number of seconds are treated as a sign
+# that the host is overloaded, and the concurrency is reduced
+CKAN_LATENCY_TARGET = "CKAN_LATENCY_TARGET"
+
+# when set to 'TRUE' packages are synchronized incrementally, only packages
+# with a metadata_modified greater than the last run are retrieved and merged
+# into the package state saved by the previous run.
+CKAN_INCREMENTAL_SYNC = "CKAN_INCREMENTAL_SYNC"
+# number of hours between full retrievals of the package data when running in
+# incremental mode, full retrievals are required to detect deleted packages
+CKAN_INCREMENTAL_FULL_SYNC_HOURS = "CKAN_INCREMENTAL_FULL_SYNC_HOURS"
+# when set to 'TRUE' package_show is only called for packages whose
+# metadata_modified differs from the copy retained in the snapshot store
+CKAN_CONDITIONAL_FETCH = "CKAN_CONDITIONAL_FETCH"
+# when set to 'TRUE' packages are compared as they are retrieved, instead of
+# after all the packages have been retrieved, see DeltaStream
+CKAN_STREAMING_DELTA = "CKAN_STREAMING_DELTA"
+# when set to 'TRUE' packages are written to a checkpoint as they are
+# retrieved, a retrieval that fails part way through is resumed by the next
+# run, see FetchCheckpoint
+CKAN_FETCH_CHECKPOINT = "CKAN_FETCH_CHECKPOINT"
+# maximum number of times a failed request is retried
+CKAN_RETRY_MAX = "CKAN_RETRY_MAX"
+# seconds to wait for a response from ckan before the request times out
+CKAN_REQUEST_TIMEOUT = "CKAN_REQUEST_TIMEOUT"
+# minutes after the start of the run after which failed requests are no
+# longer retried.  Not set, or 0 means there is no deadline
+CKAN_RUN_DEADLINE_MINUTES = "CKAN_RUN_DEADLINE_MINUTES"
+# requests per second allowed to a single host, and the number of requests
+# that can be sent in a burst above that rate.  Reads and writes (the create,
+# update, patch, delete and purge actions) have separate budgets.  A rate of 0
+# means the requests are not rate limited.
+CKAN_READ_RATE = "CKAN_READ_RATE"
+CKAN_READ_BURST = "CKAN_READ_BURST"
+CKAN_WRITE_RATE = "CKAN_WRITE_RATE"
+CKAN_WRITE_BURST = "CKAN_WRITE_BURST"
+# when set to RECORD every api request and response is written to a
+# compressed cassette file, when set to REPLAY the responses are served from
+# the cassette instead of the api, see Cassette.  Valid values are described
+# in the CASSETTE_MODES enumeration.  Not set means the api is used directly.
+CKAN_CASSETTE_MODE = "CKAN_CASSETTE_MODE"
+# path to the cassette file, defaults to DEFAULT_CASSETTE_FILE in the data dir
+CKAN_CASSETTE_PATH = "CKAN_CASSETTE_PATH"
+# when replaying, RECORDED delays each response by the time it took when it
+# was recorded, ZERO returns responses immediately.  Defaults to ZERO
+CKAN_CASSETTE_LATENCY = "CKAN_CASSETTE_LATENCY"
+# comma separated list of the resource properties used to match the resources
+# of a package in the src and dest instances when they are compared, see
+# Diff.KeyedDiff.  Defaults to DEFAULT_RESOURCE_DIFF_KEY
+CKAN_RESOURCE_DIFF_KEY = "CKAN_RESOURCE_DIFF_KEY"
+
 # -----------------END ENV VAR DEFS -----------------------------
 
+# The different engines that can be used to retrieve package data
+class FETCH_ENGINES(enum.Enum):
+    THREADS = 1
+    ASYNCIO = 2
+
+DEFAULT_FETCH_ENGINE = FETCH_ENGINES.THREADS
+
+class CASSETTE_MODES(enum.Enum):
+    RECORD = 1
+    REPLAY = 2
+
+class CASSETTE_LATENCIES(enum.Enum):
+    ZERO = 1
+    RECORDED = 2
+
+DEFAULT_CASSETTE_LATENCY = CASSETTE_LATENCIES.ZERO
+DEFAULT_CASSETTE_FILE = "cassette.jsonl.gz"
+DEFAULT_FETCH_CONCURRENCY = 64
+DEFAULT_FETCH_CONCURRENCY_MIN = 1
+DEFAULT_INITIAL_CONCURRENCY = 8
+DEFAULT_LATENCY_TARGET = 10
+# consecutive failures before requests to a host are paused, and the number of
+# seconds they are paused for
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+DEFAULT_INCREMENTAL_FULL_SYNC_HOURS = 24
+DEFAULT_RETRY_MAX = 5
+DEFAULT_REQUEST_TIMEOUT = 120
+# checkpoints older than this are discarded instead of resumed
+FETCH_CHECKPOINT_MAX_AGE_HOURS = 12
+DEFAULT_READ_RATE = 0
+DEFAULT_READ_BURST = 10
+DEFAULT_WRITE_RATE = 5
+DEFAULT_WRITE_BURST = 5
+# the resource id is autogenerated, so it is different in each instance
+DEFAULT_RESOURCE_DIFF_KEY = "name"
+
 # name and expected location for the transformation configuration file.
 TRANSFORM_CONFIG_FILE_NAME = "transformationConfig_NewDataModel.json"
 TRANSFORM_CONFIG_DIR = "bcdc2bcdc_config"
@@ -66,6 +162,13 @@ class UPDATE_TYPES(enum.Enum):
     UPDATE = 2
     COMPARE = 3
 
+# The types of changes to the elements of a list, see Diff.KeyedDiff.  ADDED
+# elements are only in the second list, REMOVED elements only in the first
+class CHANGE_TYPES(enum.Enum):
+    ADDED = 1
+    REMOVED = 2
+    CHANGED = 3
+
 # other misc property references
 # property's of field_mapping type
 FIELD_MAPPING_AUTOGEN_FIELD = 'auto_populated_field'
@@ -120,6 +223,11 @@ CACHE_DEST_GROUPS_FILE = 'dest_groups.json'
 CACHE_DEST_PKGS_FILE = 'dest_pkgs.json'
 CACHE_SRC_PKGS_FILE = 'src_pkgs.json'
 CACHE_SCHEMING_FILE = 'scheming.json'
+# state retained between incremental package syncs, formatted with a
+# string that identifies the ckan instance
+CACHE_INCREMENTAL_STATE_FILE = 'incremental_pkgs_{}.json'
+# directory in the temp dir where snapshots of retrieved records are stored
+CACHE_SNAPSHOT_DIR = 'snapshots'
 
 TEST_USER_DATA_FILE = "users_src.json" # defines dummy users that are used in testing
 TEST_USER_DATA_POSITION = 0 # when a single user is required this is the one used.
@@ -141,6 +249,164 @@ def isDataDebug():
         retVal = True
     return retVal
 
+def getIntEnvVar(envVarName, defaultValue):
+    """retrieves the value of an environment variable as an integer, if the
+    environment variable is not defined returns the default value
+
+    :param envVarName: the name of the environment variable
+    :type envVarName: str
+    :param defaultValue: value to return if the env var is not defined
+    :type defaultValue: int
+    :return: the integer value of the environment variable
+    :rtype: int
+    """
+    retVal = defaultValue
+    if envVarName in os.environ and os.environ[envVarName].strip():
+        retVal = int(os.environ[envVarName])
+    return retVal
+
+def getFloatEnvVar(envVarName, defaultValue):
+    """retrieves the value of an environment variable as a float, if the
+    environment variable is not defined returns the default value
+
+    :param envVarName: the name of the environment variable
+    :type envVarName: str
+    :param defaultValue: value to return if the env var is not defined
+    :type defaultValue: float
+    :return: the float value of the environment variable
+    :rtype: float
+    """
+    retVal = defaultValue
+    if envVarName in os.environ and os.environ[envVarName].strip():
+        retVal = float(os.environ[envVarName])
+    return retVal
+
+def getFetchEngine():
+    """identifies the engine that should be used to retrieve package data,
+    defined by the env var CKAN_FETCH_ENGINE
+
+    :return: the fetch engine to use
+    :rtype: FETCH_ENGINES
+    """
+    return getEnumEnvVar(CKAN_FETCH_ENGINE, FETCH_ENGINES, DEFAULT_FETCH_ENGINE)
+
+def getEnumEnvVar(envVarName, enumType, defaultValue):
+    """retrieves the value of an environment variable as a member of an
+    enumeration, matched by name
+
+    :param envVarName: the name of the environment variable
+    :type envVarName: str
+    :param enumType: the enumeration the value must be a member of
+    :type enumType: enum.Enum
+    :param defaultValue: value to return if the env var is not defined
+    :type defaultValue: enumType, None
+    :raises ValueError: when the value is not the name of a member
+    :return: the enumeration member
+    :rtype: enumType
+    """
+    retVal = defaultValue
+    if envVarName in os.environ and os.environ[envVarName].strip():
+        memberName = os.environ[envVarName].strip().upper()
+        if memberName not in enumType.__members__:
+            msg = (
+                f"The env var {envVarName} is set to {memberName}, valid "
+                f"values are: {list(enumType.__members__)}"
+            )
+            raise ValueError(msg)
+        retVal = enumType[memberName]
+    return retVal
+
+def getCassetteMode():
+    """
+    :return: the cassette mode, or None if the api is to be used directly
+    :rtype: CASSETTE_MODES
+    """
+    return getEnumEnvVar(CKAN_CASSETTE_MODE, CASSETTE_MODES, None)
+
+def getCassetteLatency():
+    return getEnumEnvVar(
+        CKAN_CASSETTE_LATENCY, CASSETTE_LATENCIES, DEFAULT_CASSETTE_LATENCY
+    )
+
+def getCassettePath():
+    retVal = os.path.join(getCachedDir(), DEFAULT_CASSETTE_FILE)
+    if CKAN_CASSETTE_PATH in os.environ and os.environ[CKAN_CASSETTE_PATH].strip():
+        retVal = os.environ[CKAN_CASSETTE_PATH].strip()
+    return retVal
+
+def getFetchConcurrency():
+    return getIntEnvVar(CKAN_FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY)
+
+def getFetchConcurrencyMin():
+    return getIntEnvVar(CKAN_FETCH_CONCURRENCY_MIN, DEFAULT_FETCH_CONCURRENCY_MIN)
+
+def getLatencyTarget():
+    return getIntEnvVar(CKAN_LATENCY_TARGET, DEFAULT_LATENCY_TARGET)
+
+def isIncrementalSync():
+    retVal = False
+    if ((CKAN_INCREMENTAL_SYNC in os.environ ) and
+        os.environ[CKAN_INCREMENTAL_SYNC].upper() == 'TRUE'):
+        retVal = True
+    return retVal
+
+def isConditionalFetch():
+    retVal = False
+    if ((CKAN_CONDITIONAL_FETCH in os.environ ) and
+        os.environ[CKAN_CONDITIONAL_FETCH].upper() == 'TRUE'):
+        retVal = True
+    return retVal
+
+def isStreamingDelta():
+    retVal = False
+    if ((CKAN_STREAMING_DELTA in os.environ ) and
+        os.environ[CKAN_STREAMING_DELTA].upper() == 'TRUE'):
+        retVal = True
+    return retVal
+
+def isFetchCheckpoint():
+    retVal = False
+    if ((CKAN_FETCH_CHECKPOINT in os.environ ) and
+        os.environ[CKAN_FETCH_CHECKPOINT].upper() == 'TRUE'):
+        retVal = True
+    return retVal
+
+def getRetryMax():
+    return getIntEnvVar(CKAN_RETRY_MAX, DEFAULT_RETRY_MAX)
+
+def getRequestTimeout():
+    return getIntEnvVar(CKAN_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT)
+
+def getRunDeadlineMinutes():
+    return getIntEnvVar(CKAN_RUN_DEADLINE_MINUTES, 0)
+
+def getReadRate():
+    return getFloatEnvVar(CKAN_READ_RATE, DEFAULT_READ_RATE)
+
+def getReadBurst():
+    return getIntEnvVar(CKAN_READ_BURST, DEFAULT_READ_BURST)
+
+def getWriteRate():
+    return getFloatEnvVar(CKAN_WRITE_RATE, DEFAULT_WRITE_RATE)
+
+def getWriteBurst():
+    return getIntEnvVar(CKAN_WRITE_BURST, DEFAULT_WRITE_BURST)
+
+def getIncrementalFullSyncHours():
+    return getIntEnvVar(CKAN_INCREMENTAL_FULL_SYNC_HOURS,
+                        DEFAULT_INCREMENTAL_FULL_SYNC_HOURS)
+
+def getResourceDiffKey():
+    """
+    :return: the names of the resource properties that are used to match
+        resources when packages are compared, defined by the env var
+        CKAN_RESOURCE_DIFF_KEY
+    :rtype: tuple of str
+    """
+    keyFields = DEFAULT_RESOURCE_DIFF_KEY
+    if CKAN_RESOURCE_DIFF_KEY in os.environ and os.environ[CKAN_RESOURCE_DIFF_KEY].strip():
+        keyFields = os.environ[CKAN_RESOURCE_DIFF_KEY]
+    return tuple(field.strip() for field in keyFields.split(",") if field.strip())
 
 
 # TODO: Search code for 'src' and 'dest' and replace with references to enum
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmarks a complete run, all the update steps, against two local fake ckan
+instances, see bcdc2bcdc.FakeCKAN.
+
+The src and dest instances are loaded from corpus files, json files with the
+records keyed by data type:
+
+    {"users": [...], "groups": [...], "organizations": [...], "packages": [...]}
+
+The timings for each step, the number of requests each instance received and
+the package throughput are written as json to stdout, or to --output.
+
+example:
+    python bin/benchmarkSync.py src.json dest.json --latency 0.02 --runs 2
+
+The first run synchronizes dest with src, later runs measure a run where
+there is nothing to update.
+"""
+# pylint: disable=logging-format-interpolation, wrong-import-position
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+import runBCDC2BCDC
+
+LOGGER = logging.getLogger("benchmark")
+
+# writes are refused for this host, it must not match either fake instance
+DO_NOT_WRITE_URL = "https://cat.data.gov.bc.ca"
+
+
+def getArgs():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("srcCorpus", help="json file with the src records")
+    parser.add_argument("destCorpus", help="json file with the dest records")
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="seconds each read request is delayed by, default 0"
+    )
+    parser.add_argument(
+        "--write-latency", type=float, default=None,
+        help="seconds each write request is delayed by, defaults to --latency"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0,
+        help="fraction the latency is randomly varied by, default 0"
+    )
+    parser.add_argument(
+        "--runs", type=int, default=1,
+        help="number of times to run the update, default 1"
+    )
+    parser.add_argument(
+        "--src-port", type=int, default=0,
+        help="port for the src instance, default any free port.  Fixed ports "
+        "are needed to replay a cassette recorded by an earlier benchmark"
+    )
+    parser.add_argument(
+        "--dest-port", type=int, default=0,
+        help="port for the dest instance, default any free port"
+    )
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument(
+        "--log-level", default="WARNING", help="log level, default WARNING"
+    )
+    return parser.parse_args()
+
+
+def loadCorpus(corpusFile):
+    with open(corpusFile) as fh:
+        return json.load(fh)
+
+
+def getRecordCounts(store):
+    """
+    :param store: the store for a fake instance
+    :type store: FakeCKAN.FakeCKANStore
+    :return: the number of active records of each data type
+    :rtype: dict
+    """
+    return {
+        dataType: len(store.getActive(dataType))
+        for dataType in constants.VALID_TRANSFORM_TYPES
+    }
+
+
+def setEnvironment(srcServer, destServer):
+    """points the env vars that configure the run at the fake instances"""
+    os.environ[constants.CKAN_URL_SRC] = srcServer.url
+    os.environ[constants.CKAN_URL_DEST] = destServer.url
+    os.environ[constants.CKAN_APIKEY_SRC] = "benchmark-src-key"
+    os.environ[constants.CKAN_APIKEY_DEST] = "benchmark-dest-key"
+    os.environ[constants.CKAN_DO_NOT_WRITE_URL] = DO_NOT_WRITE_URL
+    os.environ.setdefault(constants.CKAN_ONETIME_PASSWORD, "benchmark-password")
+
+
+def runBenchmark(srcServer, destServer, runCnt=1):
+    """
+    :param srcServer: the running src instance
+    :type srcServer: FakeCKAN.FakeCKANServer
+    :param destServer: the running dest instance
+    :type destServer: FakeCKAN.FakeCKANServer
+    :param runCnt: the number of times to run the update
+    :type runCnt: int
+    :return: the timings and request counts for each run
+    :rtype: list of dict
+    """
+    results = []
+    srcPkgCnt = len(srcServer.store.getActive(constants.TRANSFORM_TYPE_PACKAGES))
+    for runNum in range(runCnt):
+        srcServer.requestCounts.clear()
+        destServer.requestCounts.clear()
+        LOGGER.warning(f"starting run {runNum + 1} of {runCnt}")
+
+        startTime = time.monotonic()
+        updater = runBCDC2BCDC.RunUpdate()
+        stepTimes = updater.run()
+        totalTime = time.monotonic() - startTime
+
+        results.append(
+            {
+                "run": runNum + 1,
+                "total_seconds": round(totalTime, 3),
+                "step_seconds": {
+                    stepName: round(stepTime, 3)
+                    for stepName, stepTime in stepTimes.items()
+                },
+                "packages_per_second": round(srcPkgCnt / totalTime, 2),
+                "src_requests": dict(srcServer.requestCounts),
+                "dest_requests": dict(destServer.requestCounts),
+                "dest_record_counts": getRecordCounts(destServer.store),
+            }
+        )
+    return results
+
+
+def main():
+    args = getArgs()
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    # the update steps log through the module level logger of the run script
+    runBCDC2BCDC.LOGGER = logging.getLogger("main")
+
+    serverArgs = {
+        "latency": args.latency,
+        "writeLatency": args.write_latency,
+        "jitter": args.jitter,
+    }
+    srcServer = FakeCKAN.FakeCKANServer(
+        FakeCKAN.FakeCKANStore(loadCorpus(args.srcCorpus)), port=args.src_port,
+        **serverArgs
+    )
+    destServer = FakeCKAN.FakeCKANServer(
+        FakeCKAN.FakeCKANStore(loadCorpus(args.destCorpus)), port=args.dest_port,
+        **serverArgs
+    )
+    srcServer.start()
+    destServer.start()
+    try:
+        setEnvironment(srcServer, destServer)
+        report = {
+            "latency": args.latency,
+            "write_latency": destServer.writeLatency,
+            "jitter": args.jitter,
+            "src_record_counts": getRecordCounts(srcServer.store),
+            "runs": runBenchmark(srcServer, destServer, args.runs),
+        }
+    finally:
+        srcServer.stop()
+        destServer.stop()
+
+    reportJson = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(reportJson)
+    print(reportJson)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks the stages every record goes through when src and dest are
+compared: the steps of CKANRecord.getComparableStruct() and Diff.getDiff().
+
+The records are generated by bcdc2bcdc.CorpusGenerator, and loaded into two
+local fake ckan instances (see bcdc2bcdc.FakeCKAN) so the data cache and the
+scheming definitions used by the custom transformers are populated the same
+way they are for a run.
+
+Each stage is timed on its own, on fresh records that have been taken
+through the stages before it.  Stages are run --repeat times and the fastest
+run is reported, per record and per 1000 records.  A separate pass is made
+with tracemalloc running to count the memory blocks the stage allocates and
+keeps, and its peak memory use.
+
+example:
+    python bin/benchmarkTransform.py --records 1000 --output current.json
+    python bin/benchmarkTransform.py --records 1000 --baseline current.json
+
+The results are written as json to stdout, or to --output.  When --baseline
+is given, the results of an earlier benchmark, each stage includes the ratio
+of its time to the baseline time.
+"""
+# pylint: disable=logging-format-interpolation, wrong-import-position
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import bcdc2bcdc.CKANData as CKANData
+import bcdc2bcdc.CKANScheming as CKANScheming
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.CorpusGenerator as CorpusGenerator
+import bcdc2bcdc.DataCache as DataCache
+import bcdc2bcdc.Diff as Diff
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+import benchmarkSync
+
+LOGGER = logging.getLogger("benchmark")
+
+RECORD_CLASSES = {
+    constants.TRANSFORM_TYPE_USERS: CKANData.CKANUserRecord,
+    constants.TRANSFORM_TYPE_GROUPS: CKANData.CKANGroupRecord,
+    constants.TRANSFORM_TYPE_ORGS: CKANData.CKANOrganizationRecord,
+    constants.TRANSFORM_TYPE_PACKAGES: CKANData.CKANPackageRecord,
+}
+
+DATASET_CLASSES = {
+    constants.TRANSFORM_TYPE_USERS: CKANData.CKANUsersDataSet,
+    constants.TRANSFORM_TYPE_GROUPS: CKANData.CKANGroupDataSet,
+    constants.TRANSFORM_TYPE_ORGS: CKANData.CKANOrganizationDataSet,
+    constants.TRANSFORM_TYPE_PACKAGES: CKANData.CKANPackageDataSet,
+}
+
+# the CorpusGenerator argument that sets the number of records of each type
+COUNT_ARGS = {
+    constants.TRANSFORM_TYPE_USERS: "userCount",
+    constants.TRANSFORM_TYPE_GROUPS: "groupCount",
+    constants.TRANSFORM_TYPE_ORGS: "orgCount",
+}
+
+
+def filterFields(record):
+    record.comparableJsonData = record.filterNonUserGeneratedFields()
+
+
+def removeIgnores(record):
+    record.comparableJsonData = record.removeEmbeddedIgnores()
+
+
+def applyRequiredFields(record):
+    record.applyRequiredFields()
+
+
+def applyCustomTransformations(record):
+    record.applyCustomTransformations(constants.UPDATE_TYPES.COMPARE)
+
+
+def getComparableStruct(record):
+    record.getComparableStruct()
+
+
+def getDiff(records):
+    srcRecord, destRecord = records
+    Diff.Diff(srcRecord.comparableJsonData, destRecord.comparableJsonData).getDiff()
+
+
+# the steps run by CKANRecord.getComparableStruct() for a src record, in order
+COMPARABLE_STEPS = [
+    ("filterNonUserGeneratedFields", filterFields),
+    ("removeEmbeddedIgnores", removeIgnores),
+    ("applyRequiredFields", applyRequiredFields),
+    ("applyCustomTransformations", applyCustomTransformations),
+]
+
+
+def getArgs():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--records", type=int, default=1000,
+        help="number of records each stage is run on, default 1000"
+    )
+    parser.add_argument(
+        "--data-type", default=constants.TRANSFORM_TYPE_PACKAGES,
+        choices=sorted(RECORD_CLASSES),
+        help="the type of record to benchmark, default packages"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="number of times each stage is timed, default 5"
+    )
+    parser.add_argument(
+        "--resources", type=int, default=5,
+        help="average number of resources per package, default 5"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed, default 0")
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument(
+        "--baseline", help="results of an earlier benchmark to compare with"
+    )
+    parser.add_argument(
+        "--log-level", default="WARNING", help="log level, default WARNING"
+    )
+    return parser.parse_args()
+
+
+def loadDataCache(srcCorpus, destCorpus):
+    """
+    :return: a data cache populated with all the src and dest records, the
+        same way a run populates it
+    :rtype: DataCache.DataCache
+    """
+    dataCache = DataCache.DataCache()
+    dataCache.setScheming(CKANScheming.Scheming())
+    for dataType in srcCorpus:
+        for dataOrigin, corpus in [
+            (constants.DATA_SOURCE.SRC, srcCorpus),
+            (constants.DATA_SOURCE.DEST, destCorpus),
+        ]:
+            dataSet = DATASET_CLASSES[dataType](corpus[dataType], dataCache, dataOrigin)
+            if (
+                dataType == constants.TRANSFORM_TYPE_USERS
+                and dataOrigin == constants.DATA_SOURCE.SRC
+            ):
+                dataSet.getDuplicateEmailAddresses()
+            dataCache.addData(dataSet, dataOrigin)
+    return dataCache
+
+
+class StageRunner:
+    """Creates the records for each stage and runs the stages on them."""
+
+    def __init__(self, dataType, srcRecords, destRecords, dataCache):
+        """
+        :param dataType: the type of the records
+        :type dataType: str
+        :param srcRecords: the src records, the stages are run on these
+        :type srcRecords: list of dict
+        :param destRecords: the dest records with the same names as the src
+            records, used by the diff stage
+        :type destRecords: list of dict
+        :param dataCache: populated data cache
+        :type dataCache: DataCache.DataCache
+        """
+        self.recordClass = RECORD_CLASSES[dataType]
+        self.dataCache = dataCache
+        # the records are modified by the stages, the serialized version is
+        # used to create a fresh copy for each run
+        self.rawRecords = {
+            constants.DATA_SOURCE.SRC: json.dumps(srcRecords),
+            constants.DATA_SOURCE.DEST: json.dumps(destRecords),
+        }
+
+    def getRecords(self, dataOrigin, steps=()):
+        """
+        :param dataOrigin: which records to create
+        :type dataOrigin: constants.DATA_SOURCE
+        :param steps: the steps to run on the records before they are returned
+        :type steps: list of callable
+        :return: fresh records
+        :rtype: list of CKANData.CKANRecord
+        """
+        records = [
+            self.recordClass(jsonData, dataOrigin, self.dataCache)
+            for jsonData in json.loads(self.rawRecords[dataOrigin])
+        ]
+        for step in steps:
+            for record in records:
+                step(record)
+        return records
+
+    def getStages(self):
+        """
+        :return: the name of each stage, a function that returns the inputs
+            for the stage, and the function that runs the stage on an input
+        :rtype: list of tuple
+        """
+        src = constants.DATA_SOURCE.SRC
+        dest = constants.DATA_SOURCE.DEST
+        stages = []
+        for stepCnt, (stepName, step) in enumerate(COMPARABLE_STEPS):
+            previousSteps = [prevStep for _, prevStep in COMPARABLE_STEPS[:stepCnt]]
+            stages.append(
+                (stepName, lambda steps=previousSteps: self.getRecords(src, steps), step)
+            )
+        stages.append(
+            ("getComparableStruct", lambda: self.getRecords(src), getComparableStruct)
+        )
+
+        def getDiffInputs():
+            srcRecords = self.getRecords(src, [getComparableStruct])
+            destRecords = self.getRecords(dest, [getComparableStruct])
+            return list(zip(srcRecords, destRecords))
+
+        stages.append(("Diff.getDiff", getDiffInputs, getDiff))
+        return stages
+
+
+def timeStage(getInputs, stageFunc, repeat):
+    """
+    :return: the time in seconds of each run of the stage over all the inputs
+    :rtype: list of float
+    """
+    times = []
+    for _ in range(repeat):
+        inputs = getInputs()
+        startTime = time.perf_counter()
+        for stageInput in inputs:
+            stageFunc(stageInput)
+        times.append(time.perf_counter() - startTime)
+    return times
+
+
+def measureAllocations(getInputs, stageFunc):
+    """
+    :return: the number of memory blocks allocated by the stage that are
+        still allocated when it completes, their size in bytes, and the peak
+        memory allocated while the stage ran
+    :rtype: dict
+    """
+    inputs = getInputs()
+    tracemalloc.start()
+    try:
+        for stageInput in inputs:
+            stageFunc(stageInput)
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        # only allocations made since tracing started are in the snapshot
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    ).statistics("filename")
+    return {
+        "retained_blocks": sum(stat.count for stat in stats),
+        "retained_bytes": sum(stat.size for stat in stats),
+        "peak_bytes": peakMemory,
+    }
+
+
+def runStages(runner, recordCnt, repeat, baseline=None):
+    """
+    :return: the results for each stage, keyed by stage name
+    :rtype: dict
+    """
+    results = {}
+    for stageName, getInputs, stageFunc in runner.getStages():
+        LOGGER.warning(f"benchmarking {stageName}")
+        times = timeStage(getInputs, stageFunc, repeat)
+        bestTime = min(times)
+        allocations = measureAllocations(getInputs, stageFunc)
+        result = {
+            "seconds_per_record": bestTime / recordCnt,
+            "seconds_per_1000": round(bestTime / recordCnt * 1000, 6),
+            "best_seconds": round(bestTime, 6),
+            "median_seconds": round(statistics.median(times), 6),
+            "retained_blocks_per_record": round(
+                allocations["retained_blocks"] / recordCnt, 2
+            ),
+            "retained_bytes_per_record": round(
+                allocations["retained_bytes"] / recordCnt, 1
+            ),
+            "peak_bytes": allocations["peak_bytes"],
+        }
+        if baseline and stageName in baseline.get("stages", {}):
+            baseTime = baseline["stages"][stageName]["seconds_per_record"]
+            result["baseline_ratio"] = round(result["seconds_per_record"] / baseTime, 3)
+        results[stageName] = result
+    return results
+
+
+def main():
+    args = getArgs()
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+
+    # every package that is benchmarked is in src and dest, so there are no
+    # adds or deletes, and each record has a counterpart to be diffed with
+    countArgs = {"packageCount": args.records}
+    if args.data_type != constants.TRANSFORM_TYPE_PACKAGES:
+        countArgs[COUNT_ARGS[args.data_type]] = args.records
+    generator = CorpusGenerator.CorpusGenerator(
+        resourceCount=args.resources,
+        addFraction=0,
+        deleteFraction=0,
+        seed=args.seed,
+        **countArgs,
+    )
+    srcCorpus, destCorpus = generator.generate()
+    srcServer = FakeCKAN.FakeCKANServer(FakeCKAN.FakeCKANStore(srcCorpus))
+    destServer = FakeCKAN.FakeCKANServer(FakeCKAN.FakeCKANStore(destCorpus))
+    srcServer.start()
+    destServer.start()
+    try:
+        benchmarkSync.setEnvironment(srcServer, destServer)
+        dataCache = loadDataCache(srcCorpus, destCorpus)
+        srcRecords = srcCorpus[args.data_type][: args.records]
+        destRecords = {record["name"]: record for record in destCorpus[args.data_type]}
+        runner = StageRunner(
+            args.data_type,
+            srcRecords,
+            [destRecords[record["name"]] for record in srcRecords],
+            dataCache,
+        )
+        report = {
+            "data_type": args.data_type,
+            "records": len(srcRecords),
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "stages": runStages(runner, len(srcRecords), args.repeat, baseline),
+        }
+    finally:
+        srcServer.stop()
+        destServer.stop()
+
+    reportJson = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(reportJson)
+    print(reportJson)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic src and dest corpora for scale testing, see
+bcdc2bcdc.CorpusGenerator.  The corpora are written as json files that can be
+loaded by bin/benchmarkSync.py.
+
+example:
+    python bin/generateCorpus.py src.json dest.json --packages 10000 --updates 0.2
+
+The number of records of each data type in each corpus, and the number of
+adds, deletes and updates are written to stdout as json.
+"""
+# pylint: disable=wrong-import-position
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.CorpusGenerator as CorpusGenerator
+
+
+def getArgs():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("srcCorpus", help="json file the src records are written to")
+    parser.add_argument(
+        "destCorpus", help="json file the dest records are written to"
+    )
+    parser.add_argument(
+        "--packages", type=int, default=1000,
+        help="number of packages in src, default 1000"
+    )
+    parser.add_argument(
+        "--users", type=int, default=None,
+        help="number of users in src, default one for every 20 packages"
+    )
+    parser.add_argument(
+        "--orgs", type=int, default=None,
+        help="number of top level organizations, default one for every 200 "
+        "packages"
+    )
+    parser.add_argument(
+        "--sub-orgs", type=int, default=3,
+        help="number of sub organizations per organization, default 3"
+    )
+    parser.add_argument(
+        "--groups", type=int, default=None,
+        help="number of groups in src, default one for every 500 packages"
+    )
+    parser.add_argument(
+        "--resources", type=int, default=5,
+        help="average number of resources per package, default 5"
+    )
+    parser.add_argument(
+        "--duplicate-emails", type=float, default=0.02,
+        help="fraction of users that share an email address, default 0.02"
+    )
+    parser.add_argument(
+        "--adds", type=float, default=0.05,
+        help="fraction of src records that are not in dest, default 0.05"
+    )
+    parser.add_argument(
+        "--deletes", type=float, default=0.05,
+        help="records only in dest, as a fraction of src records, default 0.05"
+    )
+    parser.add_argument(
+        "--updates", type=float, default=0.1,
+        help="fraction of src records that are different in dest, default 0.1"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed, default 0")
+    parser.add_argument(
+        "--config",
+        help="transformation config file that describes the record properties, "
+        "defaults to the config used by the run"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = getArgs()
+    logging.basicConfig(level=logging.INFO)
+    generator = CorpusGenerator.CorpusGenerator(
+        packageCount=args.packages,
+        userCount=args.users,
+        orgCount=args.orgs,
+        subOrgCount=args.sub_orgs,
+        groupCount=args.groups,
+        resourceCount=args.resources,
+        duplicateEmailFraction=args.duplicate_emails,
+        addFraction=args.adds,
+        deleteFraction=args.deletes,
+        updateFraction=args.updates,
+        seed=args.seed,
+        transformationConfigFile=args.config,
+    )
+    corpusFiles = {
+        constants.DATA_SOURCE.SRC: args.srcCorpus,
+        constants.DATA_SOURCE.DEST: args.destCorpus,
+    }
+    for dataOrigin, corpusFile in corpusFiles.items():
+        with open(corpusFile, "w") as fh:
+            generator.writeCorpus(dataOrigin, fh)
+    print(json.dumps(generator.getSummary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
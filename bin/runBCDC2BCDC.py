@@ -8,16 +8,18 @@ import logging.config
 import os
 import posixpath
 import sys
+import time
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 import bcdc2bcdc.CacheFiles as CacheFiles
 import bcdc2bcdc.CKAN as CKAN
 import bcdc2bcdc.CKANData as CKANData
-import bcdc2bcdc.CKANScheming as CKANScheming
 import bcdc2bcdc.CKANUpdate as CKANUpdate
 import bcdc2bcdc.constants as constants
 import bcdc2bcdc.DataCache as DataCache
+import bcdc2bcdc.IncrementalSync as IncrementalSync
+import bcdc2bcdc.Prefetch as Prefetch
 
 # set scope for the logger
 LOGGER = None
@@ -37,26 +39,39 @@ class RunUpdate:
         # create the directory for detailed data dumps
         self.cachedFilesPaths.getCreateDataDumpDir()
 
-    def updateUsers(self, useCache=False):
-
-        argList = {
-            True: {
-                "src": {"cacheFileName":  self.cachedFilesPaths.getSrcUserJsonPath(),
-                        "includeData": True},
-                "dest": {"cacheFileName": self.cachedFilesPaths.getSrcUserJsonPath(),
-                        "includeData": True}
-            },
-            False: {
-                "src": {"cacheFileName":  None,
-                        "includeData": True},
-                "dest": {"cacheFileName": None,
-                        "includeData": True}
-            }
-        }
-        # TODO: Need to figure out how to call the getusers with or
-        #       without cache and then deal with the other methods
-        userDataSrc = self.srcCKANWrapper.getUsers(**argList[useCache]['src'])
-        userDataDest = self.destCKANWrapper.getUsers(**argList[useCache]['dest'])
+    def getData(self, dataType, useCache=False, dataFutures=None):
+        """Returns the src and dest data for the data type, either from the
+        futures started by Prefetch.DataPrefetcher, or if no futures are
+        provided retrieves the data.
+
+        :param dataType: one of the constants.VALID_TRANSFORM_TYPES
+        :type dataType: str
+        :param useCache: read the data from the cache files, defaults to False
+        :type useCache: bool, optional
+        :param dataFutures: the src and dest futures for the data type, keyed
+            by constants.DATA_SOURCE, defaults to None
+        :type dataFutures: dict, optional
+        :return: the src data and the dest data
+        :rtype: tuple
+        """
+        if dataFutures:
+            srcData = dataFutures[constants.DATA_SOURCE.SRC].result()
+            destData = dataFutures[constants.DATA_SOURCE.DEST].result()
+        else:
+            srcData = Prefetch.fetchData(
+                self.srcCKANWrapper, dataType, constants.DATA_SOURCE.SRC,
+                useCache, self.cachedFilesPaths
+            )
+            destData = Prefetch.fetchData(
+                self.destCKANWrapper, dataType, constants.DATA_SOURCE.DEST,
+                useCache, self.cachedFilesPaths
+            )
+        return srcData, destData
+
+    def updateUsers(self, useCache=False, dataFutures=None):
+        userDataSrc, userDataDest = self.getData(
+            constants.TRANSFORM_TYPE_USERS, useCache, dataFutures
+        )
 
         # cache will be populated when delta obj is requested
         srcUserCKANDataSet = CKANData.CKANUsersDataSet(
@@ -85,26 +100,13 @@ class RunUpdate:
         )
         updater.update(deltaObj)
 
-    def updateGroups(self, useCache=False):
+    def updateGroups(self, useCache=False, dataFutures=None):
         """Based on descriptions of SRC / DEST CKAN instances in environment
         variables performes the update, reading from SRC, writing to DEST.
         """
-        argList = {
-            True: {
-                "src": {"cacheFileName":  self.cachedFilesPaths.getSrcGroupJsonPath(),
-                        "includeData": True},
-                "dest": {"cacheFileName": self.cachedFilesPaths.getDestGroupJsonPath(),
-                        "includeData": True}
-            },
-            False: {
-                "src": {"cacheFileName":  None,
-                        "includeData": True},
-                "dest": {"cacheFileName": None,
-                        "includeData": True}
-            }
-        }
-        groupDataSrc = self.srcCKANWrapper.getGroups(**argList[useCache]['src'])
-        groupDataDest = self.destCKANWrapper.getGroups(**argList[useCache]['dest'])
+        groupDataSrc, groupDataDest = self.getData(
+            constants.TRANSFORM_TYPE_GROUPS, useCache, dataFutures
+        )
 
         srcGroupCKANDataSet = CKANData.CKANGroupDataSet(
             groupDataSrc, self.dataCache, constants.DATA_SOURCE.SRC
@@ -126,23 +128,10 @@ class RunUpdate:
         #else:
         #    LOGGER.info("no differences found for groups between src and dest")
 
-    def updateOrganizations(self, useCache=False):
-        argList = {
-            True: {
-                "src": {"cacheFileName":  self.cachedFilesPaths.getSrcOrganizationsJsonPath(),
-                        "includeData": True},
-                "dest": {"cacheFileName": self.cachedFilesPaths.getDestOrganizationsJsonPath(),
-                        "includeData": True}
-            },
-            False: {
-                "src": {"cacheFileName":  None,
-                        "includeData": True},
-                "dest": {"cacheFileName": None,
-                        "includeData": True}
-            }
-        }
-        orgDataSrc = self.srcCKANWrapper.getOrganizations(**argList[useCache]['src'])
-        orgDataDest = self.destCKANWrapper.getOrganizations(**argList[useCache]['dest'])
+    def updateOrganizations(self, useCache=False, dataFutures=None):
+        orgDataSrc, orgDataDest = self.getData(
+            constants.TRANSFORM_TYPE_ORGS, useCache, dataFutures
+        )
 
         srcOrgCKANDataSet = CKANData.CKANOrganizationDataSet(
             orgDataSrc, self.dataCache, constants.DATA_SOURCE.SRC
@@ -162,59 +151,120 @@ class RunUpdate:
         )
         updater.update(deltaObj)
 
-    def updatePackages(self, useCache=False):
+    def updatePackages(self, useCache=False, dataFutures=None, packageStream=None):
         """ updates packages based on
 
         :param useCache: [description], defaults to False
         :type useCache: bool, optional
+        :param dataFutures: the src and dest futures started by
+            Prefetch.DataPrefetcher, defaults to None
+        :type dataFutures: dict, optional
+        :param packageStream: the stream the packages in dataFutures are sent
+            to as they are received, defaults to None
+        :type packageStream: DeltaStream.PackageDeltaStream, optional
         """
-        argList = {
-            True: {
-                "src": {"cacheFileName":  self.cachedFilesPaths.getSrcPackagesJsonPath()},
-                "dest": {"cacheFileName": self.cachedFilesPaths.getDestPackagesJsonPath()}
-            },
-            False: {
-                "src": {"cacheFileName":  None},
-                "dest": {"cacheFileName": None}
-            }
-        }
-        srcPkgList = self.srcCKANWrapper.getPackagesAndData(**argList[useCache]['src'])
-        destPkgList = self.destCKANWrapper.getPackagesAndData(**argList[useCache]['dest'])
-
-        srcPkgDataSet = CKANData.CKANPackageDataSet(
-            srcPkgList, self.dataCache, constants.DATA_SOURCE.SRC
-        )
-        destPkgDataSet = CKANData.CKANPackageDataSet(
-            destPkgList, self.dataCache, constants.DATA_SOURCE.DEST
-        )
-
-        self.dataCache.addData(srcPkgDataSet, constants.DATA_SOURCE.SRC)
-        self.dataCache.addData(destPkgDataSet, constants.DATA_SOURCE.DEST)
-
-        LOGGER.debug("calculating deltas between src / dest for packages...")
-
-        deltaObj = srcPkgDataSet.getDelta(destPkgDataSet)
+        if packageStream is None and constants.isStreamingDelta() and not useCache:
+            packageStream, dataFutures = Prefetch.startPackageStream(
+                self.srcCKANWrapper, self.destCKANWrapper, self.cachedFilesPaths
+            )
+
+        if packageStream is not None:
+            # packages are compared as they arrive, the datasets are added to
+            # the data cache once all the packages have been received
+            LOGGER.debug("comparing src / dest packages as they are received...")
+            deltaObj = packageStream.getDelta(
+                self.dataCache,
+                dataFutures[constants.DATA_SOURCE.SRC],
+                dataFutures[constants.DATA_SOURCE.DEST],
+            )
+        else:
+            srcPkgList, destPkgList = self.getData(
+                constants.TRANSFORM_TYPE_PACKAGES, useCache, dataFutures
+            )
+
+            srcPkgDataSet = CKANData.CKANPackageDataSet(
+                srcPkgList, self.dataCache, constants.DATA_SOURCE.SRC
+            )
+            destPkgDataSet = CKANData.CKANPackageDataSet(
+                destPkgList, self.dataCache, constants.DATA_SOURCE.DEST
+            )
+
+            self.dataCache.addData(srcPkgDataSet, constants.DATA_SOURCE.SRC)
+            self.dataCache.addData(destPkgDataSet, constants.DATA_SOURCE.DEST)
+
+            LOGGER.debug("calculating deltas between src / dest for packages...")
+
+            deltaObj = srcPkgDataSet.getDelta(destPkgDataSet)
+        if constants.isIncrementalSync() and not useCache:
+            # the src and dest package snapshots share their objects, they
+            # can only be pruned once both retrievals are complete
+            IncrementalSync.pruneSnapshots(self.cachedFilesPaths)
         LOGGER.info(f"Delta obj for packages: {deltaObj}")
         updater = CKANUpdate.CKANPackagesUpdate(
             self.dataCache, ckanWrapper=self.destCKANWrapper
         )
         updater.update(deltaObj)
 
-    def refreshSchemingDefs(self):
+    def refreshSchemingDefs(self, schemingFuture=None):
         """Every time the update runs it will download the scheming definitions.
         These are used later when transforming the packages for update.
+
+        :param schemingFuture: future started by Prefetch.DataPrefetcher that
+            returns the scheming definitions, defaults to None
+        :type schemingFuture: concurrent.futures.Future, optional
         """
-        # check for scheming file, and delete it, then create a ckan schemeing
-        # object, cache it in the datacache
-        cacheFiles = CacheFiles.CKANCacheFiles()
-        schemingCacheFile = cacheFiles.getSchemingCacheFilePath()
-        if os.path.exists(schemingCacheFile):
-            LOGGER.info(f"deleting the scheming cache file: {schemingCacheFile}")
-            os.remove(schemingCacheFile)
-
-        scheming = CKANScheming.Scheming()
+        if schemingFuture:
+            scheming = schemingFuture.result()
+        else:
+            scheming = Prefetch.refreshScheming()
         self.dataCache.setScheming(scheming)
 
+    def run(self, useCache=False):
+        """Runs all the update steps.  All the src and dest data is retrieved in
+        parallel at the start of the run, each update step waits for the data
+        it needs.
+
+        :param useCache: read the data from the cache files, defaults to False
+        :type useCache: bool, optional
+        :return: the number of seconds each step took, keyed by the name of
+            the step, in the order they were run
+        :rtype: dict
+        """
+        prefetcher = Prefetch.DataPrefetcher(
+            self.srcCKANWrapper, self.destCKANWrapper, useCache=useCache
+        )
+        prefetcher.start()
+        steps = [
+            ("scheming", lambda: self.refreshSchemingDefs(
+                prefetcher.getSchemingFuture())),
+            (constants.TRANSFORM_TYPE_USERS, lambda: self.updateUsers(
+                useCache=useCache,
+                dataFutures=prefetcher.getFutures(constants.TRANSFORM_TYPE_USERS))),
+            (constants.TRANSFORM_TYPE_GROUPS, lambda: self.updateGroups(
+                useCache=useCache,
+                dataFutures=prefetcher.getFutures(constants.TRANSFORM_TYPE_GROUPS))),
+            (constants.TRANSFORM_TYPE_ORGS, lambda: self.updateOrganizations(
+                useCache=useCache,
+                dataFutures=prefetcher.getFutures(constants.TRANSFORM_TYPE_ORGS))),
+            (constants.TRANSFORM_TYPE_PACKAGES, lambda: self.updatePackages(
+                useCache=useCache,
+                dataFutures=prefetcher.getFutures(constants.TRANSFORM_TYPE_PACKAGES),
+                packageStream=prefetcher.getPackageStream())),
+        ]
+        stepTimes = {}
+        try:
+            for stepName, step in steps:
+                startTime = time.monotonic()
+                step()
+                stepTimes[stepName] = time.monotonic() - startTime
+                if stepName in constants.VALID_TRANSFORM_TYPES:
+                    prefetcher.setStepComplete(stepName)
+                LOGGER.info(f"{stepName} step took {stepTimes[stepName]:.2f}s")
+        except Exception:
+            prefetcher.cancel()
+            raise
+        return stepTimes
+
     def checkForRequiredEnvironmentVariables(self):
         """Checks to make sure that required environment variables have been
         populated
@@ -276,14 +326,11 @@ if __name__ == "__main__":
     # -----------------------------------------------------------------------
     updater = RunUpdate()
     updater.checkForRequiredEnvironmentVariables()
-    updater.refreshSchemingDefs()
 
     useCache = False
     # This is complete, commented out while work on group
     # not running user update for now
     if constants.isDataDebug():
         useCache=True
-    updater.updateUsers(useCache=useCache)
-    updater.updateGroups(useCache=useCache)
-    updater.updateOrganizations(useCache=useCache)
-    updater.updatePackages(useCache=useCache)
+
+    updater.run(useCache=useCache)
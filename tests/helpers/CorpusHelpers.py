@@ -0,0 +1,63 @@
+"""Sets up the records of a generated corpus, see CorpusGenerator, the way a
+run does, without access to a ckan instance.
+"""
+import logging
+
+import bcdc2bcdc.CKANData as CKANData
+import bcdc2bcdc.CKANScheming as CKANScheming
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.CorpusGenerator as CorpusGenerator
+import bcdc2bcdc.DataCache as DataCache
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+
+LOGGER = logging.getLogger(__name__)
+
+# the data types that are loaded into the data cache before the package step
+DATASET_CLASSES = {
+    constants.TRANSFORM_TYPE_USERS: CKANData.CKANUsersDataSet,
+    constants.TRANSFORM_TYPE_GROUPS: CKANData.CKANGroupDataSet,
+    constants.TRANSFORM_TYPE_ORGS: CKANData.CKANOrganizationDataSet,
+}
+
+
+def startCorpusServer(monkeypatch, packageCount=30, resourceCount=2, seed=0):
+    """Generates a src and dest corpus, and starts a fake ckan instance for
+    the dest corpus that the env vars point at.  The scheming definitions are
+    retrieved from it.
+
+    :param monkeypatch: the pytest monkeypatch fixture
+    :return: the src corpus, the dest corpus and the running server, the
+        caller stops the server
+    :rtype: tuple
+    """
+    srcCorpus, destCorpus = CorpusGenerator.CorpusGenerator(
+        packageCount=packageCount, resourceCount=resourceCount, seed=seed
+    ).generate()
+    server = FakeCKAN.FakeCKANServer(FakeCKAN.FakeCKANStore(destCorpus))
+    server.start()
+    for urlEnvVar, keyEnvVar in [
+        (constants.CKAN_URL_SRC, constants.CKAN_APIKEY_SRC),
+        (constants.CKAN_URL_DEST, constants.CKAN_APIKEY_DEST),
+    ]:
+        monkeypatch.setenv(urlEnvVar, server.url)
+        monkeypatch.setenv(keyEnvVar, "test-key")
+    monkeypatch.delenv("DUMP_DEBUG_DATA", raising=False)
+    return srcCorpus, destCorpus, server
+
+
+def getDataCache(srcCorpus, destCorpus):
+    """
+    :return: data cache with the users, groups and organizations, the state it
+        is in when the package step starts
+    :rtype: DataCache.DataCache
+    """
+    dataCache = DataCache.DataCache()
+    dataCache.setScheming(CKANScheming.Scheming())
+    for dataType, dataSetClass in DATASET_CLASSES.items():
+        for dataOrigin, dataCorpus in [
+            (constants.DATA_SOURCE.SRC, srcCorpus),
+            (constants.DATA_SOURCE.DEST, destCorpus),
+        ]:
+            dataSet = dataSetClass(dataCorpus[dataType], dataCache, dataOrigin)
+            dataCache.addData(dataSet, dataOrigin)
+    return dataCache
@@ -176,15 +176,14 @@ def test_OrgRecord_removeEmbedded(CKAN_Cached_Test_Org_Record, TransformationCon
     CKAN_Cached_Test_Org_Record.transConf.transConf['users']['ignore_list'].append('bkelsey')
     CKAN_Cached_Test_Org_Record.transConf.transConf['users']['ignore_list'].append('dkelsey')
     comparable = CKAN_Cached_Test_Org_Record.getComparableStruct()
-    dataCell = CKANData.DataCell(comparable)
-    dataCell = CKAN_Cached_Test_Org_Record.removeEmbeddedIgnores(dataCell)
-    LOGGER.debug(f"final modified struct: {dataCell.struct}")
+    noIgnores = CKAN_Cached_Test_Org_Record.removeEmbeddedIgnores(comparable)
+    LOGGER.debug(f"final modified struct: {noIgnores}")
 
-    # now dataCell.struct should contain a different data structure where
+    # now noIgnores should contain a different data structure where
     # the embedded data that should be ignored has been removed.
     usersIgnore = TransformationConfig.getIgnoreList(constants.TRANSFORM_TYPE_USERS)
     for ignoreUser in usersIgnore:
-        for userObj in dataCell.struct[constants.TRANSFORM_TYPE_USERS]:
+        for userObj in noIgnores[constants.TRANSFORM_TYPE_USERS]:
             assert userObj['name'] != ignoreUser
 
 def test_Org_Dataset_EmbedScrub(CKAN_Cached_Test_Org_Data_Set):
@@ -194,14 +193,13 @@ def test_Org_Dataset_EmbedScrub(CKAN_Cached_Test_Org_Data_Set):
     for CKANOrgRecord in CKAN_Cached_Test_Org_Data_Set:
         LOGGER.debug(f"Org record: {CKANOrgRecord}")
         compStruct = CKANOrgRecord.getComparableStruct()
-        dataCell = CKANData.DataCell(compStruct)
-        dataCellNoIgnores = CKANOrgRecord.removeEmbeddedIgnores(dataCell)
+        noIgnores = CKANOrgRecord.removeEmbeddedIgnores(compStruct)
         # now use the helper to make sure that all embeds have been removed.
-        ignoreChecker = tests.helpers.CKANDataHelpers.CheckForIgnores(dataCellNoIgnores.struct)
+        ignoreChecker = tests.helpers.CKANDataHelpers.CheckForIgnores(noIgnores)
         hasIgnores = ignoreChecker.hasIgnoreUsers()
         LOGGER.debug(f"HAS IGNORES: {hasIgnores}")
         if hasIgnores:
-            LOGGER.error(f"ignores not removed: {dataCellNoIgnores.struct}")
+            LOGGER.error(f"ignores not removed: {noIgnores}")
         assert not hasIgnores
 
 def test_Package_DataSet(CKAN_Cached_Src_Package_Data, CKAN_Cached_Dest_Package_Data):
@@ -0,0 +1,180 @@
+import collections
+import logging
+import threading
+import urllib.parse
+
+import pytest
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+import bcdc2bcdc.CKAN as CKAN
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+import bcdc2bcdc.HTTPClients as HTTPClients
+import bcdc2bcdc.SnapshotStore as SnapshotStore
+
+LOGGER = logging.getLogger(__name__)
+
+PACKAGE_NAMES = [f"pkg{pkgCnt}" for pkgCnt in range(6)]
+
+# metadata_modified as returned by package_show
+MODIFIED_TIMESTAMPS = [
+    "2020-05-01T18:20:11.123456",
+    "2020-05-01T18:20:11.120000",
+    "2020-05-01T18:20:11.000999",
+    "2020-05-01T18:20:11",
+]
+
+
+class InvalidBodyHandler(FakeCKAN.FakeCKANRequestHandler):
+    """returns a 200 response that isn't a package the first time some of the
+    packages are requested
+    """
+
+    # package name: body of the first response
+    invalidBodies = {
+        "pkg1": b"<html>proxy error</html>",
+        "pkg2": b'{"success": true}',
+        "pkg3": b"[]",
+    }
+    requestCounts = collections.Counter()
+    lock = threading.Lock()
+
+    def handleAction(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        pkgName = query.get("id", [None])[-1]
+        with self.lock:
+            self.requestCounts[pkgName] += 1
+            firstRequest = self.requestCounts[pkgName] == 1
+        if self.getAction() != "package_show" or not firstRequest or (
+            pkgName not in self.invalidBodies
+        ):
+            FakeCKAN.FakeCKANRequestHandler.handleAction(self)
+            return
+        body = self.invalidBodies[pkgName]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def fakeServer():
+    store = FakeCKAN.FakeCKANStore(
+        {
+            "packages": [
+                {
+                    "name": pkgName,
+                    "title": pkgName,
+                    "metadata_modified": MODIFIED_TIMESTAMPS[
+                        pkgCnt % len(MODIFIED_TIMESTAMPS)
+                    ],
+                }
+                for pkgCnt, pkgName in enumerate(PACKAGE_NAMES)
+            ]
+        }
+    )
+    server = FakeCKAN.FakeCKANServer(store)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_asyncIOGetPackages(fakeServer):
+    received = []
+    fetcher = CKAN.CKANAsyncIOWrapper(fakeServer.url, onPackage=received.append)
+    packages = fetcher.getPackages(PACKAGE_NAMES)
+    assert sorted(pkg["name"] for pkg in packages) == PACKAGE_NAMES
+    assert sorted(pkg["name"] for pkg in received) == PACKAGE_NAMES
+    assert fakeServer.requestCounts["package_show"] == len(PACKAGE_NAMES)
+
+
+def test_asyncIOCallbacksOffLoopThread(fakeServer):
+    callbackThreads = set()
+
+    def onPackage(packageData):
+        callbackThreads.add(threading.current_thread())
+
+    fetcher = CKAN.CKANAsyncIOWrapper(fakeServer.url, onPackage=onPackage)
+    fetcher.getPackages(PACKAGE_NAMES)
+    assert callbackThreads
+    assert HTTPClients.EVENT_LOOP_THREAD not in callbackThreads
+    assert threading.current_thread() not in callbackThreads
+
+
+def test_asyncIOConcurrentFetchers(fakeServer):
+    # the src and dest prefetches run the fetchers from different threads,
+    # sharing the loop
+    results = {}
+
+    def fetch(fetcherId):
+        fetcher = CKAN.CKANAsyncIOWrapper(fakeServer.url)
+        results[fetcherId] = fetcher.getPackages(PACKAGE_NAMES)
+
+    threads = [threading.Thread(target=fetch, args=(cnt,)) for cnt in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert sorted(results) == [0, 1]
+    for packages in results.values():
+        assert sorted(pkg["name"] for pkg in packages) == PACKAGE_NAMES
+    assert fakeServer.requestCounts["package_show"] == 2 * len(PACKAGE_NAMES)
+    assert HTTPClients.EVENT_LOOP_THREAD.is_alive()
+
+
+@pytest.mark.parametrize(
+    "fetcherClass", [CKAN.CKANAsyncWrapper, CKAN.CKANAsyncIOWrapper]
+)
+def test_invalidResponseBody(fakeServer, fetcherClass):
+    InvalidBodyHandler.requestCounts.clear()
+    fakeServer.RequestHandlerClass = InvalidBodyHandler
+    fetcher = fetcherClass(fakeServer.url)
+    packages = fetcher.getPackages(PACKAGE_NAMES)
+
+    # the packages with invalid responses are recorded as failed and are
+    # requested again by verify()
+    assert sorted(pkg["name"] for pkg in packages) == PACKAGE_NAMES
+    for pkgName in PACKAGE_NAMES:
+        expected = 2 if pkgName in InvalidBodyHandler.invalidBodies else 1
+        assert InvalidBodyHandler.requestCounts[pkgName] == expected
+    assert fetcher.currentRetry == 1
+
+
+def test_isSameTimeStamp():
+    # package_show, and package_search with fl (solr)
+    assert CKAN.isSameTimeStamp("2020-05-01T18:20:11.123456", "2020-05-01T18:20:11.123Z")
+    assert CKAN.isSameTimeStamp("2020-05-01T18:20:11.120000", "2020-05-01T18:20:11.12Z")
+    assert CKAN.isSameTimeStamp("2020-05-01T18:20:11.000999", "2020-05-01T18:20:11Z")
+    assert CKAN.isSameTimeStamp("2020-05-01T18:20:11", "2020-05-01T18:20:11Z")
+    assert not CKAN.isSameTimeStamp(
+        "2020-05-01T18:20:11.124456", "2020-05-01T18:20:11.123Z"
+    )
+    assert not CKAN.isSameTimeStamp(None, None)
+    assert not CKAN.isSameTimeStamp("not a timestamp", "not a timestamp")
+
+
+def test_conditionalFetch(fakeServer, tmp_path, monkeypatch):
+    monkeypatch.delenv(constants.CKAN_FETCH_ENGINE, raising=False)
+    monkeypatch.delenv(constants.CKAN_FETCH_CHECKPOINT, raising=False)
+    wrapper = CKAN.CKANWrapper(fakeServer.url, apiKey="test-key")
+    listing = wrapper.getPackageModifiedListing()
+    assert listing["pkg0"] == "2020-05-01T18:20:11.123Z"
+
+    def getPackages():
+        snapshotStore = SnapshotStore.SnapshotStore(
+            "test_instance", constants.TRANSFORM_TYPE_PACKAGES,
+            cacheFiles=CacheFiles.CKANCacheFiles(str(tmp_path))
+        )
+        fakeServer.requestCounts.clear()
+        fetcher = CKAN.ConditionalPackageFetcher(wrapper, snapshotStore)
+        packages = fetcher.getPackages(PACKAGE_NAMES)
+        assert sorted(pkg["name"] for pkg in packages) == PACKAGE_NAMES
+        return fakeServer.requestCounts["package_show"]
+
+    assert getPackages() == len(PACKAGE_NAMES)
+    # nothing has changed, everything is served from the snapshot store
+    assert getPackages() == 0
+
+    fakeServer.store.call("package_update", {"id": "pkg2", "title": "changed"})
+    assert getPackages() == 1
@@ -0,0 +1,74 @@
+import copy
+import logging
+
+import pytest
+
+import bcdc2bcdc.CKANData as CKANData
+import bcdc2bcdc.constants as constants
+import tests.helpers.CorpusHelpers as CorpusHelpers
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def packageRecords(monkeypatch):
+    """a src package record with resources, and the dest record it updates"""
+    srcCorpus, destCorpus, server = CorpusHelpers.startCorpusServer(
+        monkeypatch, packageCount=10, resourceCount=3
+    )
+    dataCache = CorpusHelpers.getDataCache(srcCorpus, destCorpus)
+    destPackages = {
+        pkg["name"]: pkg for pkg in destCorpus[constants.TRANSFORM_TYPE_PACKAGES]
+    }
+    srcPackage = [
+        pkg for pkg in srcCorpus[constants.TRANSFORM_TYPE_PACKAGES]
+        if pkg["name"] in destPackages and pkg["resources"]
+    ][0]
+    srcRecord = CKANData.CKANPackageRecord(
+        srcPackage, constants.DATA_SOURCE.SRC, dataCache
+    )
+    destRecord = CKANData.CKANPackageRecord(
+        destPackages[srcPackage["name"]], constants.DATA_SOURCE.DEST, dataCache
+    )
+    srcRecord.setDestRecord(destRecord)
+    yield srcRecord, destRecord
+    server.stop()
+
+
+def test_transformsDoNotModifyInputs(packageRecords):
+    srcRecord, destRecord = packageRecords
+    dataCache = srcRecord.dataCache
+    jsonData = srcRecord.jsonData
+    jsonDataCopy = copy.deepcopy(jsonData)
+    jsonResources = list(jsonData["resources"])
+
+    comparable = srcRecord.getComparableStruct()
+    comparableCopy = copy.deepcopy(comparable)
+    comparableResources = list(comparable["resources"])
+
+    updateStruct = srcRecord.getComparableStructUsedForAddUpdate(
+        dataCache, constants.UPDATE_TYPES.UPDATE
+    )
+
+    # the json data and the comparable struct are unchanged
+    assert srcRecord.jsonData is jsonData
+    assert jsonData == jsonDataCopy
+    assert all(
+        resource is original
+        for resource, original in zip(jsonData["resources"], jsonResources)
+    )
+    assert srcRecord.getComparableStruct() is comparable
+    assert comparable == comparableCopy
+    assert all(
+        resource is original
+        for resource, original in zip(comparable["resources"], comparableResources)
+    )
+
+    # the update struct has the values transformed for the dest instance
+    destOrgId = destRecord.jsonData["owner_org"]
+    assert jsonData["owner_org"] != destOrgId
+    assert updateStruct["owner_org"] == destOrgId
+    assert comparable.get("owner_org") != destOrgId
+    assert updateStruct is not comparable
+    assert updateStruct["resources"] is not comparable["resources"]
+    assert len(updateStruct["resources"]) == len(comparable["resources"])
@@ -40,3 +40,61 @@ def test_transformConfig(TransformationConfig):
     config_org_user = TransformationConfig.getUserPopulatedProperties(orgType)
     LOGGER.debug(f"config_org_user: {config_org_user}")
 
+
+def test_compileProjection():
+    properties = {
+        "name": True,
+        "tags": [{"name": True}],
+        "extras": {"key": True},
+    }
+    record = {
+        "id": "abc",
+        "name": "test",
+        "tags": [{"name": "tag1", "id": "1"}, {"id": "2"}],
+    }
+    projection = CKANTransform.compileProjection(properties)
+    projected = projection(record)
+    LOGGER.debug(f"projected: {projected}")
+    assert projected == {
+        "name": "test",
+        "tags": [{"name": "tag1"}, {"name": None}],
+        "extras": None,
+    }
+    # the input record is not modified
+    assert record["tags"][1] == {"id": "2"}
+    assert "extras" not in record
+
+def test_getDataTypeConfig():
+    transConf = CKANTransform.TransformationConfig()
+    pkgType = constants.TRANSFORM_TYPE_PACKAGES
+    pkgConfig = transConf.getDataTypeConfig(pkgType)
+    # the view is only created once
+    assert pkgConfig is transConf.getDataTypeConfig(pkgType)
+    assert pkgConfig.uniqueField == transConf.getUniqueField(pkgType)
+    assert pkgConfig.ignoreList == frozenset(transConf.getIgnoreList(pkgType))
+    with pytest.raises(AttributeError):
+        pkgConfig.uniqueField = "id"
+
+def test_compileIgnorePruner():
+    properties = {
+        "name": True,
+        "users": [{"name": True, "capacity": True}],
+        "tags": [{"name": True}],
+    }
+    uniqueFields = {constants.TRANSFORM_TYPE_USERS: "name"}
+    pruner = CKANTransform.compileIgnorePruner(properties, uniqueFields)
+    record = {
+        "name": "ignoreuser",
+        "users": [{"name": "ignoreuser"}, {"name": "keepuser"}],
+        "tags": [{"name": "ignoreuser"}],
+    }
+    ignores = {constants.TRANSFORM_TYPE_USERS: frozenset(["ignoreuser"])}
+    pruned = pruner(record, ignores.get)
+    # only the embedded users are removed
+    assert pruned == {
+        "name": "ignoreuser",
+        "users": [{"name": "keepuser"}],
+        "tags": [{"name": "ignoreuser"}],
+    }
+    # nothing can be embedded in a definition without datatype keys
+    assert CKANTransform.compileIgnorePruner({"tags": [{"name": True}]}, uniqueFields) is None
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+
+import pytest
+import requests
+
+import bcdc2bcdc.Cassette as Cassette
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+import bcdc2bcdc.HTTPClients as HTTPClients
+import bcdc2bcdc.Throttle as Throttle
+
+LOGGER = logging.getLogger(__name__)
+
+
+def getSession(url, adapter):
+    session = requests.Session()
+    session.mount(f"{url}/", adapter)
+    return session
+
+
+def makeRequests(session, url):
+    listResp = session.get(
+        f"{url}/api/3/action/package_list", params={"limit": 2, "offset": 1}
+    )
+    showResp = session.post(
+        f"{url}/api/3/action/package_show", json={"id": "pkg1"}
+    )
+    with session.get(
+        f"{url}/api/3/action/user_list", params={"all_fields": "False"}, stream=True
+    ) as streamResp:
+        streamed = streamResp.raw.read()
+    return listResp.json(), showResp.json(), streamed
+
+
+def test_recordAndReplay(tmp_path):
+    cassettePath = os.path.join(str(tmp_path), "cassette.jsonl.gz")
+    store = FakeCKAN.FakeCKANStore(
+        {
+            "users": [{"name": "user1"}],
+            "packages": [{"name": f"pkg{pkgCnt}"} for pkgCnt in range(3)],
+        }
+    )
+    server = FakeCKAN.FakeCKANServer(store)
+    server.start()
+    try:
+        cassette = Cassette.Cassette(cassettePath, constants.CASSETTE_MODES.RECORD)
+        adapter = HTTPClients.RetryingHTTPAdapter(
+            Throttle.HostThrottle(server.url), cassette=cassette
+        )
+        recorded = makeRequests(getSession(server.url, adapter), server.url)
+        cassette.close()
+    finally:
+        server.stop()
+    assert recorded[0]["result"] == ["pkg1", "pkg2"]
+
+    cassette = Cassette.Cassette(cassettePath, constants.CASSETTE_MODES.REPLAY)
+    session = getSession(server.url, Cassette.ReplayAdapter(cassette))
+    assert makeRequests(session, server.url) == recorded
+
+    # query parameters are matched in any order
+    resp = session.get(
+        f"{server.url}/api/3/action/package_list", params={"offset": 1, "limit": 2}
+    )
+    assert resp.json() == recorded[0]
+
+    with pytest.raises(Cassette.CassetteMissError):
+        session.post(f"{server.url}/api/3/action/group_list")
+
+    async def replayAsync():
+        asyncSession = Cassette.ReplayAsyncSession(cassette)
+        async with asyncSession.get(
+            f"{server.url}/api/3/action/package_list",
+            params={"limit": 2, "offset": 1},
+        ) as asyncResp:
+            return asyncResp.status, await asyncResp.json(content_type=None)
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(replayAsync()) == (200, recorded[0])
+    finally:
+        loop.close()
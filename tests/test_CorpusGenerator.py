@@ -0,0 +1,54 @@
+import io
+import json
+import logging
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.CorpusGenerator as CorpusGenerator
+
+LOGGER = logging.getLogger(__name__)
+
+
+def getGenerator(seed=0):
+    return CorpusGenerator.CorpusGenerator(
+        packageCount=100, userCount=50, duplicateEmailFraction=0.5, seed=seed
+    )
+
+
+def test_generate():
+    src, dest = getGenerator().generate()
+    assert (src, dest) == getGenerator().generate()
+    assert src != getGenerator(seed=1).generate()[0]
+
+    summary = getGenerator().getSummary()
+    packages = summary[constants.TRANSFORM_TYPE_PACKAGES]
+    assert packages["src"] == len(src[constants.TRANSFORM_TYPE_PACKAGES]) == 100
+    assert packages["dest"] == len(dest[constants.TRANSFORM_TYPE_PACKAGES])
+    assert packages["adds"] and packages["deletes"] and packages["updates"]
+
+    # shared records have different ids in src and dest
+    srcPkgs = {pkg["name"]: pkg for pkg in src[constants.TRANSFORM_TYPE_PACKAGES]}
+    destPkgs = {pkg["name"]: pkg for pkg in dest[constants.TRANSFORM_TYPE_PACKAGES]}
+    shared = set(srcPkgs).intersection(destPkgs)
+    assert len(shared) == packages["src"] - packages["adds"]
+    for pkgName in shared:
+        assert srcPkgs[pkgName]["id"] != destPkgs[pkgName]["id"]
+
+    emails = [user["email"] for user in src[constants.TRANSFORM_TYPE_USERS]]
+    assert len(set(emails)) < len(emails)
+
+    orgNames = {org["name"] for org in src[constants.TRANSFORM_TYPE_ORGS]}
+    for org in src[constants.TRANSFORM_TYPE_ORGS]:
+        if "-sub-" in org["name"]:
+            assert org["groups"][0]["name"] in orgNames
+
+
+def test_writeCorpus():
+    generator = getGenerator()
+    src, dest = generator.generate()
+    for dataOrigin, corpus in [
+        (constants.DATA_SOURCE.SRC, src),
+        (constants.DATA_SOURCE.DEST, dest),
+    ]:
+        fh = io.StringIO()
+        generator.writeCorpus(dataOrigin, fh)
+        assert json.loads(fh.getvalue()) == corpus
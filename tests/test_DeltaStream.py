@@ -0,0 +1,87 @@
+import concurrent.futures
+import copy
+import logging
+import random
+
+import pytest
+
+import bcdc2bcdc.CKANData as CKANData
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.DeltaStream as DeltaStream
+import tests.helpers.CorpusHelpers as CorpusHelpers
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def corpus(monkeypatch):
+    srcCorpus, destCorpus, server = CorpusHelpers.startCorpusServer(monkeypatch)
+    yield srcCorpus, destCorpus
+    server.stop()
+
+
+def getNames(deltaObj):
+    return {
+        "adds": sorted(deltaObj.adds.getUniqueIdentifiers()),
+        "deletes": sorted(deltaObj.deletes.getUniqueIdentifiers()),
+        "updates": sorted(deltaObj.updates.getUniqueIdentifiers()),
+    }
+
+
+def getFuture(result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+def test_streamedDeltaMatchesGetDelta(corpus):
+    srcCorpus, destCorpus = corpus
+    srcPackages = srcCorpus[constants.TRANSFORM_TYPE_PACKAGES]
+    destPackages = destCorpus[constants.TRANSFORM_TYPE_PACKAGES]
+
+    srcDataSet = CKANData.CKANPackageDataSet(
+        copy.deepcopy(srcPackages), CorpusHelpers.getDataCache(srcCorpus, destCorpus),
+        constants.DATA_SOURCE.SRC
+    )
+    destDataSet = CKANData.CKANPackageDataSet(
+        copy.deepcopy(destPackages), srcDataSet.dataCache, constants.DATA_SOURCE.DEST
+    )
+    srcDataSet.dataCache.addData(srcDataSet, constants.DATA_SOURCE.SRC)
+    srcDataSet.dataCache.addData(destDataSet, constants.DATA_SOURCE.DEST)
+    expected = getNames(srcDataSet.getDelta(destDataSet))
+    assert expected["adds"] and expected["deletes"] and expected["updates"]
+
+    stream = DeltaStream.PackageDeltaStream()
+    srcCallback = stream.getCallback(constants.DATA_SOURCE.SRC)
+    destCallback = stream.getCallback(constants.DATA_SOURCE.DEST)
+    streamed = [(srcCallback, pkg) for pkg in srcPackages]
+    streamed.extend((destCallback, pkg) for pkg in destPackages)
+    random.Random(0).shuffle(streamed)
+
+    # a package received again after the copy in the list returned by the
+    # retrieval, only the copy in the list is compared
+    destNames = {pkg["name"] for pkg in destPackages}
+    resentPackage = [
+        pkg for pkg in srcPackages
+        if pkg["name"] in destNames and pkg["name"] not in expected["updates"]
+    ][0]
+    staleCopy = copy.deepcopy(resentPackage)
+    staleCopy["title"] = "stale title"
+    streamed.append((srcCallback, staleCopy))
+    # packages streamed by a retrieval that aren't in the list it returns
+    droppedPackage = copy.deepcopy(destPackages[1])
+    droppedPackage["name"] = "dropped-package"
+    streamed.append((destCallback, droppedPackage))
+    # a package in the list that was never streamed
+    streamed = [
+        (callback, pkg) for callback, pkg in streamed if pkg is not destPackages[2]
+    ]
+    for callback, package in streamed:
+        callback(package)
+
+    deltaObj = stream.getDelta(
+        CorpusHelpers.getDataCache(srcCorpus, destCorpus),
+        getFuture(srcPackages),
+        getFuture(destPackages),
+    )
+    assert getNames(deltaObj) == expected
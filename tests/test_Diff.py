@@ -0,0 +1,83 @@
+import logging
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.Diff as Diff
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_contentHashIgnoresOrder():
+    struct1 = {"a": 1, "tags": [{"name": "x"}, {"name": "y"}], "b": "str"}
+    struct2 = {"b": "str", "tags": [{"name": "y"}, {"name": "x"}], "a": 1}
+    assert Diff.getContentHash(struct1) == Diff.getContentHash(struct2)
+
+
+def test_contentHashFalsyValues():
+    hash1 = Diff.getContentHash({"a": None, "b": [{"c": ""}]})
+    hash2 = Diff.getContentHash({"a": [], "b": [{"c": {}}]})
+    assert hash1 == hash2
+
+    # a missing key is not the same as a falsy value
+    assert Diff.getContentHash({"a": None}) != Diff.getContentHash({})
+
+
+def test_contentHashDifferentValues():
+    assert Diff.getContentHash({"a": "1"}) != Diff.getContentHash({"a": 1})
+    assert Diff.getContentHash({"a": True}) != Diff.getContentHash({"a": 1})
+    assert Diff.getContentHash({"a": ["x", "y"]}) != Diff.getContentHash(
+        {"a": ["x", "z"]}
+    )
+
+
+def test_getDiffPaths():
+    struct1 = {"a": 1, "b": {"c": "x"}, "d": "gone", "tags": ["x", "y"]}
+    struct2 = {"a": 1, "b": {"c": "z"}, "e": "new", "tags": ["y", "x"]}
+    diff = Diff.Diff(struct1, struct2).getDiff()
+    assert sorted(diff) == ["root['b']['c']", "root['d']", "root['e']"]
+
+    resources1 = [{"name": "r1"}, {"name": "r2"}]
+    resources2 = [{"name": "r2"}, {"name": "r3"}]
+    diff = Diff.Diff(resources1, resources2).getDiff()
+    assert diff == ["root[0]", "root[1]"]
+
+
+def test_getDiffFalsyFields():
+    struct1 = {"a": None, "b": ""}
+    struct2 = {"a": [], "b": None}
+    assert Diff.Diff(struct1, struct2).isSame()
+
+    diff = Diff.Diff(struct1, struct2, falsyFields={"b"}).getDiff()
+    assert diff == ["root['a']"]
+
+
+def test_keyedDiff():
+    resources1 = [
+        {"name": "r1", "url": "http://a"},
+        {"name": "r2", "url": "http://b"},
+        {"name": "r3", "url": "http://c"},
+    ]
+    resources2 = [
+        {"name": "r4", "url": "http://d"},
+        {"name": "r2", "url": "http://changed"},
+        {"name": "r1", "url": "http://a"},
+    ]
+    assert Diff.KeyedDiff(resources1, resources1[::-1], ("name",)).getDiff() == []
+
+    diff = Diff.KeyedDiff(resources1, resources2, ("name",)).getDiff()
+    assert diff == [
+        Diff.KeyedChange(constants.CHANGE_TYPES.CHANGED, ("r2",), 1, 1, ["root['url']"]),
+        Diff.KeyedChange(constants.CHANGE_TYPES.REMOVED, ("r3",), 2, None, []),
+        Diff.KeyedChange(constants.CHANGE_TYPES.ADDED, ("r4",), None, 0, []),
+    ]
+
+
+def test_keyedDiffDuplicateKeys():
+    resources1 = [{"name": "r1", "url": "http://a"}, {"name": "r1", "url": "http://b"}]
+    resources2 = [{"name": "r1", "url": "http://b"}, {"name": "r1", "url": "http://a"}]
+    assert Diff.KeyedDiff(resources1, resources2, ("name",)).getDiff() == []
+
+    resources2 = [{"name": "r1", "url": "http://b"}, {"name": "r1", "url": "http://c"}]
+    diff = Diff.KeyedDiff(resources1, resources2, ("name",)).getDiff()
+    assert diff == [
+        Diff.KeyedChange(constants.CHANGE_TYPES.CHANGED, ("r1",), 0, 1, ["root['url']"])
+    ]
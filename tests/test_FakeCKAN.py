@@ -0,0 +1,42 @@
+import logging
+
+import pytest
+
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+
+LOGGER = logging.getLogger(__name__)
+
+
+def getStore():
+    return FakeCKAN.FakeCKANStore(
+        {
+            "users": [{"name": "user1", "email": "user1@gov.bc.ca"}],
+            "packages": [
+                {"name": f"pkg{pkgCnt}", "title": str(pkgCnt)} for pkgCnt in range(5)
+            ],
+        }
+    )
+
+
+def test_listingsAndPaging():
+    store = getStore()
+    assert store.call("package_list", {"limit": "2", "offset": "1"}) == ["pkg1", "pkg2"]
+    search = store.call("package_search", {"rows": 2, "start": 4, "fl": "name"})
+    assert search == {"count": 5, "results": [{"name": "pkg4"}]}
+    assert store.call("user_list", {"all_fields": "False"}) == ["user1"]
+
+
+def test_writes():
+    store = getStore()
+    created = store.call("package_create", {"name": "pkg5", "title": "new"})
+    assert store.call("package_show", {"id": created["id"]})["title"] == "new"
+    store.call("package_update", {"id": "pkg5", "title": "changed"})
+    assert store.call("package_show", {"id": "pkg5"})["title"] == "changed"
+
+    store.call("package_delete", {"id": "pkg0"})
+    assert "pkg0" not in store.call("package_list", {})
+    assert store.call("package_show", {"id": "pkg0"})["state"] == "deleted"
+
+    with pytest.raises(FakeCKAN.ValidationError) as err:
+        store.call("user_create", {"name": "user1"})
+    assert err.value.getError()["name"] == [FakeCKAN.USER_NAME_UNAVAILABLE]
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+import bcdc2bcdc.FetchCheckpoint as FetchCheckpoint
+
+LOGGER = logging.getLogger(__name__)
+
+
+def getCheckpoint(tmpDir):
+    cacheFiles = CacheFiles.CKANCacheFiles(str(tmpDir))
+    return FetchCheckpoint.FetchCheckpoint("test_instance", cacheFiles=cacheFiles)
+
+
+def test_resume(tmp_path):
+    names = ["pkg1", "pkg2", "pkg3"]
+    checkpoint = getCheckpoint(tmp_path)
+    assert checkpoint.resume(names) == []
+    checkpoint.addRequested(names)
+    checkpoint.addReceived({"name": "pkg1", "title": "one"})
+    checkpoint.addReceived({"name": "pkg2", "title": "two"})
+    checkpoint.addFailed("pkg3")
+    # simulate the process stopping part way through writing a line
+    checkpoint.journal.write('{"event": "rece')
+    checkpoint.journal.flush()
+
+    checkpoint = getCheckpoint(tmp_path)
+    restored = checkpoint.resume(["pkg2", "pkg3", "pkg4"])
+    assert restored == [{"name": "pkg2", "title": "two"}]
+    assert checkpoint.getMissing(["pkg2", "pkg3", "pkg4"]) == ["pkg3", "pkg4"]
+
+    checkpoint.complete()
+    assert getCheckpoint(tmp_path).resume(names) == []
+
+
+def test_resumeJournal(tmp_path):
+    checkpoint = getCheckpoint(tmp_path)
+    checkpoint.resume(["pkg1", "pkg2"])
+    checkpoint.addReceived({"name": "pkg1", "title": "one"})
+
+    checkpoint = getCheckpoint(tmp_path)
+    checkpoint.resume(["pkg1", "pkg2"])
+    # the new journal replaced the old one before it was opened for append
+    assert not os.path.exists(checkpoint.journalPath + ".tmp")
+    assert checkpoint.journal.name == checkpoint.journalPath
+    assert checkpoint.journal.mode == "a"
+    checkpoint.addReceived({"name": "pkg2", "title": "two"})
+    with open(checkpoint.journalPath) as fh:
+        entries = [json.loads(line) for line in fh]
+    assert [entry["name"] for entry in entries] == ["pkg1", "pkg2"]
+    checkpoint.complete()
+
+
+def test_manifestGetMissing():
+    manifest = FetchCheckpoint.FetchManifest()
+    manifest.addRequested(["a", "b", "c"])
+    manifest.addReceived({"name": "b"})
+    assert manifest.getMissing(["a", "b", "c"]) == ["a", "c"]
@@ -0,0 +1,151 @@
+import json
+import logging
+
+import pytest
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+import bcdc2bcdc.CKAN as CKAN
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.FakeCKAN as FakeCKAN
+import bcdc2bcdc.IncrementalSync as IncrementalSync
+import bcdc2bcdc.SnapshotStore as SnapshotStore
+
+LOGGER = logging.getLogger(__name__)
+
+# package name: metadata_modified
+MODIFIED_TIMESTAMPS = {
+    "pkg0": "2020-05-01T18:20:11.123456",
+    "pkg1": "2020-05-02T09:00:00.500000",
+    "pkg2": "2020-05-03T10:15:30.999999",
+}
+
+
+@pytest.fixture
+def fakeServer(monkeypatch):
+    for envVar in [
+        constants.CKAN_FETCH_ENGINE,
+        constants.CKAN_FETCH_CHECKPOINT,
+        constants.CKAN_INCREMENTAL_FULL_SYNC_HOURS,
+    ]:
+        monkeypatch.delenv(envVar, raising=False)
+    store = FakeCKAN.FakeCKANStore(
+        {
+            "packages": [
+                {"name": pkgName, "title": pkgName, "metadata_modified": modified}
+                for pkgName, modified in MODIFIED_TIMESTAMPS.items()
+            ]
+        }
+    )
+    # the fq params of the package_search calls that filter the packages
+    store.searchFilters = []
+    packageSearch = store.action_package_search
+
+    def recordSearch(params):
+        if params.get("fq"):
+            store.searchFilters.append(params["fq"])
+        return packageSearch(params)
+
+    monkeypatch.setattr(store, "action_package_search", recordSearch)
+    server = FakeCKAN.FakeCKANServer(store)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def getPackages(fakeServer, tmp_path):
+    """runs an incremental sync, returns the names of the packages it returned
+    and the number of packages it retrieved with package_show
+    """
+    wrapper = CKAN.CKANWrapper(fakeServer.url, apiKey="test-key")
+    cacheFiles = CacheFiles.CKANCacheFiles(str(tmp_path))
+
+    def getPackages():
+        fakeServer.requestCounts.clear()
+        del fakeServer.store.searchFilters[:]
+        sync = IncrementalSync.IncrementalPackageSync(wrapper, cacheFiles)
+        packages = sync.getPackages()
+        getPackages.sync = sync
+        pkgNames = sorted(pkg["name"] for pkg in packages)
+        return pkgNames, fakeServer.requestCounts["package_show"]
+
+    return getPackages
+
+
+def test_watermark(fakeServer, getPackages):
+    pkgNames, retrieved = getPackages()
+    assert pkgNames == sorted(MODIFIED_TIMESTAMPS)
+    assert retrieved == len(MODIFIED_TIMESTAMPS)
+    assert fakeServer.store.searchFilters == []
+    state = getPackages.sync.readState()
+    assert state["watermark"] == MODIFIED_TIMESTAMPS["pkg2"]
+
+    # the watermark is truncated to the second, the search is inclusive so the
+    # package modified on the boundary is retrieved again
+    pkgNames, retrieved = getPackages()
+    assert pkgNames == sorted(MODIFIED_TIMESTAMPS)
+    assert retrieved == 1
+    assert fakeServer.store.searchFilters == [
+        "metadata_modified:[2020-05-03T10:15:30Z TO *]"
+    ]
+
+    fakeServer.store.call("package_update", {"id": "pkg0", "title": "changed"})
+    pkgNames, retrieved = getPackages()
+    assert retrieved == 2
+    modified = fakeServer.store.call("package_show", {"id": "pkg0"})[
+        "metadata_modified"
+    ]
+    assert getPackages.sync.readState()["watermark"] == modified
+    packages = {pkg["name"]: pkg for pkg in getPackages.sync.snapshot.iterRecords()}
+    assert packages["pkg0"]["title"] == "changed"
+
+    # deleted packages are dropped using package_list
+    fakeServer.store.call("package_delete", {"id": "pkg1"})
+    pkgNames, retrieved = getPackages()
+    assert pkgNames == ["pkg0", "pkg2"]
+    assert retrieved == 1
+
+
+def test_fullSyncFallback(getPackages):
+    getPackages()
+    assert getPackages() == (sorted(MODIFIED_TIMESTAMPS), 1)
+
+    # the full sync interval has passed
+    sync = getPackages.sync
+    state = sync.readState()
+    state["lastFullSync"] -= constants.getIncrementalFullSyncHours() * 3600
+    sync.writeState(state)
+    assert getPackages() == (sorted(MODIFIED_TIMESTAMPS), len(MODIFIED_TIMESTAMPS))
+
+    # the retained packages are gone
+    getPackages.sync.snapshot.clear()
+    getPackages.sync.snapshot.save()
+    assert getPackages() == (sorted(MODIFIED_TIMESTAMPS), len(MODIFIED_TIMESTAMPS))
+
+    # no watermark was recorded
+    with open(getPackages.sync.statePath, "w") as fh:
+        json.dump({"watermark": None, "lastFullSync": 0}, fh)
+    assert getPackages() == (sorted(MODIFIED_TIMESTAMPS), len(MODIFIED_TIMESTAMPS))
+
+
+def test_sharedSnapshotObjects(getPackages, tmp_path):
+    # another retrieval writing to the same snapshot directory, its objects
+    # are not in a saved manifest yet
+    otherStore = SnapshotStore.SnapshotStore(
+        "other_instance", constants.TRANSFORM_TYPE_PACKAGES,
+        cacheFiles=CacheFiles.CKANCacheFiles(str(tmp_path))
+    )
+    otherStore.putRecord({"name": "other", "title": "other"})
+    otherStore.putRecord({"name": "removed", "title": "removed"})
+    otherStore.removeRecord("removed")
+
+    # a full sync doesn't remove the other store's objects
+    assert getPackages() == (sorted(MODIFIED_TIMESTAMPS), len(MODIFIED_TIMESTAMPS))
+    otherStore.save()
+    assert list(otherStore.iterRecords()) == [{"name": "other", "title": "other"}]
+
+    # once both are saved only the unused object is pruned
+    cacheFiles = CacheFiles.CKANCacheFiles(str(tmp_path))
+    assert IncrementalSync.pruneSnapshots(cacheFiles) == 1
+    assert list(otherStore.iterRecords()) == [{"name": "other", "title": "other"}]
+    assert getPackages() == (sorted(MODIFIED_TIMESTAMPS), 1)
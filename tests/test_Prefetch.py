@@ -0,0 +1,93 @@
+import concurrent.futures
+import logging
+import threading
+
+import pytest
+
+import bcdc2bcdc.constants as constants
+import bcdc2bcdc.Prefetch as Prefetch
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RecordingWrapper:
+    """stands in for a CKAN.CKANWrapper, records the data types retrieved"""
+
+    def __init__(self, name, retrieved):
+        self.name = name
+        self.retrieved = retrieved
+        self.lock = threading.Lock()
+
+    def record(self, dataType):
+        with self.lock:
+            self.retrieved.append((self.name, dataType))
+        return [{"name": f"{self.name}-{dataType}"}]
+
+    def getUsers(self, cacheFileName=None, includeData=False):
+        return self.record(constants.TRANSFORM_TYPE_USERS)
+
+    def iterGroups(self, includeData=False):
+        return iter(self.record(constants.TRANSFORM_TYPE_GROUPS))
+
+    def iterOrganizations(self, includeData=False):
+        return iter(self.record(constants.TRANSFORM_TYPE_ORGS))
+
+    def getPackagesAndData(self, cacheFileName=None, onPackage=None):
+        return self.record(constants.TRANSFORM_TYPE_PACKAGES)
+
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    monkeypatch.delenv(constants.CKAN_STREAMING_DELTA, raising=False)
+    monkeypatch.delenv(constants.CKAN_INCREMENTAL_SYNC, raising=False)
+    monkeypatch.setattr(Prefetch, "refreshScheming", lambda: None)
+    retrieved = []
+    prefetcher = Prefetch.DataPrefetcher(
+        RecordingWrapper("src", retrieved), RecordingWrapper("dest", retrieved)
+    )
+    prefetcher.retrieved = retrieved
+    prefetcher.start()
+    yield prefetcher
+    prefetcher.cancel()
+
+
+def test_destDependenciesWaitForStep(prefetcher):
+    usersFutures = prefetcher.getFutures(constants.TRANSFORM_TYPE_USERS)
+    packageFutures = prefetcher.getFutures(constants.TRANSFORM_TYPE_PACKAGES)
+    orgFutures = prefetcher.getFutures(constants.TRANSFORM_TYPE_ORGS)
+    groupFutures = prefetcher.getFutures(constants.TRANSFORM_TYPE_GROUPS)
+    for future in usersFutures.values():
+        future.result(timeout=10)
+    for futures in (orgFutures, groupFutures, packageFutures):
+        futures[constants.DATA_SOURCE.SRC].result(timeout=10)
+
+    # the dest orgs and groups embed users, they wait for the users step
+    assert not orgFutures[constants.DATA_SOURCE.DEST].done()
+    assert not groupFutures[constants.DATA_SOURCE.DEST].done()
+    assert ("dest", constants.TRANSFORM_TYPE_ORGS) not in prefetcher.retrieved
+
+    prefetcher.setStepComplete(constants.TRANSFORM_TYPE_USERS)
+    assert orgFutures[constants.DATA_SOURCE.DEST].result(timeout=10) == [
+        {"name": "dest-organizations"}
+    ]
+    assert groupFutures[constants.DATA_SOURCE.DEST].result(timeout=10) == [
+        {"name": "dest-groups"}
+    ]
+
+    # the dest packages embed their organization and groups, they wait for
+    # all the earlier steps
+    destPackageFuture = packageFutures[constants.DATA_SOURCE.DEST]
+    for dataType in (constants.TRANSFORM_TYPE_GROUPS, constants.TRANSFORM_TYPE_ORGS):
+        assert not destPackageFuture.done()
+        prefetcher.setStepComplete(dataType)
+    assert destPackageFuture.result(timeout=10) == [{"name": "dest-packages"}]
+
+
+def test_cancelReleasesWaitingRetrievals(prefetcher):
+    orgFuture = prefetcher.getFutures(constants.TRANSFORM_TYPE_ORGS)[
+        constants.DATA_SOURCE.DEST
+    ]
+    prefetcher.cancel()
+    with pytest.raises(concurrent.futures.CancelledError):
+        orgFuture.result(timeout=10)
+    assert ("dest", constants.TRANSFORM_TYPE_ORGS) not in prefetcher.retrieved
@@ -0,0 +1,38 @@
+import logging
+
+import bcdc2bcdc.Retry as Retry
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_isIdempotent():
+    assert Retry.isIdempotent("GET")
+    assert Retry.isIdempotent("POST", "https://ckan/api/3/action/package_update")
+    assert not Retry.isIdempotent("POST", "https://ckan/api/3/action/package_create")
+    assert not Retry.isIdempotent("POST", "https://ckan/api/3/action/user_create/")
+
+
+def test_getDelay():
+    policy = Retry.RetryPolicy(maxRetries=3, baseDelay=1, maxDelay=10, runDeadline=None)
+    for attempt in range(10):
+        assert 0 <= policy.getDelay(attempt) <= 10
+    # retry after overrides the calculated delay, but not the max delay
+    assert policy.getDelay(0, "7") == 7
+    assert policy.getDelay(0, "120") == 10
+
+
+def test_canRetry():
+    policy = Retry.RetryPolicy(maxRetries=2, runDeadline=None)
+    assert policy.canRetry(1)
+    assert not policy.canRetry(2)
+
+    expiredPolicy = Retry.RetryPolicy(maxRetries=2, runDeadline=-1)
+    assert not expiredPolicy.canRetry(0)
+
+
+def test_isRetryableStatus():
+    policy = Retry.RetryPolicy(runDeadline=None)
+    assert policy.isRetryableStatus(503)
+    assert policy.isRetryableStatus(429, "POST", "https://ckan/api/3/action/group_update")
+    assert not policy.isRetryableStatus(503, "POST", "https://ckan/api/3/action/group_create")
+    assert not policy.isRetryableStatus(409)
@@ -0,0 +1,68 @@
+import gzip
+import logging
+import os
+import threading
+
+import bcdc2bcdc.CacheFiles as CacheFiles
+import bcdc2bcdc.SnapshotStore as SnapshotStore
+
+LOGGER = logging.getLogger(__name__)
+
+
+def getStore(tmpDir):
+    cacheFiles = CacheFiles.CKANCacheFiles(str(tmpDir))
+    return SnapshotStore.SnapshotStore("test_instance", "packages", cacheFiles=cacheFiles)
+
+
+def test_putGetRecord(tmp_path):
+    store = getStore(tmp_path)
+    pkg = {"name": "pkg1", "title": "test package", "tags": [{"name": "a"}]}
+    contentHash = store.putRecord(pkg)
+    store.save()
+
+    # re-read from disk
+    store = getStore(tmp_path)
+    assert store.getHash("pkg1") == contentHash
+    assert store.getRecord("pkg1") == pkg
+    assert store.getRecord("doesnotexist") is None
+
+
+def test_contentHashIgnoresKeyOrder():
+    hash1 = SnapshotStore.getContentHash({"a": 1, "b": 2})
+    hash2 = SnapshotStore.getContentHash({"b": 2, "a": 1})
+    assert hash1 == hash2
+
+
+def test_pruneObjects(tmp_path):
+    store = getStore(tmp_path)
+    store.putRecord({"name": "pkg1", "title": "one"})
+    store.putRecord({"name": "pkg2", "title": "two"})
+    store.removeRecord("pkg2")
+    store.save()
+    assert store.pruneObjects() == 1
+    assert [rec["name"] for rec in store.iterRecords()] == ["pkg1"]
+
+
+def test_writeAtomicFromThreads(tmp_path):
+    # stores in different threads share the objects dir, and can write the
+    # same object at the same time
+    filePath = str(tmp_path / "object.json.gz")
+    data = b'{"name": "pkg1"}' * 1000
+    errors = []
+
+    def write():
+        try:
+            for _ in range(50):
+                SnapshotStore.writeAtomic(filePath, data, gzip.open)
+        except Exception as err:  # pylint: disable=broad-except
+            errors.append(err)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with gzip.open(filePath) as fh:
+        assert fh.read() == data
+    assert os.listdir(str(tmp_path)) == ["object.json.gz"]
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+import pytest
+
+import bcdc2bcdc.Throttle as Throttle
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_limiterIncreaseAndBackoff():
+    limiter = Throttle.AdaptiveLimiter(
+        minLimit=1, maxLimit=20, initialLimit=4, latencyTarget=1
+    )
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(True, 0.1)
+    assert limiter.limit > 4
+
+    grownLimit = limiter.limit
+    limiter.acquire()
+    limiter.release(False, 0.1)
+    assert limiter.limit == grownLimit * limiter.backoffRatio
+
+    # slow responses are treated the same as failures
+    limiter.lastDecrease = 0
+    limiter.acquire()
+    limiter.release(True, 5)
+    assert limiter.limit == grownLimit * limiter.backoffRatio ** 2
+
+
+def test_limiterBounds():
+    limiter = Throttle.AdaptiveLimiter(
+        minLimit=2, maxLimit=3, initialLimit=10, latencyTarget=1
+    )
+    assert limiter.limit == 3
+    assert limiter.tryAcquire()
+    assert limiter.tryAcquire()
+    assert limiter.tryAcquire()
+    assert not limiter.tryAcquire()
+    limiter.setLimit(0)
+    assert limiter.limit == 2
+
+
+def test_circuitBreaker():
+    breaker = Throttle.CircuitBreaker(failureThreshold=2, resetTimeout=0)
+    assert breaker.getWaitTime() == 0
+    breaker.record(False)
+    assert breaker.state == breaker.CLOSED
+    breaker.record(False)
+    assert breaker.state == breaker.OPEN
+
+    # reset timeout has passed, a trial request is allowed
+    assert breaker.getWaitTime() == 0
+    assert breaker.state == breaker.HALF_OPEN
+    breaker.record(True)
+    assert breaker.state == breaker.CLOSED
+
+
+def test_trialCancelled():
+    throttle = Throttle.HostThrottle("http://ckan")
+    throttle.breaker = Throttle.CircuitBreaker(failureThreshold=1, resetTimeout=0)
+    throttle.breaker.record(False)
+    assert throttle.breaker.state == throttle.breaker.OPEN
+    # the rate limit holds up the trial request
+    throttle.readBucket = Throttle.TokenBucket(rate=0.1, burst=1)
+    throttle.readBucket.reserve()
+
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(
+                asyncio.wait_for(throttle.acquireAsync(), timeout=0.05)
+            )
+    finally:
+        loop.close()
+
+    # the trial wasn't sent, the next caller is given the trial
+    assert throttle.breaker.state == throttle.breaker.HALF_OPEN
+    assert not throttle.breaker.trialInFlight
+    assert throttle.breaker.checkRequest() == (0, True)
+
+
+def test_tokenBucket():
+    bucket = Throttle.TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # bucket is empty, the next token is 1/rate seconds away
+    assert 0 < bucket.reserve() <= 0.1
+
+    unlimited = Throttle.TokenBucket(rate=0, burst=1)
+    for _ in range(5):
+        assert unlimited.reserve() == 0
+
+
+def test_isWriteRequest():
+    assert Throttle.isWriteRequest("POST", "https://ckan/api/3/action/package_update")
+    assert Throttle.isWriteRequest("POST", "https://ckan/api/3/action/group_purge")
+    assert Throttle.isWriteRequest(
+        "POST", "https://ckan/api/3/action/user_generate_apikey"
+    )
+    assert not Throttle.isWriteRequest("POST", "https://ckan/api/3/action/package_show")
+    assert not Throttle.isWriteRequest("GET", "https://ckan/api/3/action/package_list")